@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+"""
+Benchmark de clasificadores del detector
+Entrena cada backend de monitoreo.classifier_backends sobre el mismo
+conjunto de características (leído de la caché de entrenamiento) y reporta
+tiempo de entrenamiento, tamaño del modelo, latencia de inferencia de una
+fila y por lotes (con el mismo camino que usa el detector en producción) y
+exactitud/F1 sobre una partición de prueba estratificada.
+
+Uso:
+    python benchmark_backends.py [--data media/training_structure] [--cache media/feature_cache]
+                                 [--backends random_forest,logistic] [--batch 32]
+Sin videos se usan datos sintéticos de 80 características.
+"""
+
+import argparse
+import io
+import os
+import time
+
+import joblib
+import numpy as np
+from sklearn.metrics import accuracy_score, f1_score
+from sklearn.model_selection import train_test_split
+from sklearn.preprocessing import StandardScaler
+
+from monitoreo.behavior_detector import BehaviorDetector
+from monitoreo.classifier_backends import CLASSIFIER_BACKENDS, get_backend
+from monitoreo.feature_cache import FeatureCache
+from monitoreo.model_bundle import ModelBundle
+
+
+def load_features(data_dir, cache_dir, max_frames, sampling):
+    """Matriz (X, y) de los videos de data_dir; los que ya están en caché no se decodifican"""
+    detector = BehaviorDetector()
+    video_paths, labels = detector.collect_videos(data_dir)
+    cache = FeatureCache(cache_dir)
+    X, y, _ = detector.load_dataset(video_paths, labels, cache=cache, max_frames=max_frames,
+                                    n_jobs=-1, sampling=sampling)
+    return np.array(X), np.array(y)
+
+
+def synthetic_features(n_samples=2000, seed=42):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, 80))
+    y = (X[:, :4] @ rng.normal(size=(4, 4)) + rng.normal(size=(n_samples, 4))).argmax(axis=1)
+    return X, y
+
+
+def model_size(bundle):
+    """Bytes del artefacto serializado (modelo + scaler, o el bosque compilado si existe)"""
+    buffer = io.BytesIO()
+    if bundle.compiled is not None:
+        joblib.dump(bundle.compiled.to_dict(), buffer)
+    else:
+        joblib.dump({'model': bundle.model, 'scaler': bundle.scaler}, buffer)
+    return buffer.tell()
+
+
+def latencies(bundle, rows, batch, repeats=200):
+    """p50/p99 en microsegundos de bundle.predict sobre lotes de `batch` filas"""
+    for start in range(0, min(len(rows), 20 * batch), batch):
+        bundle.predict(rows[start:start + batch])
+
+    timings = []
+    for i in range(repeats):
+        start = (i * batch) % max(len(rows) - batch + 1, 1)
+        chunk = rows[start:start + batch]
+        begin = time.perf_counter()
+        bundle.predict(chunk)
+        timings.append(time.perf_counter() - begin)
+    timings = np.array(timings) * 1e6
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def benchmark(backend, X_train, X_test, y_train, y_test, batch):
+    scaler = StandardScaler().fit(X_train)
+    model = backend.build(random_state=42)
+    start = time.perf_counter()
+    model.fit(scaler.transform(X_train), y_train)
+    fit_seconds = time.perf_counter() - start
+
+    bundle = ModelBundle.from_estimator(model, scaler, backend=backend.name)
+    y_pred, _ = bundle.predict(X_test)
+    rows = np.concatenate([X_test] * max(1, -(-batch * 4 // max(len(X_test), 1))))
+    single = latencies(bundle, rows, 1)
+    batched = latencies(bundle, rows, batch)
+    return {
+        'backend': backend.name,
+        'fit_seconds': fit_seconds,
+        'size_kb': model_size(bundle) / 1024,
+        'single_p50_us': single[0],
+        'single_p99_us': single[1],
+        'batch_row_us': batched[0] / batch,
+        'accuracy': accuracy_score(y_test, y_pred),
+        'f1': f1_score(y_test, y_pred, average='weighted', zero_division=0),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', default=os.path.join('media', 'training_structure'))
+    parser.add_argument('--cache', default=os.path.join('media', 'feature_cache'))
+    parser.add_argument('--backends', default=','.join(CLASSIFIER_BACKENDS))
+    parser.add_argument('--max-frames', type=int, default=30)
+    parser.add_argument('--sampling', default='first')
+    parser.add_argument('--test-size', type=float, default=0.2)
+    parser.add_argument('--batch', type=int, default=32)
+    args = parser.parse_args()
+
+    X, y = load_features(args.data, args.cache, args.max_frames, args.sampling) \
+        if os.path.isdir(args.data) else (np.empty((0, 80)), np.empty(0))
+    if len(X) < 10:
+        print("Pocos videos con características: se usan datos sintéticos")
+        X, y = synthetic_features()
+
+    _, counts = np.unique(y, return_counts=True)
+    stratify = y if counts.min() >= 2 else None
+    X_train, X_test, y_train, y_test = train_test_split(
+        X, y, test_size=args.test_size, random_state=42, stratify=stratify
+    )
+    print(f"Muestras: {len(X)} (entrenamiento {len(X_train)}, prueba {len(X_test)}) | "
+          f"Clases: {len(counts)}\n")
+
+    print(f"{'backend':<24}{'fit (s)':>9}{'tamaño KB':>11}{'1 fila p50':>12}{'p99 µs':>9}"
+          f"{f'lote {args.batch} µs/fila':>18}{'accuracy':>10}{'F1':>8}")
+    for name in args.backends.split(','):
+        result = benchmark(get_backend(name.strip()), X_train, X_test, y_train, y_test, args.batch)
+        print(f"{result['backend']:<24}{result['fit_seconds']:>9.2f}{result['size_kb']:>11.1f}"
+              f"{result['single_p50_us']:>12.1f}{result['single_p99_us']:>9.1f}"
+              f"{result['batch_row_us']:>18.2f}{result['accuracy']:>10.3f}{result['f1']:>8.3f}")
+
+
+if __name__ == '__main__':
+    main()
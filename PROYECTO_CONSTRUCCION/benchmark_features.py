@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+"""
+Benchmark de extracción de características
+Compara la extracción frame a frame original contra el motor por lotes
+de monitoreo.feature_extractor y verifica que ambos vectores coincidan.
+
+Uso:
+    python benchmark_features.py [video ...] [--max-frames 30] [--repeat 3]
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+from monitoreo.feature_extractor import extract_video, read_gray_frames, extract_window
+
+
+def extract_features_reference(video_path, max_frames=30):
+    """Implementación original frame a frame (float64, un dict por frame)"""
+    cap = cv2.VideoCapture(video_path)
+    features_list = []
+    frame_count = 0
+    prev_gray = None
+    motion_scores = []
+    edge_scores = []
+
+    while cap.isOpened() and frame_count < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+
+        frame = cv2.resize(frame, (320, 240))
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+
+        hist = cv2.calcHist([gray], [0], None, [16], [0, 256])
+        hist = cv2.normalize(hist, hist).flatten()
+
+        if prev_gray is not None:
+            diff = cv2.absdiff(prev_gray, gray)
+            _, thresh = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
+            motion_scores.append(np.sum(thresh) / (320 * 240 * 255))
+
+        sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)
+        sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)
+        magnitude = np.sqrt(sobelx**2 + sobely**2)
+        edge_scores.append(np.mean(magnitude) / 255)
+
+        features_list.append({
+            'hist': hist,
+            'mean': np.mean(gray) / 255,
+            'std': np.std(gray) / 255
+        })
+
+        prev_gray = gray.copy()
+        frame_count += 1
+
+    cap.release()
+
+    if not features_list:
+        return None
+
+    final_features = np.concatenate([
+        np.mean([f['hist'] for f in features_list], axis=0),
+        [
+            np.mean(motion_scores) if motion_scores else 0,
+            np.max(motion_scores) if motion_scores else 0,
+            np.mean(edge_scores) if edge_scores else 0,
+            np.max(edge_scores) if edge_scores else 0,
+            np.mean([f['mean'] for f in features_list]),
+            np.mean([f['std'] for f in features_list]),
+            len(features_list) / max_frames
+        ]
+    ])
+    return np.pad(final_features, (0, 80 - len(final_features)), mode='constant')
+
+
+def count_frames(video_path, max_frames):
+    cap = cv2.VideoCapture(video_path)
+    try:
+        return len(read_gray_frames(cap, max_frames))
+    finally:
+        cap.release()
+
+
+def time_extractor(fn, videos, max_frames, repeat):
+    """Mejor tiempo total (s) de extraer todos los videos"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for video in videos:
+            fn(video, max_frames=max_frames)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_decode_only(videos, max_frames, repeat):
+    """Tiempo (s) solo de decodificación a escala de grises"""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for video in videos:
+            count_frames(video, max_frames)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def time_compute_only(videos, max_frames, repeat):
+    """Tiempo (s) solo de cómputo, con los frames ya decodificados"""
+    windows = []
+    for video in videos:
+        cap = cv2.VideoCapture(video)
+        windows.append(read_gray_frames(cap, max_frames).copy())
+        cap.release()
+
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for frames in windows:
+            extract_window(frames, max_frames)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('videos', nargs='*')
+    parser.add_argument('--max-frames', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    videos = args.videos or sorted(glob.glob(os.path.join('media', 'training_structure', '*', '*.mp4')))
+    if not videos:
+        print("No se encontraron videos para el benchmark")
+        return
+
+    total_frames = sum(count_frames(v, args.max_frames) for v in videos)
+    print(f"Videos: {len(videos)} | Frames por pasada: {total_frames}")
+
+    # Verificar equivalencia
+    max_diff = 0.0
+    for video in videos:
+        ref = extract_features_reference(video, args.max_frames)
+        new = extract_video(video, args.max_frames)
+        if ref is None or new is None:
+            continue
+        max_diff = max(max_diff, float(np.max(np.abs(ref - new))))
+    print(f"Diferencia máxima contra la implementación original: {max_diff:.2e}")
+
+    before = time_extractor(extract_features_reference, videos, args.max_frames, args.repeat)
+    after = time_extractor(extract_video, videos, args.max_frames, args.repeat)
+    prefetched = time_extractor(
+        lambda video, max_frames: extract_video(video, max_frames, prefetch=True),
+        videos, args.max_frames, args.repeat
+    )
+    decode = time_decode_only(videos, args.max_frames, args.repeat)
+    compute = time_compute_only(videos, args.max_frames, args.repeat)
+
+    print(f"Original (frame a frame): {total_frames / before:8.1f} frames/s")
+    print(f"Por lotes (decodificación + cómputo): {total_frames / after:8.1f} frames/s")
+    print(f"Por lotes + decodificación en segundo plano: {total_frames / prefetched:8.1f} frames/s")
+    print(f"Solo decodificación: {total_frames / decode:8.1f} frames/s")
+    print(f"Original (cómputo estimado): {total_frames / max(before - decode, 1e-9):8.1f} frames/s")
+    print(f"Por lotes (solo cómputo): {total_frames / compute:8.1f} frames/s")
+    print(f"Aceleración total: {before / after:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
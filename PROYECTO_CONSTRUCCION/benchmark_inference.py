@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+"""
+Benchmark de inferencia del Random Forest
+Compara la latencia p50/p99 de scikit-learn (scaler.transform + predict_proba)
+contra el evaluador compilado de monitoreo.forest_compiler, y verifica que
+ambos den las mismas probabilidades y etiquetas.
+
+Uso:
+    python benchmark_inference.py [--model ruta.joblib] [--rows 1000] [--batch 32]
+Sin --model se entrena un bosque con los mismos parámetros que
+BehaviorDetector.train sobre datos sintéticos de 80 características.
+"""
+
+import argparse
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from monitoreo.behavior_detector import BehaviorDetector
+from monitoreo.forest_compiler import CompiledForest, verify_compiled
+
+
+def synthetic_detector(n_samples=2000, seed=42):
+    """Bosque de 100 árboles y profundidad 15 entrenado sobre datos sintéticos"""
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, 80))
+    y = (X[:, :4] @ rng.normal(size=(4, 4)) + rng.normal(size=(n_samples, 4))).argmax(axis=1)
+
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(
+        n_estimators=100,
+        max_depth=15,
+        min_samples_split=5,
+        min_samples_leaf=2,
+        random_state=42,
+        n_jobs=-1
+    ).fit(scaler.transform(X), y)
+
+    detector = BehaviorDetector()
+    detector.set_estimator(model, scaler)
+    return detector
+
+
+def latencies(fn, rows, batch):
+    """Latencias (µs) de fn sobre lotes consecutivos de rows"""
+    samples = []
+    for start in range(0, len(rows) - batch + 1, batch):
+        chunk = rows[start:start + batch]
+        t = time.perf_counter()
+        fn(chunk)
+        samples.append((time.perf_counter() - t) * 1e6)
+    return np.array(samples)
+
+
+def report(name, samples, batch):
+    p50, p99 = np.percentile(samples, [50, 99])
+    print(f"{name:<28} p50 {p50:9.1f} µs   p99 {p99:9.1f} µs   "
+          f"({p50 / batch:7.1f} µs/fila)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--model', help='Modelo guardado con BehaviorDetector.save_model')
+    parser.add_argument('--rows', type=int, default=1000)
+    parser.add_argument('--batch', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.model:
+        detector = BehaviorDetector()
+        detector.load_model(args.model)
+    else:
+        detector = synthetic_detector()
+
+    model, scaler = detector.model, detector.scaler
+    compiled = CompiledForest.from_sklearn(model, scaler)
+    rows = np.random.default_rng(7).normal(size=(args.rows, model.n_features_in_))
+
+    max_diff, labels_match = verify_compiled(compiled, model, scaler, rows)
+    print(f"Árboles: {compiled.n_trees} | Nodos: {len(compiled.feature)} | Profundidad: {compiled.depth}")
+    print(f"Diferencia máxima de probabilidades: {max_diff:.2e} | Etiquetas idénticas: {labels_match}")
+
+    def sklearn_predict(X):
+        return model.predict_proba(scaler.transform(X))
+
+    single_rows = rows[:min(len(rows), 300)]
+    report('scikit-learn (1 fila)', latencies(sklearn_predict, single_rows, 1), 1)
+    report('compilado (1 fila)', latencies(compiled.predict_proba, rows, 1), 1)
+    report(f'scikit-learn (lote {args.batch})', latencies(sklearn_predict, rows, args.batch), args.batch)
+    report(f'compilado (lote {args.batch})', latencies(compiled.predict_proba, rows, args.batch), args.batch)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python
+"""
+Benchmark de arranque de un worker
+Mide, en procesos nuevos (importaciones en frío), lo que tarda django.setup()
+más la importación de las URLs, que es lo que paga cada worker y cada comando
+de manage.py, y lista los módulos pesados que quedaron cargados. Con --warmup
+mide además la fase de calentamiento de los recursos indicados.
+
+Uso:
+    python benchmark_startup.py [--runs 5] [--settings sistema_seguridad.settings]
+                                [--warmup detection_service pose_model]
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ['ultralytics', 'torch', 'sklearn', 'scipy', 'joblib', 'cv2', 'sympy', 'requests']
+
+CHILD = """
+import json, sys, time
+start = time.perf_counter()
+import django
+django.setup()
+from django.conf import settings
+from django.urls import get_resolver
+get_resolver(settings.ROOT_URLCONF).url_patterns
+boot = time.perf_counter() - start
+loaded = [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+warmup = {}
+if json.loads(sys.argv[2]):
+    from monitoreo.services.resource_registry import resources
+    warmup = resources.warm_up(json.loads(sys.argv[2]))
+print(json.dumps({'boot': boot, 'loaded': loaded, 'warmup': warmup}))
+"""
+
+
+def run_once(settings_module, warmup):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE=settings_module)
+    output = subprocess.run(
+        [sys.executable, '-c', CHILD, json.dumps(HEAVY_MODULES), json.dumps(warmup)],
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    # La última línea es el resultado; las anteriores son mensajes del proyecto
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--settings', default=os.environ.get('DJANGO_SETTINGS_MODULE', 'sistema_seguridad.settings'))
+    parser.add_argument('--warmup', nargs='*', default=[],
+                        help='Recursos a calentar después del arranque (ver resource_registry)')
+    args = parser.parse_args()
+
+    results = [run_once(args.settings, args.warmup) for _ in range(args.runs)]
+    boot = [r['boot'] * 1000 for r in results]
+
+    print(f"django.setup() + URLs ({args.runs} procesos): "
+          f"mediana {statistics.median(boot):.0f} ms, mín {min(boot):.0f} ms, máx {max(boot):.0f} ms")
+    loaded = results[-1]['loaded']
+    print(f"Módulos pesados cargados al arrancar: {', '.join(loaded) if loaded else 'ninguno'}")
+
+    if args.warmup:
+        for name in args.warmup:
+            times = [r['warmup'][name] * 1000 for r in results if name in r['warmup']]
+            if times:
+                print(f"  calentamiento {name}: mediana {statistics.median(times):.0f} ms")
+            else:
+                print(f"  calentamiento {name}: falló")
+
+
+if __name__ == '__main__':
+    main()
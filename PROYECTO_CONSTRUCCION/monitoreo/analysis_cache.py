@@ -0,0 +1,80 @@
+"""
+Caché de resultados de análisis de videos
+Cada resultado se guarda como JSON bajo una clave formada por el hash del
+contenido del video, la versión del modelo y los parámetros del análisis;
+así reabrir el mismo clip no vuelve a decodificarlo
+"""
+
+import hashlib
+import json
+import os
+import threading
+
+from .feature_cache import feature_key, file_sha256
+
+
+class AnalysisCache:
+    """Resultados de análisis en disco direccionados por contenido"""
+
+    FILES_INDEX = 'files.json'
+
+    def __init__(self, root):
+        self.root = str(root)
+        self._lock = threading.Lock()
+        self._files = None
+
+    @property
+    def files_path(self):
+        return os.path.join(self.root, self.FILES_INDEX)
+
+    def _write_json(self, path, data):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def _load_files(self):
+        if self._files is None:
+            try:
+                with open(self.files_path, 'r', encoding='utf-8') as f:
+                    self._files = json.load(f)
+            except (OSError, ValueError):
+                self._files = {}
+        return self._files
+
+    def content_hash(self, path):
+        """
+        Hash del contenido de un video; se recalcula solo si cambian su
+        tamaño o su fecha de modificación
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self._lock:
+            known = self._load_files().get(path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+
+        content_hash = file_sha256(path)
+        with self._lock:
+            files = self._load_files()
+            files[path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': content_hash}
+            self._write_json(self.files_path, files)
+        return content_hash
+
+    def key_for(self, path, model_version, **params):
+        return feature_key(self.content_hash(path), model=model_version, **params)
+
+    def _result_path(self, key):
+        return os.path.join(self.root, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        """Resultado guardado para la clave o None"""
+        try:
+            with open(self._result_path(key), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, result):
+        self._write_json(self._result_path(key), result)
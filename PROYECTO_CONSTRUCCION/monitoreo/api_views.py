@@ -7,11 +7,13 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.contrib.auth.decorators import login_required
 from django.utils import timezone
-import cv2
 import json
 import os
 from .models import TrainingVideo
-from .behavior_detector import detector
+from .services.resource_registry import resources
+
+# Se construye en su primer uso (scikit-learn no se carga al arrancar)
+detection_service = resources.proxy('detection_service')
 
 
 @login_required(login_url='monitoreo:login')
@@ -31,46 +33,28 @@ def capture_training_video(request):
 @login_required(login_url='monitoreo:login')
 @require_POST
 @csrf_exempt
-def analyze_video(request):
+def analyze_video(request, video_id):
     """
-    Analiza un video subido para obtener predicciones
+    Encola el análisis de un video subido (trabajo 'analyze') y retorna el id
+    del trabajo; el resumen queda en api/jobs/<id>/result/ al terminar.
+    Reabrir el mismo clip con el mismo modelo termina enseguida desde la caché.
     """
+    from .services.job_service import job_service
+    
     try:
-        video_id = request.POST.get('video_id')
         video = TrainingVideo.objects.get(id=video_id)
         
-        if not detector.is_trained:
+        if not detection_service.is_model_trained():
             return JsonResponse({
                 'success': False,
                 'error': 'Modelo no entrenado aún'
             })
         
-        # Analizar video
-        detections = detector.detect_in_video(video.video.path)
-        
-        # Calcular estadísticas
-        total_frames = len(detections)
-        behavior_counts = {}
-        for detection in detections:
-            behavior = detection['behavior']
-            behavior_counts[behavior] = behavior_counts.get(behavior, 0) + 1
-        
-        # Calcular confianza promedio
-        avg_confidence = sum(d['confidence'] for d in detections) / len(detections) if detections else 0
-        
-        # Comportamiento predominante
-        if behavior_counts:
-            predominant_behavior = max(behavior_counts.items(), key=lambda x: x[1])[0]
-        else:
-            predominant_behavior = "Desconocido"
-        
+        job = job_service.submit('analyze', params={'video_id': video.id}, user=request.user)
         return JsonResponse({
             'success': True,
-            'total_frames': total_frames,
-            'behavior_counts': behavior_counts,
-            'predominant_behavior': predominant_behavior,
-            'average_confidence': round(avg_confidence, 3),
-            'sample_detections': detections[:10]  # Primeras 10 detecciones
+            'job_id': job.id,
+            'job': job_service.to_dict(job)
         })
     except TrainingVideo.DoesNotExist:
         return JsonResponse({'success': False, 'error': 'Video no encontrado'})
@@ -78,26 +62,216 @@ def analyze_video(request):
         return JsonResponse({'success': False, 'error': str(e)})
 
 
+@login_required(login_url='monitoreo:login')
+def analyze_video_stream(request, video_id):
+    """
+    Analiza el video en la misma petición y envía cada ventana apenas se
+    clasifica, una línea JSON por ventana (application/x-ndjson)
+    """
+    try:
+        video = TrainingVideo.objects.get(id=video_id)
+    except TrainingVideo.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Video no encontrado'})
+    
+    if not detection_service.is_model_trained():
+        return JsonResponse({'success': False, 'error': 'Modelo no entrenado aún'})
+    
+    def lines():
+        try:
+            for detection in detection_service.iter_analysis(video.video.path):
+                yield json.dumps(detection) + '\n'
+        except Exception as e:
+            yield json.dumps({'error': str(e)}) + '\n'
+    
+    return StreamingHttpResponse(lines(), content_type='application/x-ndjson')
+
+
 @login_required(login_url='monitoreo:login')
 def get_training_stats(request):
     """
     Obtiene estadísticas de entrenamiento en tiempo real
     """
-    from .models import TrainingVideo, TrainedModel
+    from .models import TrainingVideo
+    from .services.model_registry import active_model_registry
     from django.db.models import Count
     
     videos = TrainingVideo.objects.values('behavior_type').annotate(count=Count('id'))
-    models = TrainedModel.objects.filter(is_active=True).first()
+    models = active_model_registry.get_info()
     
     stats = {
         'videos_by_type': {item['behavior_type']: item['count'] for item in videos},
         'total_videos': TrainingVideo.objects.count(),
         'model_info': {
             'is_active': bool(models),
-            'accuracy': models.accuracy if models else 0,
-            'f1_score': models.f1_score if models else 0,
-            'created_at': models.created_at.isoformat() if models else None
+            'accuracy': models['accuracy'] if models else 0,
+            'f1_score': models['f1_score'] if models else 0,
+            'created_at': models['created_at'].isoformat() if models else None
         }
     }
     
     return JsonResponse(stats)
+
+
+@login_required(login_url='monitoreo:login')
+def list_models(request):
+    """
+    Lista los modelos entrenados con F1, latencia medida y posición en la
+    búsqueda, para elegir uno que cumpla el presupuesto de latencia
+    """
+    from django.conf import settings
+    from .models import TrainedModel
+    
+    budget = getattr(settings, 'DETECTION_LATENCY_BUDGET_MS', None)
+    models = []
+    for model in TrainedModel.objects.all():
+        models.append({
+            'id': model.id,
+            'name': model.name,
+            'is_active': model.is_active,
+            'f1_score': model.f1_score,
+            'cv_f1_std': model.cv_f1_std,
+            'cv_folds': model.cv_folds,
+            'accuracy': model.accuracy,
+            'params': model.params,
+            'latency_p50_ms': model.latency_p50_ms,
+            'latency_p99_ms': model.latency_p99_ms,
+            'within_budget': (budget is None or model.latency_p99_ms is None
+                              or model.latency_p99_ms <= budget),
+            'search_rank': model.search_rank,
+            'created_at': model.created_at.isoformat(),
+        })
+    
+    return JsonResponse({'latency_budget_ms': budget, 'models': models})
+
+
+@login_required(login_url='monitoreo:login')
+@require_POST
+def activate_model(request, model_id):
+    """
+    Activa un modelo entrenado elegido por el operador
+    """
+    from .models import TrainedModel
+    from .services.detection_service import training_service
+    
+    try:
+        model = training_service.activate_model(model_id)
+        return JsonResponse({'success': True, 'model_id': model.id, 'name': model.name})
+    except TrainedModel.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Modelo no encontrado'})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+
+@login_required(login_url='monitoreo:login')
+def jobs(request):
+    """
+    GET: últimos trabajos en segundo plano.
+    POST: encola un trabajo. Campos: kind ('train', 'search', 'analyze'),
+    params (JSON) y priority (mayor se ejecuta primero).
+    """
+    from .models import BackgroundJob
+    from .services.job_service import job_service
+    
+    if request.method != 'POST':
+        recent = BackgroundJob.objects.all()[:50]
+        return JsonResponse({'jobs': [job_service.to_dict(job) for job in recent]})
+    
+    try:
+        if request.content_type == 'application/json':
+            data = json.loads(request.body or b'{}')
+        else:
+            data = request.POST.dict()
+        params = data.get('params') or {}
+        if isinstance(params, str):
+            params = json.loads(params)
+        
+        job = job_service.submit(
+            data.get('kind'),
+            params=params,
+            priority=int(data.get('priority', 0)),
+            user=request.user
+        )
+        return JsonResponse({
+            'success': True,
+            'duplicate': job.duplicate,
+            'job': job_service.to_dict(job)
+        })
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)})
+
+
+@login_required(login_url='monitoreo:login')
+def job_status(request, job_id):
+    """
+    Estado y progreso de un trabajo
+    """
+    from .models import BackgroundJob
+    from .services.job_service import job_service
+    
+    try:
+        job = BackgroundJob.objects.get(id=job_id)
+    except BackgroundJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Trabajo no encontrado'})
+    return JsonResponse({'success': True, 'job': job_service.to_dict(job)})
+
+
+@login_required(login_url='monitoreo:login')
+def job_events(request, job_id):
+    """
+    Server-Sent Events con el progreso de un trabajo: un evento 'progress'
+    por cada cambio y un evento 'end' con el resultado al terminar.
+    Cada conexión ocupa un worker mientras está abierta, así que se cierra
+    pasados JOBS_EVENTS_MAX_SECONDS y el navegador se reconecta solo (retry:);
+    un trabajo largo no retiene un worker WSGI síncrono todo el tiempo.
+    """
+    from django.conf import settings
+    from .services.job_service import job_service
+    
+    def stream():
+        yield 'retry: 3000\n\n'
+        for event, data in job_service.iter_events(
+                job_id, max_duration=getattr(settings, 'JOBS_EVENTS_MAX_SECONDS', 60)):
+            if event == 'keepalive':
+                yield ': keepalive\n\n'
+            else:
+                yield f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@login_required(login_url='monitoreo:login')
+def job_result(request, job_id):
+    """
+    Resultado de un trabajo terminado
+    """
+    from .models import BackgroundJob
+    from .services.job_service import job_service
+    
+    try:
+        job = BackgroundJob.objects.get(id=job_id)
+    except BackgroundJob.DoesNotExist:
+        return JsonResponse({'success': False, 'error': 'Trabajo no encontrado'})
+    
+    if job.status != 'done':
+        return JsonResponse({
+            'success': False,
+            'status': job.status,
+            'error': job.error or 'El trabajo aún no termina'
+        })
+    return JsonResponse({'success': True, 'job': job_service.to_dict(job, include_result=True)})
+
+
+@login_required(login_url='monitoreo:login')
+@require_POST
+def cancel_job(request, job_id):
+    """
+    Cancela un trabajo pendiente o en ejecución
+    """
+    from .services.job_service import job_service
+    
+    if job_service.cancel(job_id):
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': False, 'error': 'El trabajo no existe o ya terminó'})
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class MonitoreoConfig(AppConfig):
     name = 'monitoreo'
+
+    def ready(self):
+        from . import signals  # noqa: F401
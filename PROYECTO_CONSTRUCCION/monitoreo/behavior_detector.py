@@ -3,112 +3,167 @@ Sistema de detección de comportamiento con Machine Learning
 Utiliza OpenCV + scikit-learn Random Forest para clasificar videos
 """
 
-import cv2
+import copy
 import numpy as np
 import os
-from sklearn.ensemble import RandomForestClassifier
+import threading
+import time
+import uuid
+import cv2
 from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, precision_score, recall_score, f1_score
 import joblib
 
+from .classifier_backends import DEFAULT_BACKEND, get_backend
+from .feature_extractor import FRAME_SIZE, extract_video, iter_extract_videos
+from .forest_compiler import CompiledForest
+from .frame_sampling import get_sampling_policy
+from .frame_source import PrefetchFrameSource
+from .model_bundle import ModelBundle
+from .streaming_features import StreamingFeatureState
+
+
+def artifact_version(filepath):
+    """Versión de un artefacto guardado: su nombre sin extensiones"""
+    return os.path.basename(filepath).split('.', 1)[0]
+
+
+def _bundle_field(name):
+    """Atributo del detector que lee el paquete en uso; asignarlo publica una copia modificada"""
+    def fget(self):
+        return getattr(self.bundle, name)
+    
+    def fset(self, value):
+        changes = {name: value}
+        if name in ('model', 'scaler'):
+            # El bosque compilado ya no correspondería al modelo asignado
+            changes['compiled'] = None
+        self.publish(self.bundle.replace(**changes))
+    
+    return property(fget, fset)
+
 
 class BehaviorDetector:
-    """Clasificador de comportamientos en video usando Random Forest"""
-    
-    def __init__(self):
-        """Inicializa el detector"""
-        self.label_map = {
-            'normal': 0,
-            'robo': 1,
-            'agresion': 2,
-            'sospechoso': 3
-        }
-        self.reverse_map = {v: k for k, v in self.label_map.items()}
-        self.model = None
-        self.scaler = StandardScaler()
-        self.is_trained = False
+    """Clasificador de comportamientos en video (Random Forest u otro ClassifierBackend)"""
+    
+    def __init__(self, max_streams=64, stream_idle_seconds=300.0):
+        """
+        Inicializa el detector. Se conservan las ventanas de a lo sumo
+        max_streams cámaras; la de una cámara sin frames durante
+        stream_idle_seconds se descarta.
+        """
+        # Modelo en uso; solo se reemplaza entero con publish()
+        self.bundle = ModelBundle()
+        # Id del TrainedModel cuyo artefacto está cargado (None si no viene de la base)
+        self.artifact_id = None
+        self.max_streams = max_streams
+        self.stream_idle_seconds = stream_idle_seconds
+        self._stream_states = {}
+        self._stream_lock = threading.Lock()
+        self._streams_swept_at = time.monotonic()
+    
+    model = _bundle_field('model')
+    scaler = _bundle_field('scaler')
+    backend = _bundle_field('backend')
+    compiled = _bundle_field('compiled')
+    label_map = _bundle_field('label_map')
+    window_frames = _bundle_field('window_frames')
+    model_version = _bundle_field('model_version')
+    incremental_updates = _bundle_field('incremental_updates')
+    
+    @property
+    def reverse_map(self):
+        return self.bundle.reverse_map
+    
+    @property
+    def is_trained(self):
+        return self.bundle.is_trained
     
-    def extract_features(self, video_path, max_frames=30):
-        """Extrae características de un video para análisis"""
+    def publish(self, bundle):
+        """
+        Pone en uso un paquete ya construido. Es una sola asignación de
+        referencia: las predicciones en curso terminan con el paquete que
+        tomaron y las siguientes usan el nuevo, sin bloqueos ni estados mixtos.
+        """
+        self.bundle = bundle
+    
+    def extract_features(self, video_path, max_frames=30, sampling='first', prefetch=False):
+        """
+        Extrae características de un video para análisis.
+        sampling: 'first' (primeros frames), 'uniform', 'stride' o 'motion'
+        prefetch: decodificar en un hilo de fondo
+        """
         try:
-            cap = cv2.VideoCapture(video_path)
-            features_list = []
-            frame_count = 0
-            prev_gray = None
-            motion_scores = []
-            edge_scores = []
-            
-            while cap.isOpened() and frame_count < max_frames:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-                
-                frame = cv2.resize(frame, (320, 240))
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                
-                # Histograma de intensidad
-                hist = cv2.calcHist([gray], [0], None, [16], [0, 256])
-                hist = cv2.normalize(hist, hist).flatten()
-                
-                # Detección de movimiento
-                if prev_gray is not None:
-                    diff = cv2.absdiff(prev_gray, gray)
-                    _, thresh = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
-                    motion_score = np.sum(thresh) / (320 * 240 * 255)
-                    motion_scores.append(motion_score)
-                
-                # Detección de bordes
-                sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)
-                sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)
-                magnitude = np.sqrt(sobelx**2 + sobely**2)
-                edge_score = np.mean(magnitude) / 255
-                edge_scores.append(edge_score)
-                
-                features_list.append({
-                    'hist': hist,
-                    'mean': np.mean(gray) / 255,
-                    'std': np.std(gray) / 255
-                })
-                
-                prev_gray = gray.copy()
-                frame_count += 1
-            
-            cap.release()
-            
-            if not features_list:
-                return None
-            
-            # Compilar características agregadas
-            avg_motion = np.mean(motion_scores) if motion_scores else 0
-            avg_edges = np.mean(edge_scores) if edge_scores else 0
-            max_motion = np.max(motion_scores) if motion_scores else 0
-            max_edges = np.max(edge_scores) if edge_scores else 0
-            avg_hist = np.mean([f['hist'] for f in features_list], axis=0)
-            avg_mean = np.mean([f['mean'] for f in features_list])
-            avg_std = np.mean([f['std'] for f in features_list])
-            
-            final_features = np.concatenate([
-                avg_hist,  # 16
-                [avg_motion, max_motion, avg_edges, max_edges, avg_mean, avg_std, len(features_list) / max_frames]
-            ])
-            
-            # Padding a 80 características
-            if len(final_features) < 80:
-                final_features = np.pad(final_features, (0, 80 - len(final_features)), mode='constant')
-            else:
-                final_features = final_features[:80]
-            
-            return final_features
-            
+            return extract_video(video_path, max_frames=max_frames, sampling=sampling, prefetch=prefetch)
         except Exception as e:
             print(f"Error extrayendo características: {str(e)}")
             return None
     
-    def train(self, data_dir, test_size=0.2):
-        """Entrena el modelo con videos de data_dir"""
-        X = []
-        y = []
+    def extract_dataset(self, video_paths, cache=None, max_frames=30, n_jobs=1, max_in_flight=None,
+                        sampling='first', frame_store=None):
+        """
+        Extrae características de una lista de videos.
+        Genera (path, features, from_cache, error) en el mismo orden de entrada;
+        los videos que no están en caché se calculan desde frame_store (un
+        DecodedFrameStore) si ya tiene sus frames, y el resto se decodifica
+        repartido en n_jobs procesos.
+        """
+        video_paths = list(video_paths)
+        keys = {}
+        cached = {}
+        params = {'max_frames': max_frames}
+        if sampling != 'first':
+            policy = get_sampling_policy(sampling)
+            params['sampling'] = policy.key
+            if policy.paired:
+                # Movimiento medido contra el frame vecino de cada muestra
+                params['motion'] = 'adjacent'
+        
+        if cache is not None:
+            for path in video_paths:
+                try:
+                    keys[path] = cache.key_for(path, **params)
+                except OSError:
+                    continue
+                features = cache.get_by_key(keys[path])
+                if features is not None:
+                    cached[path] = features
+        
+        stored = {}
+        if frame_store is not None:
+            for path in video_paths:
+                if path not in cached:
+                    features = frame_store.extract(path, max_frames=max_frames, sampling=sampling)
+                    if features is not None:
+                        stored[path] = features
+        
+        missing = [path for path in video_paths if path not in cached and path not in stored]
+        extracted = iter_extract_videos(missing, max_frames=max_frames, n_jobs=n_jobs,
+                                        max_in_flight=max_in_flight, sampling=sampling)
+        
+        try:
+            for path in video_paths:
+                if path in cached:
+                    yield path, cached[path], True, None
+                    continue
+                
+                if path in stored:
+                    features, error = stored[path], None
+                else:
+                    _, features, error = next(extracted)
+                if features is not None and path in keys:
+                    cache.put_by_key(keys[path], features)
+                yield path, features, False, error
+        finally:
+            extracted.close()
+            if cache is not None:
+                cache.flush()
+    
+    def collect_videos(self, data_dir):
+        """Rutas de video de data_dir/<comportamiento>/ con su etiqueta"""
+        video_paths = []
+        labels = {}
         
         for behavior, label in self.label_map.items():
             behavior_dir = os.path.join(data_dir, behavior)
@@ -123,15 +178,67 @@ class BehaviorDetector:
             
             for video_file in video_files:
                 video_path = os.path.join(behavior_dir, video_file)
-                try:
-                    features = self.extract_features(video_path)
-                    if features is not None:
-                        X.append(features)
-                        y.append(label)
-                        print(f"  ✓ {video_file}")
-                except Exception as e:
-                    print(f"  ✗ Error en {video_file}")
-                    continue
+                video_paths.append(video_path)
+                labels[video_path] = label
+        
+        return video_paths, labels
+    
+    def load_dataset(self, video_paths, labels, progress=None, **extract_kwargs):
+        """
+        Retorna (X, y, paths) con las características de los videos legibles.
+        progress(**evento) recibe, por cada video, cuántos van procesados,
+        cuántos salieron de la caché y cuántos se decodificaron, y el ETA.
+        """
+        report = progress or (lambda **event: None)
+        X = []
+        y = []
+        paths = []
+        counts = {'processed': 0, 'cached': 0, 'decoded': 0, 'failed': 0}
+        total = len(video_paths)
+        start = time.monotonic()
+        report(phase='extracting', total=total, eta_seconds=None, **counts)
+        
+        for video_path, features, from_cache, error in self.extract_dataset(video_paths, **extract_kwargs):
+            video_file = os.path.basename(video_path)
+            counts['processed'] += 1
+            if features is None:
+                counts['failed'] += 1
+                print(f"  ✗ Error en {video_file}" + (f": {error}" if error else ""))
+            else:
+                counts['cached' if from_cache else 'decoded'] += 1
+                X.append(features)
+                y.append(labels[video_path])
+                paths.append(video_path)
+                print(f"  ✓ {video_file}{' (caché)' if from_cache else ''}")
+            
+            elapsed = time.monotonic() - start
+            report(
+                phase='extracting',
+                total=total,
+                current=video_file,
+                eta_seconds=round(elapsed / counts['processed'] * (total - counts['processed']), 1),
+                **counts
+            )
+        
+        return X, y, paths
+    
+    def train(self, data_dir, test_size=0.2, cache=None, max_frames=30, n_jobs=1, sampling='first',
+              params=None, progress=None, backend=DEFAULT_BACKEND, frame_store=None):
+        """
+        Entrena el modelo con videos de data_dir.
+        Si se pasa un FeatureCache, solo se decodifican videos nuevos o modificados;
+        con un DecodedFrameStore las características salen de sus frames sin
+        decodificar; con n_jobs != 1 la extracción se reparte en un pool de procesos.
+        backend: nombre del clasificador ('random_forest', 'hist_gradient_boosting', 'logistic')
+        params: hiperparámetros del clasificador (por defecto los del backend)
+        progress: función progress(**evento) con la fase y el avance
+        """
+        report = progress or (lambda **event: None)
+        backend = get_backend(backend)
+        video_paths, labels = self.collect_videos(data_dir)
+        X, y, _ = self.load_dataset(video_paths, labels, progress=progress, cache=cache,
+                                    max_frames=max_frames, n_jobs=n_jobs, sampling=sampling,
+                                    frame_store=frame_store)
         
         if len(X) < 2:
             raise ValueError("Necesita al menos 2 videos de entrenamiento")
@@ -145,29 +252,32 @@ class BehaviorDetector:
             X, y, test_size=test_size, random_state=42
         )
         
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
-        
-        print("Entrenando Random Forest...")
-        self.model = RandomForestClassifier(
-            n_estimators=100,
-            max_depth=15,
-            min_samples_split=5,
-            min_samples_leaf=2,
-            random_state=42,
-            n_jobs=-1
-        )
+        # Scaler y modelo nuevos, aparte del paquete en uso hasta publicarlos
+        scaler = StandardScaler()
+        X_train_scaled = scaler.fit_transform(X_train)
+        X_test_scaled = scaler.transform(X_test)
+        
+        print(f"Entrenando {backend.label}...")
+        model = backend.build(random_state=42, **(params or {}))
         
-        self.model.fit(X_train_scaled, y_train)
+        report(phase='fitting', samples=len(X_train), backend=backend.name)
+        model.fit(X_train_scaled, y_train)
         
-        y_pred = self.model.predict(X_test_scaled)
+        report(phase='evaluating', samples=len(X_test))
+        y_pred = model.predict(X_test_scaled)
         
         accuracy = accuracy_score(y_test, y_pred)
         precision = precision_score(y_test, y_pred, average='weighted', zero_division=0)
         recall = recall_score(y_test, y_pred, average='weighted', zero_division=0)
         f1 = f1_score(y_test, y_pred, average='weighted', zero_division=0)
         
-        self.is_trained = True
+        self.publish(ModelBundle.from_estimator(
+            model, scaler,
+            backend=backend.name,
+            label_map=self.label_map,
+            window_frames=max_frames,
+            model_version=uuid.uuid4().hex
+        ))
         
         print(f"\n✅ Modelo entrenado")
         print(f"  Accuracy:  {accuracy*100:.2f}%")
@@ -182,60 +292,379 @@ class BehaviorDetector:
             'f1': f1,
             'samples': len(X),
             'train_samples': len(X_train),
-            'test_samples': len(X_test)
+            'test_samples': len(X_test),
+            'evaluation': 'holdout',
+            'backend': backend.name
+        }
+    
+    def train_incremental(self, data_dir, new_paths, cache=None, n_jobs=1, sampling='first',
+                          n_new_trees=10, replay_per_class=20, random_state=None, progress=None,
+                          frame_store=None, holdout_size=0.2):
+        """
+        Actualiza el modelo actual con videos recién etiquetados sin reentrenar
+        todo el corpus:
+          1. Actualiza media y varianza del scaler solo con los videos nuevos
+             (partial_fit) y ajusta los umbrales de los árboles existentes para
+             que sigan tomando las mismas decisiones con la nueva escala.
+          2. Agrega n_new_trees árboles (warm_start) entrenados con los videos
+             nuevos más una muestra del corpus cacheado por clase, para que
+             los árboles nuevos vean todas las clases del modelo.
+        Las métricas se calculan sobre holdout_size de los videos nuevos de
+        cada clase, que no se usan para ajustar (los del corpus ya los vieron
+        los árboles anteriores). Si ninguna clase tiene videos nuevos
+        suficientes para apartar, se calculan sobre los datos de ajuste y el
+        resultado lo indica con evaluation='in_sample'.
+        Requiere el modelo completo de scikit-learn (no solo el compilado) de
+        un backend que admita actualizaciones (Random Forest).
+        """
+        bundle = self.bundle
+        if bundle.model is None:
+            raise ValueError("El entrenamiento incremental requiere el modelo completo")
+        if not get_backend(bundle.backend).supports_incremental:
+            raise ValueError(f"El clasificador {bundle.backend} no admite entrenamiento incremental")
+        
+        report = progress or (lambda **event: None)
+        new_paths = set(os.path.abspath(path) for path in new_paths)
+        video_paths, labels = self.collect_videos(data_dir)
+        X, y, paths = self.load_dataset(video_paths, labels, progress=progress, cache=cache,
+                                        max_frames=bundle.window_frames, n_jobs=n_jobs, sampling=sampling,
+                                        frame_store=frame_store)
+        
+        X = np.array(X)
+        y = np.array(y)
+        is_new = np.array([os.path.abspath(path) in new_paths for path in paths], dtype=bool)
+        if not is_new.any():
+            raise ValueError("No hay videos nuevos para el entrenamiento incremental")
+        
+        rng = np.random.default_rng(random_state)
+        
+        # Holdout estratificado de los videos nuevos (cada clase conserva al menos uno para ajustar)
+        holdout = []
+        for label in np.unique(y[is_new]):
+            candidates = np.flatnonzero(is_new & (y == label))
+            size = min(int(round(len(candidates) * holdout_size)), len(candidates) - 1)
+            if size > 0:
+                holdout.extend(rng.choice(candidates, size=size, replace=False))
+        holdout = np.asarray(holdout, dtype=np.intp)
+        is_fit_new = is_new.copy()
+        is_fit_new[holdout] = False
+        
+        # Muestra del corpus anterior, estratificada por clase
+        replay = []
+        for label in np.unique(y[~is_new]):
+            candidates = np.flatnonzero(~is_new & (y == label))
+            size = min(replay_per_class, len(candidates))
+            replay.extend(rng.choice(candidates, size=size, replace=False))
+        fit_rows = np.concatenate([np.flatnonzero(is_fit_new), np.asarray(replay, dtype=np.intp)])
+        
+        if not np.array_equal(np.unique(y[fit_rows]), bundle.model.classes_):
+            raise ValueError("Las clases de los videos nuevos no coinciden con las del modelo")
+        
+        print(f"\nActualización incremental: {int(is_new.sum())} videos nuevos "
+              f"({len(holdout)} para evaluar), {len(replay)} del corpus, {n_new_trees} árboles nuevos")
+        
+        # Trabajar sobre copias: si algo falla, el modelo en uso no cambia
+        model = copy.deepcopy(bundle.model)
+        scaler = copy.deepcopy(bundle.scaler)
+        old_mean, old_scale = scaler.mean_.copy(), scaler.scale_.copy()
+        scaler.partial_fit(X[is_new])
+        
+        # Umbral t en la escala anterior equivale a x = t * s_old + m_old
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            split = tree.children_left != -1
+            feature = tree.feature[split]
+            threshold = tree.threshold
+            threshold[split] = (
+                threshold[split] * old_scale[feature] + old_mean[feature] - scaler.mean_[feature]
+            ) / scaler.scale_[feature]
+        
+        model.set_params(warm_start=True, n_estimators=len(model.estimators_) + n_new_trees)
+        report(phase='fitting', samples=len(fit_rows), n_estimators=n_new_trees)
+        model.fit(scaler.transform(X[fit_rows]), y[fit_rows])
+        
+        # Sin holdout las métricas son sobre datos vistos y se marcan como tales
+        evaluation = 'holdout' if len(holdout) else 'in_sample'
+        eval_rows = holdout if len(holdout) else fit_rows
+        report(phase='evaluating', samples=len(eval_rows))
+        y_true = y[eval_rows]
+        y_pred = model.predict(scaler.transform(X[eval_rows]))
+        accuracy = accuracy_score(y_true, y_pred)
+        precision = precision_score(y_true, y_pred, average='weighted', zero_division=0)
+        recall = recall_score(y_true, y_pred, average='weighted', zero_division=0)
+        f1 = f1_score(y_true, y_pred, average='weighted', zero_division=0)
+        
+        self.publish(ModelBundle.from_estimator(
+            model, scaler,
+            backend=bundle.backend,
+            label_map=bundle.label_map,
+            window_frames=bundle.window_frames,
+            model_version=uuid.uuid4().hex,
+            incremental_updates=bundle.incremental_updates + 1
+        ))
+        
+        print(f"✅ Modelo actualizado ({len(model.estimators_)} árboles)")
+        
+        return {
+            'accuracy': accuracy,
+            'precision': precision,
+            'recall': recall,
+            'f1': f1,
+            'samples': len(X),
+            'train_samples': len(fit_rows),
+            'test_samples': len(eval_rows),
+            'evaluation': evaluation,
+            'new_samples': int(is_new.sum()),
+            'backend': bundle.backend
         }
     
-    def predict_frame(self, frame):
-        """Predice el comportamiento en un frame individual"""
-        if self.model is None or not self.is_trained:
+    def set_estimator(self, model, scaler, window_frames=None, backend=DEFAULT_BACKEND):
+        """Usa un modelo ya entrenado (por ejemplo, el elegido en una búsqueda)"""
+        self.publish(ModelBundle.from_estimator(
+            model, scaler,
+            backend=backend,
+            label_map=self.label_map,
+            window_frames=window_frames or self.window_frames,
+            model_version=uuid.uuid4().hex
+        ))
+    
+    def stream_state(self, camera_id, window=None):
+        """
+        Estado incremental de características de una cámara. Con camera_id
+        None retorna un estado nuevo que no se guarda (ventana propia de la
+        petición, nunca compartida con otros llamadores).
+        """
+        window = window or self.window_frames
+        if camera_id is None:
+            return StreamingFeatureState(window)
+        
+        now = time.monotonic()
+        state = self._stream_states.get(camera_id)
+        if state is None or state.window != window:
+            with self._stream_lock:
+                state = self._stream_states.get(camera_id)
+                if state is None or state.window != window:
+                    state = StreamingFeatureState(window)
+                    self._stream_states[camera_id] = state
+                    self._evict_streams(now)
+        elif now - self._streams_swept_at >= self.stream_idle_seconds / 4:
+            with self._stream_lock:
+                self._evict_streams(now)
+        state.last_used = now
+        return state
+    
+    def _evict_streams(self, now):
+        """Descarta las ventanas inactivas y, si sobran, las usadas hace más tiempo"""
+        self._streams_swept_at = now
+        idle = [camera_id for camera_id, state in self._stream_states.items()
+                if now - state.last_used > self.stream_idle_seconds]
+        for camera_id in idle:
+            del self._stream_states[camera_id]
+        excess = len(self._stream_states) - self.max_streams
+        if excess > 0:
+            oldest = sorted(self._stream_states, key=lambda camera_id: self._stream_states[camera_id].last_used)
+            for camera_id in oldest[:excess]:
+                del self._stream_states[camera_id]
+    
+    def reset_streams(self, camera_id=None):
+        """Descarta la ventana acumulada de una cámara (o de todas)"""
+        with self._stream_lock:
+            if camera_id is None:
+                self._stream_states.clear()
+            else:
+                self._stream_states.pop(camera_id, None)
+    
+    def predict_features(self, X, bundle=None):
+        """
+        Clasifica una matriz de características (n, 80) con una sola pasada
+        por el bosque (compilado si está disponible, si no scikit-learn).
+        Retorna (labels, confidences) como arreglos.
+        """
+        return (bundle or self.bundle).predict(X)
+    
+    def predict_batch(self, frames, camera_ids=None):
+        """
+        Predice un lote de frames, de una o varias cámaras, con una sola
+        pasada por el bosque. Cada frame se agrega antes a la ventana de su
+        cámara en el orden recibido. Sin camera_ids los frames se tratan como
+        una secuencia propia de esta llamada. Retorna (labels, confidences).
+        """
+        bundle = self.bundle
+        if not bundle.is_trained:
+            return None, None
+        
+        if camera_ids is None:
+            state = self.stream_state(None, bundle.window_frames)
+            features = np.stack([state.update(frame) for frame in frames])
+        else:
+            features = np.stack([
+                self.stream_state(camera_id, bundle.window_frames).update(frame)
+                for frame, camera_id in zip(frames, camera_ids)
+            ])
+        return bundle.predict(features)
+    
+    def predict_frame(self, frame, camera_id=None):
+        """
+        Predice el comportamiento en un frame individual.
+        El frame se agrega a la ventana deslizante de su cámara, así el vector
+        incluye el movimiento y los bordes de los últimos frames como en entrenamiento.
+        Sin camera_id el frame se clasifica solo, sin ventana acumulada.
+        """
+        if not self.is_trained:
             return None, 0.0
         
         try:
-            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if len(frame.shape) == 3 else frame
-            hist = cv2.calcHist([gray], [0], None, [16], [0, 256])
-            hist = cv2.normalize(hist, hist).flatten()
-            
-            edge_score = np.mean(cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)) / 255
-            
-            basic_features = np.array([
-                *hist,
-                0, 0, edge_score, edge_score,
-                np.mean(gray) / 255,
-                np.std(gray) / 255,
-                1
-            ])
-            
-            features = np.pad(basic_features, (0, max(0, 80 - len(basic_features))), mode='constant')
-            features_scaled = self.scaler.transform([features])[0]
-            
-            prediction = self.model.predict([features_scaled])[0]
-            probabilities = self.model.predict_proba([features_scaled])[0]
-            confidence = float(max(probabilities))
-            
-            return prediction, confidence
+            labels, confidences = self.predict_batch([frame], [camera_id])
+            return labels[0], float(confidences[0])
         except Exception:
             return None, 0.0
     
+    def iter_detect(self, video_path, stride=None, confidence=None, confirm_windows=3, batch_size=16,
+                    bundle=None):
+        """
+        Recorre un video en ventanas deslizantes de window_frames frames y
+        genera un dict por ventana con su comportamiento y confianza.
+        
+        stride: frames entre el inicio de dos ventanas (por defecto media ventana)
+        confidence: si se indica, se detiene en cuanto confirm_windows ventanas
+                    seguidas dan el mismo comportamiento con confianza >= confidence
+        
+        Los frames se decodifican, redimensionan y pasan a gris en un hilo de
+        fondo; las ventanas se clasifican en lotes de batch_size. Todo el video
+        se analiza con el mismo paquete (bundle, por defecto el que esté en
+        uso al empezar) aunque se publique otro modelo a mitad de camino.
+        """
+        bundle = bundle or self.bundle
+        if not bundle.is_trained:
+            raise ValueError("No hay modelo entrenado")
+        
+        window = bundle.window_frames
+        stride = stride or max(1, window // 2)
+        state = StreamingFeatureState(window)
+        source = PrefetchFrameSource(video_path, size=FRAME_SIZE, gray=True)
+        if not source.is_opened():
+            source.close()
+            raise ValueError(f"No se puede abrir el video: {video_path}")
+        fps = source.cap.get(cv2.CAP_PROP_FPS) or 30.0
+        
+        rows = []
+        ends = []
+        streak = {'label': None, 'count': 0}
+        
+        def classify():
+            """Clasifica las ventanas pendientes; el último elemento indica si parar"""
+            labels, confidences = bundle.predict(np.stack(rows))
+            for end, label, conf in zip(ends, labels, confidences):
+                detection = {
+                    'start_frame': max(0, end - window + 1),
+                    'end_frame': end,
+                    'time': round((end + 1) / fps, 3),
+                    'label': int(label),
+                    'behavior': bundle.reverse_map.get(int(label), 'desconocido'),
+                    'confidence': float(conf)
+                }
+                if confidence is not None and conf >= confidence:
+                    same = streak['label'] == detection['label']
+                    streak['count'] = streak['count'] + 1 if same else 1
+                    streak['label'] = detection['label']
+                else:
+                    streak['count'] = 0
+                    streak['label'] = None
+                done = confidence is not None and streak['count'] >= confirm_windows
+                detection['verdict'] = done
+                yield detection, done
+                if done:
+                    return
+            rows.clear()
+            ends.clear()
+        
+        try:
+            for index, frame in source:
+                features = state.update(frame)
+                if index + 1 >= window and (index + 1 - window) % stride == 0:
+                    rows.append(features)
+                    ends.append(index)
+                if len(rows) == batch_size:
+                    for detection, done in classify():
+                        yield detection
+                        if done:
+                            return
+            
+            # Videos más cortos que la ventana: una sola ventana con lo que haya
+            if not ends and state.count > 0 and state.count < window:
+                rows.append(state.features())
+                ends.append(state.count - 1)
+            if rows:
+                for detection, done in classify():
+                    yield detection
+                    if done:
+                        return
+        finally:
+            source.close()
+    
+    def detect_in_video(self, video_path, **kwargs):
+        """Lista de detecciones por ventana de un video (ver iter_detect)"""
+        return list(self.iter_detect(video_path, **kwargs))
+    
     def save_model(self, filepath):
         """Guarda el modelo entrenado"""
-        if self.model is None:
+        bundle = self.bundle
+        if bundle.model is None:
             raise ValueError("No hay modelo entrenado")
         
         model_data = {
-            'model': self.model,
-            'scaler': self.scaler,
-            'label_map': self.label_map,
-            'is_trained': self.is_trained
+            'model': bundle.model,
+            'scaler': bundle.scaler,
+            'backend': bundle.backend,
+            'label_map': bundle.label_map,
+            'is_trained': True,
+            'window_frames': bundle.window_frames,
+            'incremental_updates': bundle.incremental_updates
         }
         joblib.dump(model_data, filepath)
     
     def load_model(self, filepath):
         """Carga un modelo entrenado"""
         model_data = joblib.load(filepath)
-        self.model = model_data['model']
-        self.scaler = model_data['scaler']
-        self.label_map = model_data['label_map']
-        self.is_trained = model_data['is_trained']
+        self.publish(ModelBundle.from_estimator(
+            model_data['model'], model_data['scaler'],
+            backend=model_data.get('backend', DEFAULT_BACKEND),
+            label_map=model_data['label_map'],
+            window_frames=model_data.get('window_frames', 30),
+            model_version=artifact_version(filepath),
+            incremental_updates=model_data.get('incremental_updates', 0)
+        ))
+    
+    def save_compiled(self, filepath):
+        """
+        Guarda solo el bosque compilado (arreglos planos sin comprimir), que
+        se puede cargar con memmap y compartir entre procesos.
+        Solo existe para backends que compilan (Random Forest).
+        """
+        bundle = self.bundle
+        if bundle.compiled is None:
+            raise ValueError("No hay bosque compilado")
+        
+        joblib.dump({
+            'forest': bundle.compiled.to_dict(),
+            'label_map': bundle.label_map,
+            'window_frames': bundle.window_frames
+        }, filepath)
+    
+    def load_compiled(self, filepath, mmap_mode='r'):
+        """
+        Carga un bosque compilado. Con mmap_mode='r' los arreglos quedan
+        mapeados desde el archivo: las páginas las comparte el sistema
+        operativo entre todos los workers en vez de copiarse en cada uno.
+        No carga el modelo de scikit-learn (model queda en None).
+        """
+        data = joblib.load(filepath, mmap_mode=mmap_mode)
+        self.publish(ModelBundle(
+            compiled=CompiledForest.from_dict(data['forest']),
+            label_map=data['label_map'],
+            window_frames=data.get('window_frames', 30),
+            model_version=artifact_version(filepath)
+        ))
 
 
 # Instancia global
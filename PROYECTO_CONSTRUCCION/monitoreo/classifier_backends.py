@@ -0,0 +1,102 @@
+"""
+Clasificadores intercambiables para BehaviorDetector
+Cada backend construye el estimador de scikit-learn que se entrena sobre las
+características escaladas y, si puede, su versión compilada para inferencia.
+Todos comparten el mismo StandardScaler y la misma interfaz predict_proba,
+así que se entrenan, guardan y sirven igual.
+"""
+
+from sklearn.ensemble import HistGradientBoostingClassifier, RandomForestClassifier
+from sklearn.linear_model import LogisticRegression
+
+from .forest_compiler import CompiledForest
+from .model_search import DEFAULT_FOREST_PARAMS
+
+
+class ClassifierBackend:
+    """Tipo de clasificador que puede usar el detector"""
+
+    name = None
+    label = None
+    default_params = {}
+    # Admite train_incremental (agregar árboles con warm_start)
+    supports_incremental = False
+
+    def build(self, random_state=42, **params):
+        """Estimador sin entrenar con los parámetros por defecto más params"""
+        raise NotImplementedError
+
+    def compile(self, model, scaler):
+        """Evaluador compilado de model + scaler, o None si se usa scikit-learn"""
+        return None
+
+
+class RandomForestBackend(ClassifierBackend):
+    """Random Forest (modelo original); se sirve con el bosque compilado"""
+
+    name = 'random_forest'
+    label = 'Random Forest'
+    default_params = DEFAULT_FOREST_PARAMS
+    supports_incremental = True
+
+    def build(self, random_state=42, **params):
+        return RandomForestClassifier(
+            **dict(self.default_params, **params),
+            random_state=random_state,
+            n_jobs=-1
+        )
+
+    def compile(self, model, scaler):
+        return CompiledForest.from_sklearn(model, scaler)
+
+
+class HistGradientBoostingBackend(ClassifierBackend):
+    """Gradient boosting sobre histogramas: pocos árboles poco profundos"""
+
+    name = 'hist_gradient_boosting'
+    label = 'HistGradientBoosting'
+    default_params = {
+        'max_iter': 100,
+        'learning_rate': 0.1,
+        'max_leaf_nodes': 31,
+        # Con pocos videos la validación interna dejaría casi sin datos
+        'early_stopping': False,
+    }
+
+    def build(self, random_state=42, **params):
+        return HistGradientBoostingClassifier(**dict(self.default_params, **params),
+                                              random_state=random_state)
+
+
+class LogisticBackend(ClassifierBackend):
+    """Regresión logística multiclase: un producto matriz-vector por fila"""
+
+    name = 'logistic'
+    label = 'Regresión logística'
+    default_params = {
+        'C': 1.0,
+        'max_iter': 1000,
+    }
+
+    def build(self, random_state=42, **params):
+        return LogisticRegression(**dict(self.default_params, **params), random_state=random_state)
+
+
+CLASSIFIER_BACKENDS = {
+    backend.name: backend
+    for backend in (RandomForestBackend, HistGradientBoostingBackend, LogisticBackend)
+}
+
+DEFAULT_BACKEND = RandomForestBackend.name
+
+
+def get_backend(backend):
+    """Acepta un nombre registrado o una instancia de ClassifierBackend"""
+    if isinstance(backend, ClassifierBackend):
+        return backend
+    try:
+        return CLASSIFIER_BACKENDS[backend or DEFAULT_BACKEND]()
+    except KeyError:
+        raise ValueError(
+            f"Clasificador no soportado: {backend}. Use: {', '.join(CLASSIFIER_BACKENDS)}"
+        )
@@ -1,10 +1,19 @@
 # camara.py
 import cv2
-import numpy as np
-from ultralytics import YOLO
-import datetime
 import os
 
+from django.conf import settings
+from django.utils import timezone
+
+from .frame_source import PrefetchFrameSource
+from .pose_gating import MotionGate, iter_gated_poses
+from .pose_tracking import PoseTracker
+from .services.batching_service import MicroBatcher
+from .services.clip_service import ClipRecorder, link_clip_to_alert
+from .services.evidence_service import EvidenceWriter
+from .services.inference_server import remote_client, submit_with_fallback
+from .services.resource_registry import resources
+
 # ==================================================
 # CONFIGURACIÓN GENERAL (AJUSTABLE)
 # ==================================================
@@ -17,125 +26,233 @@ UMBRAL_CUERPO = 4
 UMBRAL_BRAZOS = 3
 FRAMES_SOSPECHOSOS = 4  # frames consecutivos
 
+# Seguimiento de personas: distancia media máxima (px) entre keypoints para
+# asociar una detección con su track, y frames que un track sobrevive sin verse
+DISTANCIA_MAX_TRACK = 80
+FRAMES_MAX_PERDIDO = 5
+
+CONFIANZA_POSE = 0.3
+
+# Inferencia por lotes: frames de todas las cámaras se juntan en una sola
+# llamada a YOLO (hasta POSE_BATCH_SIZE frames o POSE_BATCH_LATENCY_MS de espera)
+POSE_BATCH_SIZE = 8
+POSE_BATCH_LATENCY_MS = 15
+# Frames de cada stream en vuelo a la vez (permite lotes con una sola cámara)
+POSE_PIPELINE_DEPTH = 4
+
+# Pose según movimiento: con la escena quieta no se infiere (se refresca cada
+# POSE_IDLE_REFRESH frames); con movimiento se infiere cada POSE_BURST_STRIDE
+# frames y se interpolan los keypoints intermedios. POSE_GATING = False
+# infiere todos los frames.
+POSE_GATING = True
+POSE_GATE_METHOD = 'diff'  # 'diff' (diferencia de frames) o 'flow' (OpticalFlowService)
+# Umbral de movimiento según POSE_GATE_METHOD, cada uno en su unidad
+POSE_MOTION_THRESHOLDS = {
+    'diff': 0.01,  # fracción de píxeles que cambian
+    'flow': 0.1,   # motion_level: desplazamiento medio en píxeles (frame de 80x60)
+}
+POSE_BURST_STRIDE = 2
+POSE_IDLE_REFRESH = 30
+
 ALERT_DIR = "media/alertas"
 os.makedirs(ALERT_DIR, exist_ok=True)
 
+# Evidencias: como mucho una por cámara cada EVIDENCIA_INTERVALO_CAMARA
+# segundos y una por persona cada EVIDENCIA_INTERVALO_TRACK segundos; se
+# omiten frames casi iguales al último guardado (distancia dHash en bits)
+EVIDENCIA_INTERVALO_CAMARA = 2.0
+EVIDENCIA_INTERVALO_TRACK = 10.0
+EVIDENCIA_DISTANCIA_HASH = 6
+
+# Clips de incidente: segundos antes y después del disparo, ancho máximo de
+# los frames guardados y ventana (s) para asociar el clip a una alerta existente
+CLIP_SEGUNDOS_ANTES = 5
+CLIP_SEGUNDOS_DESPUES = 5
+CLIP_ANCHO_MAX = 640
+CLIP_VENTANA_ALERTA = 60
+CLIP_DIR = os.path.join(settings.MEDIA_ROOT, "alertas", "clips")
+
 # ==================================================
 # MODELO
 # ==================================================
 
-model = YOLO(MODEL_PATH)
+def cargar_modelo_pose():
+    """Carga YOLO pose; se llama una vez por proceso desde resources.get('pose_model')"""
+    from ultralytics import YOLO
+    return YOLO(MODEL_PATH)
+
+
+def inferir_poses(frames):
+    """
+    Una sola llamada de YOLO para un lote de frames.
+    Retorna, por frame y en el mismo orden, los keypoints (personas, 17, 2) o None.
+    """
+    model = resources.get('pose_model')
+    results = model(list(frames), conf=CONFIANZA_POSE, verbose=False)
+    poses = []
+    for result in results:
+        keypoints = result.keypoints
+        poses.append(keypoints.xy.cpu().numpy() if keypoints is not None else None)
+    return poses
+
+
+# Escritura de evidencias fuera del hilo del stream
+evidencias = EvidenceWriter(
+    ALERT_DIR,
+    camera_interval=EVIDENCIA_INTERVALO_CAMARA,
+    track_interval=EVIDENCIA_INTERVALO_TRACK,
+    min_hash_distance=EVIDENCIA_DISTANCIA_HASH
+)
+
+
+# Compartido por todos los streams de cámara del proceso
+pose_batcher = MicroBatcher(
+    inferir_poses,
+    max_batch_size=POSE_BATCH_SIZE,
+    max_latency=POSE_BATCH_LATENCY_MS / 1000,
+    name='pose-batcher'
+)
+
+
+def frames_con_pose(cap, depth=POSE_PIPELINE_DEPTH, gating=POSE_GATING):
+    """
+    Genera (frame, keypoints) en el orden de la fuente. Los frames que se
+    infieren van al lote compartido con hasta depth pendientes, así los
+    frames de esta cámara también se agrupan entre sí. Con
+    INFERENCE_SERVER_ADDRESS el lote es el del servidor de inferencia, que
+    comparten todos los workers; si el servidor se cae o se traba durante el
+    stream, los frames se infieren en el proceso.
+    """
+    client = remote_client()
+    if client is not None:
+        submit = submit_with_fallback(client.submit_pose, pose_batcher.submit)
+    else:
+        submit = pose_batcher.submit
+
+    # La fuente reutiliza sus buffers: los frames en vuelo necesitan copia
+    frames = (frame.copy() for _, frame in cap)
+    if gating:
+        gate = MotionGate(threshold=POSE_MOTION_THRESHOLDS[POSE_GATE_METHOD], method=POSE_GATE_METHOD)
+        poses = iter_gated_poses(frames, submit, gate, stride=POSE_BURST_STRIDE,
+                                 idle_refresh=POSE_IDLE_REFRESH, depth=depth)
+    else:
+        poses = iter_gated_poses(frames, submit, depth=depth)
+
+    for frame, keypoints, _ in poses:
+        yield frame, keypoints
 
 # ==================================================
-# FUNCIÓN PARA DETECTAR FORCEJEO (BRAZOS)
+# STREAM DE CÁMARA
 # ==================================================
 
-def movimiento_brazos(curr, prev):
-    # Hombros, codos y muñecas (YOLOv8 Pose)
-    idx = [5, 6, 7, 8, 9, 10]
-    return np.abs(curr[idx] - prev[idx]).mean()
+def camara_de(source):
+    """Identificador de la cámara de un video o dispositivo (nombre sin extensión)"""
+    return os.path.splitext(os.path.basename(str(source).replace('\\', '/')))[0]
 
-# ==================================================
-# STREAM DE CÁMARA
-# ==================================================
 
-def camara_seguridad_stream():
+def camara_seguridad_stream(source=VIDEO_PATH):
 
-    cap = cv2.VideoCapture(VIDEO_PATH)
+    # Decodificación en segundo plano; al terminar el video vuelve al inicio
+    cap = PrefetchFrameSource(source, loop=True)
+    camara = camara_de(source)
 
-    if not cap.isOpened():
+    if not cap.is_opened():
         print("ERROR: No se pudo abrir el video")
         return
 
-    prev_keypoints = []
-    contador_sospecha = []
-
-    while True:
-        ret, frame = cap.read()
+    # Movimiento del cuerpo y de los brazos (forcejeo) y contador de sospecha
+    # por persona, asociando las detecciones de cada frame con su track
+    tracker = PoseTracker(
+        body_threshold=UMBRAL_CUERPO,
+        arm_threshold=UMBRAL_BRAZOS,
+        confirm_frames=FRAMES_SOSPECHOSOS,
+        max_distance=DISTANCIA_MAX_TRACK,
+        max_missed=FRAMES_MAX_PERDIDO
+    )
 
-        if not ret:
-            cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
-            continue
+    # Pre-grabación de la cámara en un buffer circular para el clip del incidente
+    clips = ClipRecorder(
+        CLIP_DIR,
+        camera_id=camara,
+        fps=cap.cap.get(cv2.CAP_PROP_FPS) or 30,
+        pre_seconds=CLIP_SEGUNDOS_ANTES,
+        post_seconds=CLIP_SEGUNDOS_DESPUES,
+        max_width=CLIP_ANCHO_MAX
+    )
 
-        results = model(frame, conf=0.3)
-        annotated = frame.copy()
+    def asociar_clip(path, disparo):
+        link_clip_to_alert(path, camera_id=camara, triggered_at=disparo, window=CLIP_VENTANA_ALERTA)
 
-        keypoints = results[0].keypoints
+    try:
+        for frame, current in frames_con_pose(cap):
 
-        if keypoints is not None:
-            current = keypoints.xy.cpu().numpy()
+            annotated = frame
+            alerta = False
 
-            # Asegurar tamaño del contador
-            while len(contador_sospecha) < len(current):
-                contador_sospecha.append(0)
+            if current is not None:
 
-            for i, curr in enumerate(current):
+                tracks = tracker.update(current)
 
-                tipo = "NORMAL"
-                color = (0, 255, 0)
+                for curr, track_id, sospechoso in zip(current, tracks.track_ids, tracks.suspicious):
 
-                if i < len(prev_keypoints):
-                    prev = prev_keypoints[i]
-
-                    # Movimiento general del cuerpo
-                    diff_cuerpo = np.abs(curr - prev).mean()
-
-                    # Movimiento violento de brazos (forcejeo)
-                    diff_brazos = movimiento_brazos(curr, prev)
-
-                    # Acumulación temporal
-                    if diff_cuerpo > UMBRAL_CUERPO or diff_brazos > UMBRAL_BRAZOS:
-                        contador_sospecha[i] += 1
-                    else:
-                        contador_sospecha[i] = max(0, contador_sospecha[i] - 1)
+                    tipo = "NORMAL"
+                    color = (0, 255, 0)
 
                     # Confirmación de sospecha
-                    if contador_sospecha[i] >= FRAMES_SOSPECHOSOS:
+                    if sospechoso:
                         tipo = "SOSPECHOSO"
                         color = (0, 0, 255)
 
-                        # Guardar evidencia
-                        now = datetime.datetime.now()
-                        filename = f"alerta_{now.strftime('%Y%m%d_%H%M%S')}.jpg"
-                        cv2.imwrite(os.path.join(ALERT_DIR, filename), annotated)
-
-                # Posición del texto (cabeza)
-                x, y = int(curr[0][0]), int(curr[0][1])
-
-                cv2.putText(
-                    annotated,
-                    tipo,
-                    (x, y - 15),
-                    cv2.FONT_HERSHEY_SIMPLEX,
-                    0.9,
-                    color,
-                    2
-                )
-
-                # Dibujar keypoints
-                for kp in curr:
-                    cv2.circle(
+                    # Posición del texto (cabeza)
+                    x, y = int(curr[0][0]), int(curr[0][1])
+
+                    cv2.putText(
                         annotated,
-                        (int(kp[0]), int(kp[1])),
-                        3,
+                        f"{tipo} #{track_id}",
+                        (x, y - 15),
+                        cv2.FONT_HERSHEY_SIMPLEX,
+                        0.9,
                         color,
-                        -1
+                        2
                     )
 
-        prev_keypoints = current.copy() if keypoints is not None else prev_keypoints
-
-        # ==================================================
-        # STREAM PARA DJANGO
-        # ==================================================
-
-        _, buffer = cv2.imencode(".jpg", annotated)
-        frame_bytes = buffer.tobytes()
-
-        yield (
-            b"--frame\r\n"
-            b"Content-Type: image/jpeg\r\n\r\n" +
-            frame_bytes +
-            b"\r\n"
-        )
-
-    cap.release()
+                    # Dibujar keypoints
+                    for kp in curr:
+                        cv2.circle(
+                            annotated,
+                            (int(kp[0]), int(kp[1])),
+                            3,
+                            color,
+                            -1
+                        )
+
+                # Guardar evidencia (en segundo plano, con límite por cámara y por persona)
+                if tracks.suspicious.any():
+                    alerta = True
+                    evidencias.submit(annotated, camera_id=camara,
+                                      track_ids=tracks.track_ids[tracks.suspicious])
+
+            # Clip del incidente: el buffer solo copia el frame; el video se
+            # codifica en segundo plano a medida que llega la post-grabación
+            clips.push(annotated)
+            if alerta and not clips.recording:
+                disparo = timezone.now()
+                clips.trigger(lambda path, disparo=disparo: asociar_clip(path, disparo))
+
+            # ==================================================
+            # STREAM PARA DJANGO
+            # ==================================================
+
+            _, buffer = cv2.imencode(".jpg", annotated)
+            frame_bytes = buffer.tobytes()
+
+            yield (
+                b"--frame\r\n"
+                b"Content-Type: image/jpeg\r\n\r\n" +
+                frame_bytes +
+                b"\r\n"
+            )
+    finally:
+        # También se ejecuta cuando el cliente cierra el stream
+        clips.flush()
+        cap.close()
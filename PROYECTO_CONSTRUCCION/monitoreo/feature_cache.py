@@ -0,0 +1,204 @@
+"""
+Caché persistente de características direccionada por contenido
+Las filas se guardan en una matriz .npy compacta (leída con memmap) y un
+índice JSON que asocia hash del video + versión del extractor a cada fila.
+Varios procesos pueden compartir la caché: flush toma un candado de archivo y
+combina sus filas nuevas con las que ya estén en disco.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+from .feature_extractor import EXTRACTOR_VERSION, N_FEATURES
+
+
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def file_sha256(path):
+    """Hash SHA-256 del contenido de un archivo, leído por bloques"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@contextmanager
+def file_lock(path):
+    """Candado exclusivo entre procesos sobre el archivo path (se crea si falta)"""
+    with open(path, 'a+b') as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def feature_key(content_hash, **params):
+    """Clave de caché: hash del contenido + versión del extractor + parámetros"""
+    parts = [content_hash, f"v{EXTRACTOR_VERSION}"]
+    parts.extend(f"{name}={params[name]}" for name in sorted(params))
+    return ':'.join(parts)
+
+
+class FeatureCache:
+    """Almacén en disco de vectores de características por video"""
+
+    MATRIX_FILE = 'features.npy'
+    INDEX_FILE = 'index.json'
+    LOCK_FILE = '.lock'
+
+    def __init__(self, root, n_features=N_FEATURES):
+        self.root = str(root)
+        self.n_features = n_features
+        self._lock = threading.Lock()
+        self._matrix = None
+        self._pending = []
+        self._index = {'rows': {}, 'files': {}}
+        self._load()
+
+    @property
+    def matrix_path(self):
+        return os.path.join(self.root, self.MATRIX_FILE)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, self.INDEX_FILE)
+
+    @property
+    def lock_path(self):
+        return os.path.join(self.root, self.LOCK_FILE)
+
+    def __len__(self):
+        return len(self._index['rows'])
+
+    def _read(self):
+        """Índice y matriz (memmap) guardados en disco; vacíos si faltan o no son válidos"""
+        empty = {'rows': {}, 'files': {}}, None
+        if not os.path.exists(self.index_path) or not os.path.exists(self.matrix_path):
+            return empty
+        try:
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode='r')
+        except (OSError, ValueError) as e:
+            print(f"Caché de características inválida, se reconstruirá: {str(e)}")
+            return empty
+        if matrix.ndim != 2 or matrix.shape[1] != self.n_features:
+            return empty
+        return index, matrix
+
+    def _load(self):
+        """Carga el índice y abre la matriz en modo memmap"""
+        self._index, self._matrix = self._read()
+
+    def content_hash(self, path):
+        """
+        Hash del contenido de un video. Si tamaño y fecha de modificación no
+        cambiaron desde la última vez, reutiliza el hash guardado.
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        known = self._index['files'].get(path)
+        if known and known['size'] == stat.st_size and known['mtime_ns'] == stat.st_mtime_ns:
+            return known['sha256']
+
+        content_hash = file_sha256(path)
+        with self._lock:
+            self._index['files'][path] = {
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': content_hash,
+            }
+        return content_hash
+
+    def key_for(self, path, **params):
+        return feature_key(self.content_hash(path), **params)
+
+    def get(self, path, **params):
+        """Retorna las características cacheadas de un video o None"""
+        return self.get_by_key(self.key_for(path, **params))
+
+    def get_by_key(self, key):
+        with self._lock:
+            row = self._index['rows'].get(key)
+            if row is None:
+                return None
+            stored = self._matrix.shape[0] if self._matrix is not None else 0
+            if row < stored:
+                return np.array(self._matrix[row])
+            return self._pending[row - stored].copy()
+
+    def put(self, path, features, **params):
+        """Agrega las características de un video (se persisten con flush)"""
+        self.put_by_key(self.key_for(path, **params), features)
+
+    def put_by_key(self, key, features):
+        features = np.asarray(features, dtype=np.float64).reshape(self.n_features)
+        with self._lock:
+            if key in self._index['rows']:
+                return
+            stored = self._matrix.shape[0] if self._matrix is not None else 0
+            self._index['rows'][key] = stored + len(self._pending)
+            self._pending.append(features)
+
+    def flush(self):
+        """
+        Escribe de forma atómica la matriz y el índice en disco. Bajo el
+        candado de archivo relee lo guardado (quizá por otro proceso desde la
+        última lectura) y le agrega solo las filas que falten: no se pierde
+        ninguna entrada ajena.
+        """
+        with self._lock:
+            os.makedirs(self.root, exist_ok=True)
+            with file_lock(self.lock_path):
+                index, disk_matrix = self._read()
+                stored = self._matrix.shape[0] if self._matrix is not None else 0
+                first_new = disk_matrix.shape[0] if disk_matrix is not None else 0
+                added = []
+                for key, row in self._index['rows'].items():
+                    if key not in index['rows']:
+                        index['rows'][key] = first_new + len(added)
+                        added.append(self._matrix[row] if row < stored else self._pending[row - stored])
+                index['files'].update(self._index['files'])
+
+                if added:
+                    parts = [] if disk_matrix is None else [np.asarray(disk_matrix)]
+                    parts.append(np.vstack(added))
+                    matrix = np.concatenate(parts)
+
+                    # Liberar los memmaps antes de reemplazar el archivo (Windows)
+                    self._matrix = disk_matrix = None
+                    tmp = f"{self.matrix_path}.{os.getpid()}.tmp"
+                    with open(tmp, 'wb') as f:
+                        np.save(f, matrix)
+                    os.replace(tmp, self.matrix_path)
+
+                tmp = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    json.dump(index, f)
+                os.replace(tmp, self.index_path)
+
+                self._index = index
+                self._pending = []
+                self._matrix = np.load(self.matrix_path, mmap_mode='r') if os.path.exists(self.matrix_path) else None
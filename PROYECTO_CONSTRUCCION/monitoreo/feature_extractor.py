@@ -0,0 +1,347 @@
+"""
+Motor de extracción de características por lotes
+Decodifica una ventana de frames en un solo arreglo uint8 y calcula
+histogramas, movimiento, bordes y media/desviación de toda la ventana
+con operaciones vectorizadas de NumPy/OpenCV en float32
+"""
+
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import cv2
+import numpy as np
+
+from .frame_sampling import plan_frames, read_frames_at
+from .frame_source import PrefetchFrameSource
+
+
+# Geometría de trabajo (ancho, alto) usada en entrenamiento e inferencia
+FRAME_WIDTH = 320
+FRAME_HEIGHT = 240
+FRAME_SIZE = (FRAME_WIDTH, FRAME_HEIGHT)
+
+N_FEATURES = 80
+HIST_BINS = 16
+MOTION_THRESHOLD = 30
+
+# Radio del kernel Sobel ksize=5
+SOBEL_KSIZE = 5
+SOBEL_PAD = SOBEL_KSIZE // 2
+
+# Se incrementa cada vez que cambia la definición del vector de características
+EXTRACTOR_VERSION = 1
+
+
+def to_gray(frame, out=None):
+    """Redimensiona un frame BGR a FRAME_SIZE y lo convierte a escala de grises"""
+    if frame.shape[1] != FRAME_WIDTH or frame.shape[0] != FRAME_HEIGHT:
+        frame = cv2.resize(frame, FRAME_SIZE)
+    if frame.ndim == 3:
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=out)
+    if out is None:
+        return frame
+    np.copyto(out, frame)
+    return out
+
+
+def read_gray_frames(cap, max_frames, out=None):
+    """
+    Decodifica hasta max_frames frames de cap dentro de un arreglo
+    preasignado (max_frames, alto, ancho) uint8.
+    Retorna la vista con los frames leídos.
+    """
+    if out is None:
+        out = np.empty((max_frames, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+
+    count = 0
+    while cap.isOpened() and count < max_frames:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        to_gray(frame, out=out[count])
+        count += 1
+
+    return out[:count]
+
+
+def motion_fraction(frames, prev_frames):
+    """
+    Fracción de píxeles con cambio > MOTION_THRESHOLD entre dos pilas
+    (N, alto, ancho) uint8, par a par: una sola diferencia y umbral.
+    """
+    n, h, w = frames.shape
+    if n == 0:
+        return np.zeros(0)
+    diff = cv2.absdiff(np.ascontiguousarray(frames).reshape(-1, w),
+                       np.ascontiguousarray(prev_frames).reshape(-1, w))
+    _, moved = cv2.threshold(diff, MOTION_THRESHOLD, 1, cv2.THRESH_BINARY)
+    return moved.reshape(n, -1).sum(axis=1, dtype=np.int64) / float(h * w)
+
+
+def window_stats(frames, motion=None):
+    """
+    Calcula las estadísticas por frame de una ventana (N, alto, ancho) uint8.
+    motion permite pasar el movimiento ya medido (p. ej. contra los vecinos
+    de muestras no consecutivas); por defecto se mide entre frames sucesivos.
+
+    Retorna un dict con:
+      hist   (N, 16) histogramas normalizados (L2)
+      motion (N-1,)  fracción de píxeles con cambio > MOTION_THRESHOLD
+      edges  (N,)    magnitud media de Sobel / 255
+      mean   (N,)    intensidad media / 255
+      std    (N,)    desviación estándar / 255
+    """
+    n, h, w = frames.shape
+    p = SOBEL_PAD
+
+    hist = np.empty((n, HIST_BINS), dtype=np.float32)
+    mean = np.empty(n)
+    std = np.empty(n)
+    edges = np.empty(n)
+
+    if motion is None:
+        motion = motion_fraction(frames[1:], frames[:-1]) if n > 1 else np.zeros(0)
+
+    # Bordes: cada frame lleva su propio borde reflejado, así un único Sobel
+    # sobre la pila apilada en vertical coincide con el Sobel por frame
+    padded = np.empty((n, h + 2 * p, w + 2 * p), dtype=np.uint8)
+    for i in range(n):
+        cv2.copyMakeBorder(frames[i], p, p, p, p, cv2.BORDER_REFLECT_101, dst=padded[i])
+    tall = padded.reshape(-1, w + 2 * p)
+    sobelx = cv2.Sobel(tall, cv2.CV_32F, 1, 0, ksize=SOBEL_KSIZE)
+    sobely = cv2.Sobel(tall, cv2.CV_32F, 0, 1, ksize=SOBEL_KSIZE)
+    magnitude = cv2.magnitude(sobelx, sobely).reshape(n, h + 2 * p, w + 2 * p)
+
+    # Reducciones por frame (llamadas C baratas sobre vistas de la pila)
+    for i in range(n):
+        gray = frames[i]
+        hist[i] = cv2.calcHist([gray], [0], None, [HIST_BINS], [0, 256]).ravel()
+        m, s = cv2.meanStdDev(gray)
+        mean[i] = m[0, 0]
+        std[i] = s[0, 0]
+        edges[i] = cv2.mean(magnitude[i, p:-p, p:-p])[0]
+
+    norms = np.sqrt(np.einsum('ij,ij->i', hist, hist))
+    hist /= np.maximum(norms, np.finfo(np.float32).tiny)[:, None]
+
+    return {
+        'hist': hist,
+        'motion': motion,
+        'edges': edges / 255,
+        'mean': mean / 255,
+        'std': std / 255,
+    }
+
+
+def frame_stats(gray, prev_gray=None):
+    """
+    Estadísticas de un solo frame gris (alto, ancho) uint8, calculadas con las
+    mismas operaciones que window_stats. Retorna (hist, moved, edge, mean, std),
+    donde moved es el número de píxeles que cambiaron respecto a prev_gray
+    (None si no hay frame previo).
+    """
+    hist = cv2.calcHist([gray], [0], None, [HIST_BINS], [0, 256]).reshape(1, HIST_BINS)
+    norm = np.sqrt(np.einsum('ij,ij->i', hist, hist))
+    hist /= np.maximum(norm, np.finfo(np.float32).tiny)[:, None]
+
+    moved = None
+    if prev_gray is not None:
+        diff = cv2.absdiff(gray, prev_gray)
+        _, thresh = cv2.threshold(diff, MOTION_THRESHOLD, 1, cv2.THRESH_BINARY)
+        moved = int(thresh.sum(dtype=np.int64))
+
+    # Mismo relleno y recorte que window_stats para que la suma sea idéntica
+    p = SOBEL_PAD
+    padded = cv2.copyMakeBorder(gray, p, p, p, p, cv2.BORDER_REFLECT_101)
+    sobelx = cv2.Sobel(padded, cv2.CV_32F, 1, 0, ksize=SOBEL_KSIZE)
+    sobely = cv2.Sobel(padded, cv2.CV_32F, 0, 1, ksize=SOBEL_KSIZE)
+    edge = cv2.mean(cv2.magnitude(sobelx, sobely)[p:-p, p:-p])[0] / 255
+
+    m, s = cv2.meanStdDev(gray)
+    return hist[0], moved, edge, m[0, 0] / 255, s[0, 0] / 255
+
+
+def build_feature_vector(avg_hist, avg_motion, max_motion, avg_edges, max_edges,
+                         avg_mean, avg_std, n_frames, max_frames):
+    """Ordena los agregados de una ventana en el vector de 80 características"""
+    final_features = np.zeros(N_FEATURES)
+    final_features[:HIST_BINS] = avg_hist
+    final_features[HIST_BINS:HIST_BINS + 7] = [
+        avg_motion, max_motion, avg_edges, max_edges,
+        avg_mean, avg_std, n_frames / max_frames
+    ]
+    return final_features
+
+
+def aggregate_features(stats, max_frames):
+    """Compila las estadísticas de una ventana en el vector de 80 características"""
+    n = len(stats['edges'])
+    motion = stats['motion']
+    edges = stats['edges']
+
+    return build_feature_vector(
+        np.mean(stats['hist'], axis=0, dtype=np.float64),
+        np.mean(motion) if len(motion) else 0,
+        np.max(motion) if len(motion) else 0,
+        np.mean(edges) if n else 0,
+        np.max(edges) if n else 0,
+        np.mean(stats['mean']),
+        np.mean(stats['std']),
+        n,
+        max_frames
+    )
+
+
+def extract_window(frames, max_frames=None):
+    """Vector de 80 características para una ventana (N, alto, ancho) uint8"""
+    if len(frames) == 0:
+        return None
+    return aggregate_features(window_stats(frames), max_frames or len(frames))
+
+
+def extract_sampled(frames, indices, pairs, max_frames):
+    """
+    Vector de una ventana leída con plan_frames. frames son los frames de
+    indices; con pairs=None son una ventana consecutiva. Si no, histograma,
+    bordes e intensidad salen solo de las muestras y el movimiento de cada
+    muestra frente a su frame vecino, como entre frames consecutivos en vivo.
+    """
+    if pairs is None:
+        return extract_window(frames, max_frames)
+
+    # Un video más corto de lo que reporta el contenedor deja índices sin leer
+    rows = {index: row for row, index in enumerate(indices[:len(frames)])}
+    samples = [rows[index] for index, _ in pairs if index in rows]
+    if not samples:
+        return None
+    moved = [(rows[index], rows[neighbor]) for index, neighbor in pairs
+             if index in rows and neighbor in rows]
+    motion = motion_fraction(frames[[a for a, _ in moved]], frames[[b for _, b in moved]])
+    return aggregate_features(window_stats(frames[samples], motion=motion), max_frames)
+
+
+def extract_video(video_path, max_frames=30, sampling='first', out=None, prefetch=False):
+    """
+    Decodifica max_frames frames de un video y extrae sus características.
+    sampling elige qué frames: 'first' (los primeros, por defecto), 'uniform',
+    'stride', 'motion' o una instancia de SamplingPolicy; con muestras no
+    consecutivas se lee también el frame vecino de cada una (plan_frames).
+    Con prefetch=True la decodificación, el redimensionado y el paso a gris
+    corren en un hilo de fondo (útil en clips largos).
+    """
+    cap = cv2.VideoCapture(video_path)
+    try:
+        indices, pairs = (None, None) if sampling == 'first' else plan_frames(cap, sampling, max_frames)
+        rows = max_frames if indices is None else len(indices)
+        if out is None or len(out) < rows:
+            out = np.empty((rows, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+
+        if prefetch:
+            count = 0
+            with PrefetchFrameSource(cap, max_frames=rows, size=FRAME_SIZE,
+                                     gray=True, indices=indices) as source:
+                for _, frame in source:
+                    np.copyto(out[count], frame)
+                    count += 1
+            frames = out[:count]
+        elif indices is None:
+            frames = read_gray_frames(cap, max_frames, out=out)
+        else:
+            frames = read_frames_at(cap, indices, to_gray, out)
+    finally:
+        cap.release()
+    return extract_sampled(frames, indices, pairs, max_frames)
+
+
+# ==================================================
+# EXTRACCIÓN PARALELA DE DATASETS
+# ==================================================
+
+def _init_worker():
+    """Cada proceso usa un solo hilo de OpenCV para no sobresuscribir núcleos"""
+    cv2.setNumThreads(1)
+
+
+def _extract_task(video_path, max_frames, sampling='first'):
+    """Tarea de un proceso: nunca propaga excepciones, las reporta como texto"""
+    try:
+        features = extract_video(video_path, max_frames=max_frames, sampling=sampling)
+    except Exception as e:
+        return None, str(e)
+    if features is None:
+        return None, 'No se pudo leer ningún frame'
+    return features, None
+
+
+def resolve_n_jobs(n_jobs):
+    """Convierte n_jobs (None, -1, N) al número de procesos a usar"""
+    cpus = os.cpu_count() or 1
+    if n_jobs is None or n_jobs == 0:
+        return 1
+    if n_jobs < 0:
+        return max(1, cpus + 1 + n_jobs)
+    return n_jobs
+
+
+def _extract_isolated(video_path, max_frames, sampling):
+    """Extrae un video en un proceso propio; si el proceso muere solo falla ese video"""
+    with ProcessPoolExecutor(max_workers=1, initializer=_init_worker) as pool:
+        try:
+            return pool.submit(_extract_task, video_path, max_frames, sampling).result()
+        except BrokenProcessPool:
+            return None, 'El proceso de extracción terminó inesperadamente'
+
+
+def iter_extract_videos(video_paths, max_frames=30, n_jobs=1, max_in_flight=None, sampling='first'):
+    """
+    Extrae características de varios videos y genera (path, features, error)
+    en el mismo orden de video_paths.
+
+    Con n_jobs != 1 reparte los videos en un pool de procesos; como mucho
+    max_in_flight videos (por defecto 2 por proceso) están en curso a la
+    vez, lo que acota la memoria. Un error en un video no afecta al resto;
+    si un proceso muere, los videos en curso se reprocesan aislados y el
+    pool se recrea.
+    """
+    n_jobs = resolve_n_jobs(n_jobs)
+    video_paths = list(video_paths)
+
+    if n_jobs == 1 or len(video_paths) < 2:
+        for path in video_paths:
+            features, error = _extract_task(path, max_frames, sampling)
+            yield path, features, error
+        return
+
+    max_in_flight = max(1, max_in_flight or 2 * n_jobs)
+    remaining = deque(video_paths)
+    pending = deque()
+    pool = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker)
+
+    def refill():
+        while remaining and len(pending) < max_in_flight:
+            path = remaining.popleft()
+            pending.append((path, pool.submit(_extract_task, path, max_frames, sampling)))
+
+    try:
+        refill()
+        while pending:
+            path, future = pending.popleft()
+            try:
+                features, error = future.result()
+            except BrokenProcessPool:
+                in_flight = [path] + [p for p, _ in pending]
+                pending.clear()
+                pool.shutdown(wait=False, cancel_futures=True)
+                for p in in_flight:
+                    features, error = _extract_isolated(p, max_frames, sampling)
+                    yield p, features, error
+                pool = ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker)
+                refill()
+                continue
+
+            yield path, features, error
+            refill()
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
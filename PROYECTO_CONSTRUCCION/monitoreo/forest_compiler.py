@@ -0,0 +1,139 @@
+"""
+Evaluador compilado de Random Forest
+Aplana el bosque entrenado y el StandardScaler en arreglos contiguos de
+NumPy (umbrales, características, hijos y valores de hoja) y recorre todos
+los árboles a la vez, sin pasar por scikit-learn en cada predicción
+"""
+
+import numpy as np
+
+
+class CompiledForest:
+    """
+    Bosque aplanado. Todos los nodos de todos los árboles viven en arreglos
+    globales; las hojas apuntan a sí mismas, así el recorrido avanza un nivel
+    por iteración durante `depth` iteraciones sin ramas en Python.
+    """
+
+    ARRAY_FIELDS = ('mean', 'scale', 'feature', 'threshold', 'children', 'value', 'roots', 'classes')
+
+    def __init__(self, mean, scale, feature, threshold, children, value, roots, classes, depth):
+        self.mean = mean
+        self.scale = scale
+        self.feature = feature
+        self.threshold = threshold
+        self.children = children
+        self.value = value
+        self.roots = roots
+        self.classes = classes
+        self.depth = int(depth)
+        self.n_trees = len(roots)
+
+    @classmethod
+    def from_sklearn(cls, model, scaler=None):
+        """Compila un RandomForestClassifier ya entrenado (y su StandardScaler)"""
+        features, thresholds, children, values, roots = [], [], [], [], []
+        offset = 0
+        depth = 0
+        n_classes = len(model.classes_)
+
+        for estimator in model.estimators_:
+            tree = estimator.tree_
+            n_nodes = tree.node_count
+            left = tree.children_left.astype(np.int64)
+            right = tree.children_right.astype(np.int64)
+            leaves = left == -1
+            own = np.arange(n_nodes, dtype=np.int64)
+
+            child = np.empty((n_nodes, 2), dtype=np.int64)
+            child[:, 0] = np.where(leaves, own, left) + offset
+            child[:, 1] = np.where(leaves, own, right) + offset
+
+            feature = np.where(leaves, 0, tree.feature).astype(np.intp)
+            threshold = np.where(leaves, np.inf, tree.threshold)
+
+            value = tree.value[:, 0, :n_classes].astype(np.float64)
+            totals = value.sum(axis=1, keepdims=True)
+            totals[totals == 0.0] = 1.0
+            value = value / totals
+
+            features.append(feature)
+            thresholds.append(threshold)
+            children.append(child)
+            values.append(value)
+            roots.append(offset)
+            offset += n_nodes
+            depth = max(depth, tree.max_depth)
+
+        n_features = model.n_features_in_
+        if scaler is not None:
+            mean = np.asarray(scaler.mean_, dtype=np.float64)
+            scale = np.asarray(scaler.scale_, dtype=np.float64)
+        else:
+            mean = np.zeros(n_features)
+            scale = np.ones(n_features)
+
+        return cls(
+            mean=np.ascontiguousarray(mean),
+            scale=np.ascontiguousarray(scale),
+            feature=np.ascontiguousarray(np.concatenate(features)),
+            threshold=np.ascontiguousarray(np.concatenate(thresholds)),
+            children=np.ascontiguousarray(np.concatenate(children)),
+            value=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int64),
+            classes=np.asarray(model.classes_),
+            depth=depth,
+        )
+
+    def to_dict(self):
+        """Arreglos planos del bosque (para guardarlos con joblib y leerlos con memmap)"""
+        data = {name: getattr(self, name) for name in self.ARRAY_FIELDS}
+        data['depth'] = self.depth
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data)
+
+    def transform(self, X):
+        """
+        Escala igual que StandardScaler.transform (float64) y convierte a
+        float32 como hace scikit-learn antes de recorrer los árboles
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        scaled = (X - self.mean) / self.scale
+        return scaled.astype(np.float32).astype(np.float64)
+
+    def leaves(self, X):
+        """Índice global de la hoja alcanzada en cada árbol: (n, n_trees)"""
+        Xs = self.transform(X)
+        rows = np.arange(len(Xs))[:, None]
+        nodes = np.broadcast_to(self.roots, (len(Xs), self.n_trees))
+        for _ in range(self.depth):
+            go_right = Xs[rows, self.feature[nodes]] > self.threshold[nodes]
+            nodes = self.children[nodes, go_right.view(np.int8)]
+        return nodes
+
+    def predict_proba(self, X):
+        # Suma secuencial sobre el eje de árboles, en el mismo orden que scikit-learn
+        return self.value[self.leaves(X)].sum(axis=1) / self.n_trees
+
+    def predict(self, X):
+        """Retorna (labels, confidences) con una sola pasada"""
+        probabilities = self.predict_proba(X)
+        best = probabilities.argmax(axis=1)
+        return self.classes[best], probabilities[np.arange(len(best)), best]
+
+
+def verify_compiled(compiled, model, scaler, X):
+    """
+    Compara el evaluador compilado contra scikit-learn.
+    Retorna (max_abs_diff, labels_match).
+    """
+    X = np.atleast_2d(X)
+    expected = model.predict_proba(scaler.transform(X) if scaler is not None else X)
+    actual = compiled.predict_proba(X)
+    labels_match = bool(np.array_equal(
+        model.classes_[expected.argmax(axis=1)], compiled.classes[actual.argmax(axis=1)]
+    ))
+    return float(np.max(np.abs(expected - actual))), labels_match
@@ -0,0 +1,219 @@
+"""
+Políticas de muestreo temporal de frames
+Reparten N muestras a lo largo de todo el clip y las leen saltando frames
+con grab() (sin recuperarlos) o buscando por posición, de modo que el costo
+de decodificación depende del número de muestras y no de la duración.
+
+Las políticas con muestras no consecutivas ('uniform', 'stride') leen además
+el frame siguiente a cada muestra: el movimiento se mide siempre entre frames
+consecutivos, igual que en la inferencia en vivo (StreamingFeatureState).
+"""
+
+import cv2
+import numpy as np
+
+
+# A partir de este salto conviene buscar por posición en vez de hacer grab().
+# Buscar obliga a decodificar desde el keyframe anterior, así que solo compensa
+# cuando el salto supera el intervalo típico entre keyframes (~250 frames)
+SEEK_MIN_GAP = 250
+
+# Resolución de los frames de sondeo de MotionDenseSampling
+PROBE_SIZE = (80, 60)
+
+
+def frame_count(cap):
+    """Número de frames reportado por el contenedor (0 si se desconoce)"""
+    total = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    return max(total, 0)
+
+
+def iter_frames_at(cap, indices, image=None):
+    """
+    Genera (índice, frame) para los índices (ordenados) pedidos. Los huecos
+    cortos se saltan con grab() sin recuperar el frame, los largos con una
+    búsqueda por posición. image es un buffer opcional que cap.read reutiliza.
+    """
+    position = int(cap.get(cv2.CAP_PROP_POS_FRAMES))
+
+    for index in indices:
+        gap = index - position
+        if gap < 0 or gap > SEEK_MIN_GAP:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, index)
+            position = index
+        else:
+            while position < index:
+                if not cap.grab():
+                    return
+                position += 1
+
+        ret, frame = cap.read(image)
+        if not ret:
+            return
+        position += 1
+        yield index, frame
+
+
+def read_frames_at(cap, indices, convert, out):
+    """
+    Lee los frames de indices y escribe cada uno con convert(frame, out=out[i]).
+    Retorna la vista de out con los frames leídos.
+    """
+    count = 0
+    for _, frame in iter_frames_at(cap, indices):
+        convert(frame, out=out[count])
+        count += 1
+    return out[:count]
+
+
+def pair_frames(samples, total_frames):
+    """
+    Empareja cada muestra con su frame consecutivo (el siguiente, o el
+    anterior si es el último del clip). Retorna (índices a leer, pares) con
+    pares = [(muestra, vecino)]; vecino es None si el clip tiene un frame.
+    """
+    pairs = []
+    for index in samples:
+        neighbor = index + 1 if index + 1 < total_frames else index - 1
+        pairs.append((index, neighbor if neighbor >= 0 else None))
+    indices = sorted(set(samples) | {neighbor for _, neighbor in pairs if neighbor is not None})
+    return indices, pairs
+
+
+def plan_frames(cap, sampling, n_samples):
+    """
+    Frames a leer del clip abierto en cap. Retorna (índices, pares): pares es
+    None si las muestras ya son consecutivas y, si no, los de pair_frames.
+    """
+    policy = get_sampling_policy(sampling)
+    total = frame_count(cap)
+    if total == 0:
+        # Sin conteo de frames fiable solo se puede leer desde el inicio
+        policy = FirstFramesSampling()
+    samples = policy.select(cap, total, n_samples)
+    if not policy.paired:
+        return samples, None
+    return pair_frames(samples, total)
+
+
+class SamplingPolicy:
+    """Elige qué frames de un clip se decodifican"""
+
+    name = None
+    # True si las muestras no son consecutivas: el movimiento se mide contra
+    # el frame vecino de cada muestra (ver pair_frames)
+    paired = False
+
+    @property
+    def key(self):
+        """Identificador estable de la política y sus parámetros (para cachés)"""
+        return self.name
+
+    def select(self, cap, total_frames, n_samples):
+        """Retorna los índices (ordenados) de los frames a leer"""
+        raise NotImplementedError
+
+
+class FirstFramesSampling(SamplingPolicy):
+    """Los primeros N frames consecutivos (comportamiento original)"""
+
+    name = 'first'
+
+    def select(self, cap, total_frames, n_samples):
+        if total_frames:
+            n_samples = min(n_samples, total_frames)
+        return list(range(n_samples))
+
+
+class UniformSampling(SamplingPolicy):
+    """N frames equiespaciados entre el inicio y el final del clip"""
+
+    name = 'uniform'
+    paired = True
+
+    def select(self, cap, total_frames, n_samples):
+        if total_frames <= n_samples:
+            return list(range(total_frames))
+        positions = np.linspace(0, total_frames - 1, n_samples)
+        return sorted(set(int(round(p)) for p in positions))
+
+
+class StrideSampling(SamplingPolicy):
+    """
+    Un frame cada `stride` frames. Si no se indica stride, se elige el
+    mayor salto que reparte las N muestras a lo largo de todo el clip.
+    """
+
+    name = 'stride'
+    paired = True
+
+    def __init__(self, stride=None):
+        self.stride = stride
+
+    @property
+    def key(self):
+        return f"{self.name}{self.stride}" if self.stride else self.name
+
+    def select(self, cap, total_frames, n_samples):
+        stride = self.stride or max(1, total_frames // max(n_samples, 1))
+        return list(range(0, total_frames, stride))[:n_samples]
+
+
+class MotionDenseSampling(SamplingPolicy):
+    """
+    Ventana de N frames consecutivos centrada en el tramo con más movimiento.
+    Primero sondea n_probes frames equiespaciados a baja resolución y luego
+    lee la ventana donde la diferencia entre sondeos es máxima.
+    """
+
+    name = 'motion'
+
+    def __init__(self, n_probes=16, threshold=30):
+        self.n_probes = n_probes
+        self.threshold = threshold
+
+    @property
+    def key(self):
+        return f"{self.name}{self.n_probes}-{self.threshold}"
+
+    def select(self, cap, total_frames, n_samples):
+        if total_frames <= n_samples:
+            return list(range(total_frames))
+
+        probes = UniformSampling().select(cap, total_frames, self.n_probes)
+        buffer = np.empty((len(probes), PROBE_SIZE[1], PROBE_SIZE[0]), dtype=np.uint8)
+        frames = read_frames_at(cap, probes, self._probe, buffer)
+
+        center = total_frames // 2
+        if len(frames) > 1:
+            flat = frames.reshape(len(frames), -1).astype(np.int16)
+            motion = np.count_nonzero(np.abs(np.diff(flat, axis=0)) > self.threshold, axis=1)
+            best = int(np.argmax(motion))
+            center = (probes[best] + probes[best + 1]) // 2
+
+        start = min(max(0, center - n_samples // 2), total_frames - n_samples)
+        return list(range(start, start + n_samples))
+
+    @staticmethod
+    def _probe(frame, out):
+        small = cv2.resize(frame, PROBE_SIZE, interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=out)
+
+
+SAMPLING_POLICIES = {
+    policy.name: policy
+    for policy in (FirstFramesSampling, UniformSampling, StrideSampling, MotionDenseSampling)
+}
+
+
+def get_sampling_policy(sampling):
+    """Acepta un nombre registrado o una instancia de SamplingPolicy"""
+    if isinstance(sampling, SamplingPolicy):
+        return sampling
+    try:
+        return SAMPLING_POLICIES[sampling]()
+    except KeyError:
+        raise ValueError(
+            f"Muestreo no soportado: {sampling}. Use: {', '.join(SAMPLING_POLICIES)}"
+        )
+
@@ -0,0 +1,191 @@
+"""
+Fuente de frames con decodificación anticipada
+Un hilo de fondo decodifica el video (y opcionalmente redimensiona y pasa a
+gris) hacia un pool acotado de buffers preasignados, mientras el hilo que
+consume procesa el frame anterior. OpenCV libera el GIL al decodificar, así
+que decodificación y cómputo se solapan de verdad.
+"""
+
+import queue
+import threading
+
+import cv2
+import numpy as np
+
+from .frame_sampling import iter_frames_at
+
+
+_END = object()
+
+
+class PrefetchFrameSource:
+    """
+    Itera (índice, frame) de un video decodificado en segundo plano.
+
+    El frame entregado es una vista de un buffer del pool: sigue siendo
+    válido hasta pedir el siguiente frame; use frame.copy() para conservarlo.
+    Cada buffer se asigna con la forma del frame que recibe y se reasigna si
+    el stream cambia de resolución (size=None).
+
+    Parámetros:
+      source      ruta, índice de cámara o cv2.VideoCapture ya abierto
+      max_frames  cantidad máxima de frames a entregar (None = sin límite)
+      size        (ancho, alto) al que se redimensiona durante la decodificación
+      gray        convertir a escala de grises durante la decodificación
+      queue_size  frames decodificados por adelantado como máximo
+      loop        volver al inicio al llegar al final (reproducción continua)
+      indices     índices concretos a leer (saltos con grab()/búsqueda)
+    """
+
+    def __init__(self, source, max_frames=None, size=None, gray=False,
+                 queue_size=8, loop=False, indices=None):
+        if isinstance(source, cv2.VideoCapture):
+            self.cap = source
+        else:
+            self.cap = cv2.VideoCapture(source)
+        self.max_frames = max_frames
+        self.size = size
+        self.gray = gray
+        self.loop = loop
+        self.indices = list(indices) if indices is not None else None
+
+        # +1 buffer para el frame que tiene el consumidor, +1 para el que decodifica
+        self._n_buffers = queue_size + 2
+        self._buffers = [None] * self._n_buffers
+        self._free = queue.Queue()
+        for slot in range(self._n_buffers):
+            self._free.put(slot)
+        self._ready = queue.Queue()
+        self._stop = threading.Event()
+        self._held = None
+        self._error = None
+        self._thread = None
+
+    def is_opened(self):
+        return self.cap.isOpened()
+
+    # ------------------------------------------------------------------
+    # Hilo de decodificación
+    # ------------------------------------------------------------------
+
+    def _iter_raw(self):
+        """Frames crudos de la captura en el orden pedido"""
+        scratch = None
+        if self.indices is not None:
+            yield from iter_frames_at(self.cap, self.indices)
+            return
+
+        index = 0
+        while not self._stop.is_set():
+            ret, frame = self.cap.read(scratch)
+            if not ret:
+                if self.loop and index > 0:
+                    self.cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+                    continue
+                return
+            scratch = frame
+            yield index, frame
+            index += 1
+
+    def _convert(self, frame, out):
+        if self.size is not None and (frame.shape[1], frame.shape[0]) != tuple(self.size):
+            frame = cv2.resize(frame, tuple(self.size))
+        if self.gray and frame.ndim == 3:
+            cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY, dst=out)
+        else:
+            np.copyto(out, frame)
+
+    def _output_shape(self, frame):
+        height, width = frame.shape[:2]
+        if self.size is not None:
+            width, height = self.size
+        if self.gray or frame.ndim == 2:
+            return (height, width)
+        return (height, width, frame.shape[2])
+
+    def _run(self):
+        try:
+            delivered = 0
+            for index, frame in self._iter_raw():
+                if self._stop.is_set():
+                    break
+                if self.max_frames is not None and delivered >= self.max_frames:
+                    break
+
+                slot = self._next_free_slot()
+                if slot is None:
+                    break
+                shape = self._output_shape(frame)
+                if self._buffers[slot] is None or self._buffers[slot].shape != shape:
+                    # Primer uso del buffer o el stream cambió de resolución
+                    self._buffers[slot] = np.empty(shape, dtype=np.uint8)
+                self._convert(frame, self._buffers[slot])
+                self._ready.put((slot, index))
+                delivered += 1
+        except Exception as e:
+            self._error = e
+        finally:
+            self._ready.put(_END)
+
+    def _next_free_slot(self):
+        """Espera un buffer libre; None si se pidió detener la fuente"""
+        while not self._stop.is_set():
+            try:
+                return self._free.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return None
+
+    # ------------------------------------------------------------------
+    # Consumo
+    # ------------------------------------------------------------------
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='prefetch-frames', daemon=True)
+            self._thread.start()
+        return self
+
+    def __iter__(self):
+        self.start()
+        return self
+
+    def __next__(self):
+        self._release_held()
+        item = self._ready.get()
+        if item is _END:
+            self._ready.put(_END)
+            if self._error is not None:
+                raise self._error
+            raise StopIteration
+        slot, index = item
+        self._held = slot
+        return index, self._buffers[slot]
+
+    def read(self):
+        """Interfaz tipo cv2.VideoCapture.read(): (ret, frame)"""
+        try:
+            _, frame = next(self)
+        except StopIteration:
+            return False, None
+        return True, frame
+
+    def _release_held(self):
+        if self._held is not None:
+            self._free.put(self._held)
+            self._held = None
+
+    def close(self):
+        """Detiene el hilo de decodificación y libera la captura"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.cap.release()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+        return False
@@ -0,0 +1,251 @@
+"""
+Almacén de frames decodificados
+Cada video de entrenamiento se decodifica una sola vez a escala de grises en
+FRAME_SIZE (la misma conversión que usa la extracción) y se agrega a un único
+archivo uint8 que se lee con memmap. Un índice JSON guarda dónde empieza cada
+clip, cuántos frames tiene y sus fps. Con el almacén construido, recalcular
+características es trabajo puramente sobre arreglos: no se vuelve a abrir
+ningún MP4.
+"""
+
+import json
+import os
+import threading
+
+import cv2
+import numpy as np
+
+from .feature_extractor import FRAME_HEIGHT, FRAME_WIDTH, extract_sampled, to_gray
+from .frame_sampling import (
+    FirstFramesSampling, MotionDenseSampling, frame_count, get_sampling_policy, pair_frames
+)
+
+
+class DecodedFrameStore:
+    """Frames en gris de varios videos en un archivo mapeado en memoria"""
+
+    FRAMES_FILE = 'frames.u8'
+    INDEX_FILE = 'index.json'
+    FRAME_SHAPE = (FRAME_HEIGHT, FRAME_WIDTH)
+    FRAME_BYTES = FRAME_HEIGHT * FRAME_WIDTH
+
+    def __init__(self, root):
+        self.root = str(root)
+        self._lock = threading.Lock()
+        self._index = None
+        # (mtime_ns, tamaño) de index.json cuando se leyó; si cambia, otro proceso lo reescribió
+        self._index_stamp = None
+        self._memmap = None
+
+    @property
+    def frames_path(self):
+        return os.path.join(self.root, self.FRAMES_FILE)
+
+    @property
+    def index_path(self):
+        return os.path.join(self.root, self.INDEX_FILE)
+
+    def _stat_index(self):
+        try:
+            stat = os.stat(self.index_path)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+    def _load_index(self):
+        """
+        Índice en memoria; se vuelve a leer si index.json cambió en disco
+        (otro proceso agregó o compactó clips). Al recargarlo se descarta el
+        memmap, que puede apuntar a un archivo de frames reemplazado.
+        """
+        stamp = self._stat_index()
+        if self._index is None or stamp != self._index_stamp:
+            try:
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    self._index = json.load(f)
+            except (OSError, ValueError):
+                self._index = {'frames': 0, 'clips': {}}
+            self._index_stamp = stamp
+            self._memmap = None
+        return self._index
+
+    def _write_index(self):
+        tmp = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self._index, f)
+        os.replace(tmp, self.index_path)
+        self._index_stamp = self._stat_index()
+
+    def _all_frames(self):
+        """memmap de solo lectura con todos los frames indexados"""
+        rows = self._load_index()['frames']
+        if self._memmap is None or len(self._memmap) != rows:
+            if rows == 0:
+                return np.empty((0,) + self.FRAME_SHAPE, dtype=np.uint8)
+            self._memmap = np.memmap(self.frames_path, dtype=np.uint8, mode='r',
+                                     shape=(rows,) + self.FRAME_SHAPE)
+        return self._memmap
+
+    def __len__(self):
+        return len(self._load_index()['clips'])
+
+    def __contains__(self, path):
+        return self.clip(path) is not None
+
+    def clip(self, path):
+        """
+        Entrada del índice de un video (offset, count, fps, reported_frames,
+        complete) o None si no está o cambió desde que se decodificó
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            entry = self._load_index()['clips'].get(path)
+        if entry is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            return None
+        return entry
+
+    def frames(self, path):
+        """Frames (count, alto, ancho) uint8 de un video, sin copiarlos, o None"""
+        entry = self.clip(path)
+        if entry is None:
+            return None
+        with self._lock:
+            frames = self._all_frames()
+        return frames[entry['offset']:entry['offset'] + entry['count']]
+
+    def add(self, video_path, max_frames=None):
+        """
+        Decodifica un video (completo o sus primeros max_frames frames) y lo
+        agrega al almacén. Retorna el número de frames guardados.
+        """
+        path = os.path.abspath(video_path)
+        stat = os.stat(path)
+        cap = cv2.VideoCapture(path)
+        try:
+            if not cap.isOpened():
+                raise ValueError(f"No se puede abrir el video: {path}")
+            fps = cap.get(cv2.CAP_PROP_FPS) or 0.0
+            reported = frame_count(cap)
+
+            os.makedirs(self.root, exist_ok=True)
+            chunk = np.empty((64,) + self.FRAME_SHAPE, dtype=np.uint8)
+            with self._lock:
+                index = self._load_index()
+                offset = index['frames']
+                count = 0
+                complete = False
+                with open(self.frames_path, 'ab') as f:
+                    # Descartar frames de una escritura anterior que no llegó al índice
+                    f.truncate(offset * self.FRAME_BYTES)
+                    pending = 0
+                    while max_frames is None or count < max_frames:
+                        ret, frame = cap.read()
+                        if not ret:
+                            complete = True
+                            break
+                        to_gray(frame, out=chunk[pending])
+                        pending += 1
+                        count += 1
+                        if pending == len(chunk):
+                            chunk.tofile(f)
+                            pending = 0
+                    chunk[:pending].tofile(f)
+
+                index['frames'] = offset + count
+                index['clips'][path] = {
+                    'offset': offset,
+                    'count': count,
+                    'fps': fps,
+                    'reported_frames': reported,
+                    'complete': complete,
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                }
+                self._write_index()
+        finally:
+            cap.release()
+        return count
+
+    def build(self, video_paths, max_frames=None, progress=None):
+        """
+        Agrega los videos que faltan o cambiaron. progress(**evento) recibe
+        el avance. Retorna los conteos de agregados, omitidos y fallidos.
+        """
+        report = progress or (lambda **event: None)
+        video_paths = list(video_paths)
+        counts = {'processed': 0, 'added': 0, 'skipped': 0, 'failed': 0, 'frames': 0}
+        for path in video_paths:
+            entry = self.clip(path)
+            if entry is not None and (entry['complete'] or
+                                      (max_frames is not None and entry['count'] >= max_frames)):
+                counts['skipped'] += 1
+            else:
+                try:
+                    counts['frames'] += self.add(path, max_frames=max_frames)
+                    counts['added'] += 1
+                except Exception as e:
+                    print(f"Error decodificando {path}: {str(e)}")
+                    counts['failed'] += 1
+            counts['processed'] += 1
+            report(phase='decoding', total=len(video_paths), current=os.path.basename(path), **counts)
+        return counts
+
+    def compact(self):
+        """Reescribe el archivo solo con los clips indexados (tras reemplazar videos)"""
+        with self._lock:
+            index = self._load_index()
+            frames = self._all_frames()
+            tmp = f"{self.frames_path}.{os.getpid()}.tmp"
+            offset = 0
+            clips = {}
+            with open(tmp, 'wb') as f:
+                for path, entry in index['clips'].items():
+                    frames[entry['offset']:entry['offset'] + entry['count']].tofile(f)
+                    clips[path] = dict(entry, offset=offset)
+                    offset += entry['count']
+            os.replace(tmp, self.frames_path)
+            self._memmap = None
+            self._index = {'frames': offset, 'clips': clips}
+            self._write_index()
+
+    def select(self, path, sampling='first', n_samples=30):
+        """
+        Los frames que la política de muestreo leería del video (con los
+        vecinos de las muestras no consecutivas, ver plan_frames), tomados del
+        almacén. Retorna (frames, índices, pares), o None si el video no está,
+        si faltan frames (almacén construido con max_frames) o si la política
+        necesita el video a color (MotionDenseSampling sondea los originales).
+        """
+        entry = self.clip(path)
+        policy = get_sampling_policy(sampling)
+        if entry is None or isinstance(policy, MotionDenseSampling):
+            return None
+
+        total = entry['reported_frames']
+        pairs = None
+        if isinstance(policy, FirstFramesSampling) or total == 0:
+            # Igual que read_gray_frames: los primeros frames hasta el final del video
+            indices = list(range(n_samples))
+        else:
+            indices = policy.select(None, total, n_samples)
+            if policy.paired:
+                indices, pairs = pair_frames(indices, total)
+
+        count = entry['count']
+        if indices and indices[-1] >= count and not entry['complete']:
+            return None
+        indices = [i for i in indices if i < count]
+        return self.frames(path)[indices], indices, pairs
+
+    def extract(self, path, max_frames=30, sampling='first'):
+        """Vector de características del video calculado desde el almacén, o None"""
+        selected = self.select(path, sampling, max_frames)
+        if selected is None:
+            return None
+        return extract_sampled(*selected, max_frames)
@@ -0,0 +1,34 @@
+"""
+Decodifica una vez los videos de entrenamiento al almacén de frames
+(MEDIA_ROOT/frame_store) para recalcular características sin abrir los MP4:
+    python manage.py build_frame_store [--max-frames 300] [--compact]
+"""
+
+from django.core.management.base import BaseCommand
+
+from monitoreo.services.detection_service import training_service
+
+
+class Command(BaseCommand):
+    help = 'Decodifica los videos de entrenamiento al almacén de frames en memmap'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-frames', type=int, default=None,
+                            help='Frames por video (por defecto el video completo)')
+        parser.add_argument('--compact', action='store_true',
+                            help='Reescribir el archivo sin los frames de videos reemplazados')
+
+    def handle(self, *args, **options):
+        base_path = training_service.prepare_training_data()
+        video_paths, _ = training_service.detector.collect_videos(base_path)
+        store = training_service.frame_store
+
+        counts = store.build(video_paths, max_frames=options['max_frames'])
+        if options['compact']:
+            store.compact()
+
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['added']} video(s) decodificados ({counts['frames']} frames), "
+            f"{counts['skipped']} ya estaban, {counts['failed']} con error. "
+            f"Almacén: {len(store)} video(s) en {store.root}"
+        ))
@@ -0,0 +1,76 @@
+"""
+Servidor local de inferencia compartido por los workers web: carga una sola
+vez YOLO pose y el detector y agrupa en lotes los frames de todos los visores:
+    python manage.py run_inference_server [--address /ruta/inferencia.sock]
+Los workers lo usan cuando INFERENCE_SERVER_ADDRESS apunta a la misma dirección.
+La clave del handshake sale de INFERENCE_SERVER_AUTHKEY (entorno o settings) o
+de SECRET_KEY; el comando no arranca con la SECRET_KEY de desarrollo.
+"""
+
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoreo.services.inference_server import (
+    DEFAULT_SOCKET, InferenceServer, insecure_authkey, is_loopback, parse_address,
+    server_address, server_authkey
+)
+from monitoreo.services.resource_registry import resources
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta el servidor local de inferencia (pose y comportamiento)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--address', default=None,
+                            help='Ruta de socket Unix o host:puerto (por defecto INFERENCE_SERVER_ADDRESS)')
+        parser.add_argument('--allow-remote', action='store_true',
+                            help='Permitir escuchar en una dirección TCP que no sea local')
+
+    def handle(self, *args, **options):
+        if insecure_authkey():
+            raise CommandError(
+                "La clave del servidor de inferencia es pública (SECRET_KEY de desarrollo o "
+                "INFERENCE_SERVER_AUTHKEY de menos de 16 caracteres). Defina "
+                "INFERENCE_SERVER_AUTHKEY en el entorno o una SECRET_KEY propia."
+            )
+
+        address = parse_address(options['address']) if options['address'] else server_address()
+        if address is None:
+            address = DEFAULT_SOCKET
+            self.stdout.write(self.style.WARNING(
+                "INFERENCE_SERVER_ADDRESS no está configurado: los workers seguirán infiriendo "
+                "en su proceso hasta que apunte a esta dirección"
+            ))
+        if not is_loopback(address) and not options['allow_remote']:
+            raise CommandError(
+                f"{address} acepta conexiones de otras máquinas; use un socket Unix, "
+                "127.0.0.1 o --allow-remote"
+            )
+
+        from monitoreo.entrenamiento import pose_batcher
+
+        timings = resources.warm_up(['pose_model', 'detection_service'])
+        detection_service = resources.get('detection_service')
+        detection_service.warm_up()
+        for name, seconds in timings.items():
+            self.stdout.write(f"{name} cargado en {seconds:.2f} s")
+
+        server = InferenceServer(
+            address,
+            server_authkey(),
+            pose_submit=pose_batcher.submit,
+            behavior_submit=lambda frame, camera_id: detection_service.batcher.submit((frame, camera_id)),
+            behavior_release=lambda camera_ids: [detection_service.detector.reset_streams(camera_id)
+                                                 for camera_id in camera_ids]
+        )
+        # SIGTERM interrumpe el accept igual que Ctrl+C
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+        self.stdout.write(self.style.SUCCESS(f"Servidor de inferencia escuchando en {address}"))
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write(f"Servidor detenido: {server.stats}")
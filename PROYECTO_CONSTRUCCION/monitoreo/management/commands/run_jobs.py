@@ -0,0 +1,41 @@
+"""
+Ejecuta los trabajos en segundo plano (entrenamiento, búsqueda, análisis)
+fuera de los workers web:  python manage.py run_jobs --workers 2
+"""
+
+import signal
+import threading
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitoreo.services.job_service import job_service
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta la cola de trabajos en segundo plano'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=getattr(settings, 'JOBS_WORKERS', 1),
+                            help='Hilos que ejecutan trabajos en paralelo')
+        parser.add_argument('--poll-interval', type=float,
+                            default=getattr(settings, 'JOBS_POLL_INTERVAL', 1.0),
+                            help='Segundos entre consultas a la cola')
+
+    def handle(self, *args, **options):
+        # El pool reencola al arrancar y periódicamente los trabajos sin latido
+        pool = job_service.start_workers(options['workers'], options['poll_interval'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Procesando trabajos con {options['workers']} hilo(s) ({job_service.worker_name})"
+        ))
+
+        stop = threading.Event()
+        signal.signal(signal.SIGTERM, lambda *_: stop.set())
+        try:
+            while not stop.wait(1.0):
+                pass
+        except KeyboardInterrupt:
+            pass
+
+        self.stdout.write("Esperando a que terminen los trabajos en curso...")
+        pool.stop()
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.10 on 2026-10-17 12:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoreo', '0006_ubicacion_ciudad'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trainedmodel',
+            name='params',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AddField(
+            model_name='trainedmodel',
+            name='cv_folds',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trainedmodel',
+            name='cv_f1_std',
+            field=models.FloatField(default=0.0),
+        ),
+        migrations.AddField(
+            model_name='trainedmodel',
+            name='latency_p50_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trainedmodel',
+            name='latency_p99_ms',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='trainedmodel',
+            name='search_rank',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 21:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoreo', '0008_backgroundjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertas',
+            name='clip',
+            field=models.FileField(blank=True, null=True, upload_to='alertas/clips/'),
+        ),
+    ]
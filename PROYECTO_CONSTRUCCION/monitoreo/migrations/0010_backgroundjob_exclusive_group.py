@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:40
+
+from django.db import migrations, models
+
+
+def fill_exclusive_group(apps, schema_editor):
+    BackgroundJob = apps.get_model('monitoreo', 'BackgroundJob')
+    BackgroundJob.objects.filter(kind__in=('train', 'search')).update(exclusive_group='training')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoreo', '0009_alertas_clip'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='backgroundjob',
+            name='exclusive_group',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.RunPython(fill_exclusive_group, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='backgroundjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'running'), models.Q(('exclusive_group', ''), _negated=True)), fields=('exclusive_group',), name='one_running_job_per_group'),
+        ),
+    ]
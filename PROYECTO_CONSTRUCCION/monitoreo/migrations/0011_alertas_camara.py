@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoreo', '0010_backgroundjob_exclusive_group'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='alertas',
+            name='camara',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:30
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def cancel_duplicate_jobs(apps, schema_editor):
+    """Deja un solo trabajo activo por grupo: el que corre, o si no el pendiente más antiguo"""
+    BackgroundJob = apps.get_model('monitoreo', 'BackgroundJob')
+    active = BackgroundJob.objects.filter(status__in=('pending', 'running')).exclude(exclusive_group='')
+    kept = set()
+    for job in active.order_by('-status', 'created_at'):
+        if job.exclusive_group in kept:
+            BackgroundJob.objects.filter(id=job.id).update(
+                status='cancelled', cancel_requested=True, finished_at=timezone.now()
+            )
+        else:
+            kept.add(job.exclusive_group)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('monitoreo', '0011_alertas_camara'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='backgroundjob',
+            name='one_running_job_per_group',
+        ),
+        migrations.RunPython(cancel_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='backgroundjob',
+            constraint=models.UniqueConstraint(condition=models.Q(('status__in', ['pending', 'running']), models.Q(('exclusive_group', ''), _negated=True)), fields=('exclusive_group',), name='one_active_job_per_group'),
+        ),
+    ]
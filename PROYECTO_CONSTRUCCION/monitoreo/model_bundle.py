@@ -0,0 +1,80 @@
+"""
+Paquete inmutable del modelo en uso
+Modelo, scaler, bosque compilado y metadatos viajan juntos en un ModelBundle
+que nunca se modifica: entrenar construye uno nuevo aparte y el detector lo
+publica cambiando una sola referencia. Cada predicción toma el paquete una
+vez al empezar, así que termina con el modelo y el scaler con los que empezó.
+"""
+
+import dataclasses
+
+import numpy as np
+
+from .classifier_backends import DEFAULT_BACKEND, get_backend
+from .forest_compiler import CompiledForest
+
+
+DEFAULT_LABEL_MAP = {
+    'normal': 0,
+    'robo': 1,
+    'agresion': 2,
+    'sospechoso': 3
+}
+
+
+@dataclasses.dataclass(frozen=True)
+class ModelBundle:
+    """Todo lo necesario para predecir con una versión del modelo"""
+
+    model: object = None
+    scaler: object = None
+    # Nombre del ClassifierBackend que construyó model
+    backend: str = DEFAULT_BACKEND
+    # Copia aplanada de model + scaler para inferencia sin scikit-learn
+    compiled: CompiledForest = None
+    label_map: dict = dataclasses.field(default_factory=lambda: dict(DEFAULT_LABEL_MAP))
+    # Ventana temporal (frames) usada al entrenar y en inferencia en vivo
+    window_frames: int = 30
+    # Identifica los pesos (clave de la caché de análisis de videos)
+    model_version: str = None
+    # Actualizaciones incrementales desde la última reconstrucción completa
+    incremental_updates: int = 0
+
+    def __post_init__(self):
+        object.__setattr__(self, 'reverse_map', {v: k for k, v in self.label_map.items()})
+        if self.compiled is not None:
+            # Los arreglos compartidos entre hilos no deben modificarse
+            for name in CompiledForest.ARRAY_FIELDS:
+                array = getattr(self.compiled, name)
+                if isinstance(array, np.ndarray) and array.flags.writeable:
+                    array.setflags(write=False)
+
+    @classmethod
+    def from_estimator(cls, model, scaler, backend=DEFAULT_BACKEND, **fields):
+        """Paquete a partir de un clasificador y su StandardScaler ya entrenados"""
+        compiled = get_backend(backend).compile(model, scaler)
+        return cls(model=model, scaler=scaler, backend=backend, compiled=compiled, **fields)
+
+    @property
+    def is_trained(self):
+        return self.compiled is not None or self.model is not None
+
+    def replace(self, **changes):
+        """Copia con algunos campos cambiados (el original no se toca)"""
+        return dataclasses.replace(self, **changes)
+
+    def predict(self, X):
+        """
+        Clasifica una matriz de características (n, 80) con una sola pasada
+        por el modelo (compilado si está disponible, si no scikit-learn).
+        Retorna (labels, confidences) como arreglos.
+        """
+        X = np.atleast_2d(np.asarray(X, dtype=np.float64))
+        if self.compiled is not None:
+            return self.compiled.predict(X)
+
+        probabilities = self.model.predict_proba(self.scaler.transform(X))
+        best = probabilities.argmax(axis=1)
+        labels = self.model.classes_[best]
+        confidences = probabilities[np.arange(len(best)), best]
+        return labels, confidences
@@ -0,0 +1,190 @@
+"""
+Búsqueda de hiperparámetros del Random Forest
+Búsqueda aleatoria o por reducción sucesiva (successive halving) con k-fold
+estratificado, repartida en un pool de procesos y sobre una matriz de
+características ya extraída. Las métricas de cada candidato se leen de
+cv_results_ de la propia búsqueda (no se repite la validación cruzada); los
+mejores se reentrenan con todos los datos y se mide su latencia de inferencia
+real (bosque compilado).
+"""
+
+import time
+
+import numpy as np
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.experimental import enable_halving_search_cv  # noqa: F401
+from sklearn.metrics import f1_score, make_scorer, precision_score, recall_score
+from sklearn.model_selection import (
+    HalvingRandomSearchCV, RandomizedSearchCV, StratifiedKFold
+)
+from sklearn.pipeline import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from .forest_compiler import CompiledForest
+
+
+# Parámetros del modelo de producción antes de la búsqueda
+DEFAULT_FOREST_PARAMS = {
+    'n_estimators': 100,
+    'max_depth': 15,
+    'min_samples_split': 5,
+    'min_samples_leaf': 2,
+}
+
+PARAM_SPACE = {
+    'n_estimators': [25, 50, 100, 150, 200],
+    'max_depth': [6, 8, 10, 12, 15, 20, None],
+    'min_samples_split': [2, 5, 10],
+    'min_samples_leaf': [1, 2, 4],
+    'max_features': ['sqrt', 'log2', 0.5],
+}
+
+# pos_label=None: con solo dos comportamientos (etiquetas de texto) el scorer
+# no debe buscar la clase positiva 1
+SCORING = {
+    'f1': make_scorer(f1_score, average='weighted', zero_division=0, pos_label=None),
+    'accuracy': 'accuracy',
+    'precision': make_scorer(precision_score, average='weighted', zero_division=0, pos_label=None),
+    'recall': make_scorer(recall_score, average='weighted', zero_division=0, pos_label=None),
+}
+
+SEARCH_METHODS = ('random', 'halving')
+
+
+def make_pipeline(random_state=42, **params):
+    """Scaler + Random Forest: el scaler se ajusta dentro de cada fold"""
+    return Pipeline([
+        ('scaler', StandardScaler()),
+        ('clf', RandomForestClassifier(random_state=random_state, n_jobs=1, **params)),
+    ])
+
+
+def make_folds(y, cv=5, random_state=42):
+    """StratifiedKFold con tantos folds como permita la clase menos representada"""
+    _, counts = np.unique(y, return_counts=True)
+    n_splits = min(cv, int(counts.min()))
+    if len(counts) < 2 or n_splits < 2:
+        raise ValueError("Se necesitan al menos 2 comportamientos con 2 videos cada uno")
+    return StratifiedKFold(n_splits=n_splits, shuffle=True, random_state=random_state)
+
+
+def measure_latency(model, scaler, n_features, repeats=200, warmup=20):
+    """
+    Latencia de inferencia de una fila con el bosque compilado (el camino
+    usado en producción). Retorna (p50_ms, p99_ms).
+    """
+    compiled = CompiledForest.from_sklearn(model, scaler)
+    row = np.zeros((1, n_features))
+    for _ in range(warmup):
+        compiled.predict(row)
+
+    timings = np.empty(repeats)
+    for i in range(repeats):
+        start = time.perf_counter()
+        compiled.predict(row)
+        timings[i] = time.perf_counter() - start
+    timings *= 1000
+    return float(np.percentile(timings, 50)), float(np.percentile(timings, 99))
+
+
+def rank_candidates(candidates, latency_budget_ms=None):
+    """
+    Ordena los candidatos: primero los que cumplen el presupuesto de
+    latencia (p99) por F1 descendente y luego latencia; después los que no
+    lo cumplen, del más rápido al más lento
+    """
+    def within_budget(candidate):
+        return latency_budget_ms is None or candidate['latency_p99_ms'] <= latency_budget_ms
+
+    def sort_key(candidate):
+        if within_budget(candidate):
+            return (0, -candidate['f1'], candidate['latency_p99_ms'])
+        return (1, candidate['latency_p99_ms'], -candidate['f1'])
+
+    ranked = sorted(candidates, key=sort_key)
+    for rank, candidate in enumerate(ranked, start=1):
+        candidate['rank'] = rank
+        candidate['within_budget'] = within_budget(candidate)
+    return ranked
+
+
+def search_models(X, y, method='random', n_iter=20, cv=5, top_k=5, n_jobs=-1,
+                  latency_budget_ms=None, random_state=42):
+    """
+    Busca hiperparámetros sobre la matriz X (n, 80) ya extraída.
+
+    method: 'random' (RandomizedSearchCV) o 'halving' (HalvingRandomSearchCV)
+    n_jobs: procesos del pool que evalúa candidatos y folds en paralelo
+
+    Se mide la latencia de todos los candidatos distintos evaluados y recién
+    después se ordenan con rank_candidates y se cortan a top_k, así un
+    candidato más lento con mejor F1 no desplaza a uno que cumple el
+    presupuesto. Cada uno incluye métricas de validación cruzada, latencia
+    medida y el modelo + scaler reentrenados con todos los datos. Successive halving solo
+    admite una métrica: sus candidatos traen el F1 de la última ronda en que
+    se evaluaron y accuracy/precision/recall en None.
+    """
+    if method not in SEARCH_METHODS:
+        raise ValueError(f"Método de búsqueda desconocido: {method}")
+
+    X = np.asarray(X, dtype=np.float64)
+    y = np.asarray(y)
+    folds = make_folds(y, cv=cv, random_state=random_state)
+    space = {f'clf__{name}': values for name, values in PARAM_SPACE.items()}
+
+    # Halving necesita al menos 2 muestras por clase y fold en la primera ronda
+    if method == 'halving' and len(y) < 2 * folds.get_n_splits() * len(np.unique(y)):
+        print("Muy pocas muestras para successive halving, se usa búsqueda aleatoria")
+        method = 'random'
+
+    if method == 'halving':
+        search = HalvingRandomSearchCV(
+            make_pipeline(random_state), space, n_candidates=n_iter, scoring=SCORING['f1'],
+            cv=folds, n_jobs=n_jobs, random_state=random_state, refit=False,
+            min_resources='smallest'
+        )
+    else:
+        search = RandomizedSearchCV(
+            make_pipeline(random_state), space, n_iter=n_iter, scoring=SCORING,
+            cv=folds, n_jobs=n_jobs, random_state=random_state, refit=False
+        )
+    search.fit(X, y)
+
+    results = search.cv_results_
+    # Con varias métricas las columnas se llaman mean_test_<métrica>
+    key = 'f1' if method == 'random' else 'score'
+    scores = np.nan_to_num(results[f'mean_test_{key}'], nan=-1.0)
+    # Halving: primero las rondas con más datos (las del final), luego por F1
+    rounds = results['iter'] if method == 'halving' else np.zeros(len(scores))
+    order = np.lexsort((-scores, -np.asarray(rounds)))
+    seen = []
+    for index in order:
+        params = {name.split('__', 1)[1]: value for name, value in results['params'][index].items()}
+        if params not in [p for p, _ in seen]:
+            seen.append((params, index))
+
+    def metric(name, index):
+        if method != 'random':
+            return None
+        return float(results[f'mean_test_{name}'][index])
+
+    candidates = []
+    for params, index in seen:
+        pipeline = make_pipeline(random_state, **params).fit(X, y)
+        scaler, model = pipeline.named_steps['scaler'], pipeline.named_steps['clf']
+        p50, p99 = measure_latency(model, scaler, X.shape[1])
+        candidates.append({
+            'params': params,
+            'f1': float(results[f'mean_test_{key}'][index]),
+            'f1_std': float(results[f'std_test_{key}'][index]),
+            'accuracy': metric('accuracy', index),
+            'precision': metric('precision', index),
+            'recall': metric('recall', index),
+            'folds': folds.get_n_splits(),
+            'latency_p50_ms': p50,
+            'latency_p99_ms': p99,
+            'model': model,
+            'scaler': scaler,
+        })
+
+    return rank_candidates(candidates, latency_budget_ms)[:top_k]
@@ -38,6 +38,13 @@ class TrainedModel(models.Model):
     recall = models.FloatField(default=0.0)
     f1_score = models.FloatField(default=0.0)
     training_samples = models.IntegerField(default=0)
+    # Búsqueda de hiperparámetros: parámetros, F1 en k-fold y latencia medida
+    params = models.JSONField(default=dict, blank=True)
+    cv_folds = models.IntegerField(default=0)
+    cv_f1_std = models.FloatField(default=0.0)
+    latency_p50_ms = models.FloatField(null=True, blank=True)
+    latency_p99_ms = models.FloatField(null=True, blank=True)
+    search_rank = models.IntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     is_active = models.BooleanField(default=False)
@@ -99,6 +106,12 @@ class Alertas(models.Model):
 
     descripcion = models.TextField(blank=True)
 
+    # Cámara que se estaba viendo al generar la alerta (vacío si no se sabe)
+    camara = models.CharField(max_length=100, blank=True, default='')
+
+    # Video del incidente (segundos antes y después del disparo)
+    clip = models.FileField(upload_to='alertas/clips/', blank=True, null=True)
+
     estado = models.CharField(
         max_length=10,
         choices=ACTIVIDAD_ESTADO,
@@ -106,4 +119,57 @@ class Alertas(models.Model):
     )
 
     def __str__(self):
-        return f"{self.comportamiento} - {self.severidad}"
\ No newline at end of file
+        return f"{self.comportamiento} - {self.severidad}"
+
+class BackgroundJob(models.Model):
+    """Trabajo pesado (entrenamiento, búsqueda, análisis) ejecutado fuera de la petición HTTP"""
+    
+    KIND_CHOICES = [
+        ('train', 'Entrenamiento'),
+        ('search', 'Búsqueda de hiperparámetros'),
+        ('analyze', 'Análisis de video'),
+    ]
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pendiente'),
+        ('running', 'En ejecución'),
+        ('done', 'Terminado'),
+        ('failed', 'Fallido'),
+        ('cancelled', 'Cancelado'),
+    ]
+    
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    # Un solo trabajo pendiente o en ejecución por grupo (p. ej. 'training')
+    exclusive_group = models.CharField(max_length=20, blank=True, default='')
+    params = models.JSONField(default=dict, blank=True)
+    # Mayor prioridad se ejecuta primero
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    cancel_requested = models.BooleanField(default=False)
+    worker = models.CharField(max_length=100, blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'created_at']),
+        ]
+        constraints = [
+            # La base de datos garantiza un solo trabajo activo por grupo, aunque
+            # lo encolen varios workers web o lo tomen varios procesos run_jobs
+            models.UniqueConstraint(
+                fields=['exclusive_group'],
+                condition=models.Q(status__in=['pending', 'running']) & ~models.Q(exclusive_group=''),
+                name='one_active_job_per_group'
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.kind} #{self.id} - {self.status}"
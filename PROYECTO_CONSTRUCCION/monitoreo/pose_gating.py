@@ -0,0 +1,152 @@
+"""
+Inferencia de pose según el movimiento de la escena
+Un nivel de movimiento barato (diferencia de frames en baja resolución u
+OpticalFlowService) decide en qué frames se ejecuta YOLO pose:
+  - escena quieta: no se infiere; se repiten los últimos keypoints y solo se
+    refresca cada idle_refresh frames
+  - con movimiento: se infiere cada `stride` frames y los frames intermedios
+    reciben keypoints interpolados linealmente entre las dos inferencias
+Todos los frames salen en orden y con keypoints, así la lógica de sospecha
+por frames consecutivos no cambia.
+"""
+
+from collections import deque
+
+import cv2
+import numpy as np
+
+from .services.optical_flow_service import OpticalFlowService
+
+
+# Origen de los keypoints de cada frame
+POSE = 'pose'
+INTERPOLATED = 'interpolado'
+HELD = 'reposo'
+
+# Umbral por método, cada uno en su unidad: fracción de píxeles que cambian
+# ('diff') o desplazamiento medio del flujo en píxeles del frame reducido ('flow')
+DEFAULT_THRESHOLDS = {'diff': 0.01, 'flow': 0.1}
+
+
+class MotionGate:
+    """
+    Nivel de movimiento entre frames consecutivos.
+    method='diff': fracción de píxeles (en size) que cambian más de pixel_threshold
+    method='flow': motion_level de OpticalFlowService sobre el frame reducido
+    threshold=None usa el umbral por defecto del método (DEFAULT_THRESHOLDS).
+    """
+
+    def __init__(self, threshold=None, method='diff', size=(80, 60), pixel_threshold=25):
+        if method not in DEFAULT_THRESHOLDS:
+            raise ValueError(f"Método de movimiento no soportado: {method}. Use: diff, flow")
+        self.threshold = DEFAULT_THRESHOLDS[method] if threshold is None else threshold
+        self.method = method
+        self.size = size
+        self.pixel_threshold = pixel_threshold
+        self._prev = None
+        self._flow = OpticalFlowService() if method == 'flow' else None
+
+    def level(self, frame):
+        small = cv2.resize(frame, self.size, interpolation=cv2.INTER_AREA)
+        if self._flow is not None:
+            return self._flow.process(small)['motion_level']
+
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        prev, self._prev = self._prev, gray
+        if prev is None:
+            return float('inf')
+        changed = cv2.absdiff(prev, gray) > self.pixel_threshold
+        return float(np.count_nonzero(changed)) / changed.size
+
+    def is_active(self, frame):
+        return self.level(frame) >= self.threshold
+
+
+def interpolate_keypoints(start, end, t):
+    """Keypoints entre dos inferencias; si cambió el número de personas se mantienen los iniciales"""
+    if start is None or end is None or start.shape != end.shape:
+        return start
+    return start + (end - start) * t
+
+
+def iter_gated_poses(frames, submit, gate=None, stride=1, idle_refresh=30, depth=4):
+    """
+    Genera (frame, keypoints, origen) en el orden de frames.
+
+    submit(frame) -> Future con los keypoints del frame (por ejemplo el
+    MicroBatcher de pose). gate=None infiere todos los frames. Como mucho
+    depth frames esperan resultado a la vez; los intermedios de una ráfaga
+    esperan además a la siguiente inferencia para interpolar.
+    """
+    pending = deque()
+    last = {'keypoints': None, 'anchor': None, 'anchor_index': None}
+    # Último frame enviado a inferir y si el frame anterior tenía movimiento
+    state = {'submitted': None, 'active': False}
+
+    def anchor(entry):
+        entry['kind'] = POSE
+        entry['future'] = submit(entry['frame'])
+        state['submitted'] = entry['index']
+
+    def next_anchor(position):
+        for entry in list(pending)[position + 1:]:
+            if entry['kind'] == POSE:
+                return entry
+        return None
+
+    def ready(entry, block):
+        """Keypoints del primer frame pendiente, o None si todavía no se pueden calcular"""
+        if entry['kind'] == POSE:
+            if not block and not entry['future'].done():
+                return None
+            keypoints = entry['future'].result()
+            last['anchor'], last['anchor_index'] = keypoints, entry['index']
+            return (keypoints,)
+        if entry['kind'] == INTERPOLATED:
+            following = next_anchor(0)
+            if following is None or (not block and not following['future'].done()):
+                return None
+            span = following['index'] - last['anchor_index']
+            t = (entry['index'] - last['anchor_index']) / span
+            return (interpolate_keypoints(last['anchor'], following['future'].result(), t),)
+        return (last['keypoints'],)
+
+    def drain(final=False):
+        while pending:
+            head = pending[0]
+            block = final or len(pending) > depth
+            if head['kind'] == INTERPOLATED and next_anchor(0) is None:
+                if not final:
+                    return
+                anchor(pending[-1])
+            result = ready(head, block)
+            if result is None:
+                return
+            pending.popleft()
+            last['keypoints'] = result[0]
+            yield head['frame'], result[0], head['kind']
+
+    for index, frame in enumerate(frames):
+        active = gate is None or gate.is_active(frame)
+        entry = {'index': index, 'frame': frame, 'kind': HELD, 'future': None}
+        since = None if state['submitted'] is None else index - state['submitted']
+
+        if active:
+            # El primer frame con movimiento tras la quietud siempre se infiere
+            if since is None or since >= stride or not state['active']:
+                anchor(entry)
+            else:
+                entry['kind'] = INTERPOLATED
+        else:
+            # Fin de ráfaga: el último intermedio pasa a inferirse para cerrar la interpolación
+            if pending and pending[-1]['kind'] == INTERPOLATED:
+                anchor(pending[-1])
+                since = 1
+            if since is None or since >= idle_refresh:
+                anchor(entry)
+
+        state['active'] = active
+        pending.append(entry)
+        yield from drain()
+
+    yield from drain(final=True)
@@ -0,0 +1,149 @@
+"""
+Seguimiento de personas entre frames a partir de keypoints de pose
+Asocia las detecciones de cada frame con tracks persistentes resolviendo una
+matriz de costos (distancia media entre keypoints) con el algoritmo húngaro,
+y calcula el movimiento del cuerpo y de los brazos de todos los tracks con
+una sola operación de NumPy. Los contadores de sospecha son por track, así
+que no se mezclan cuando YOLO reordena las detecciones.
+"""
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+
+# Hombros, codos y muñecas (YOLOv8 Pose)
+ARM_KEYPOINTS = [5, 6, 7, 8, 9, 10]
+
+
+class TrackUpdate:
+    """Resultado de un frame, alineado con las detecciones recibidas"""
+
+    def __init__(self, track_ids, counters, body_motion, arm_motion, suspicious):
+        self.track_ids = track_ids
+        self.counters = counters
+        # NaN en detecciones que empiezan un track (sin frame anterior) o sin
+        # keypoints visibles en común con él (p. ej. brazos ocultos)
+        self.body_motion = body_motion
+        self.arm_motion = arm_motion
+        self.suspicious = suspicious
+
+    def __len__(self):
+        return len(self.track_ids)
+
+
+class PoseTracker:
+    """
+    Tracks de personas con contador de sospecha propio.
+
+    Un track suma 1 a su contador cuando el movimiento medio del cuerpo
+    supera body_threshold o el de los brazos supera arm_threshold, y resta
+    1 (sin bajar de 0) si no; es sospechoso con confirm_frames o más.
+    El movimiento solo promedia keypoints visibles en ambos frames (YOLO
+    deja en (0, 0) los de baja confianza) y un keypoint oculto conserva su
+    última posición visible en el track.
+    Una detección se asocia a un track solo si su distancia media es menor
+    que max_distance píxeles; un track sin detección se conserva hasta
+    max_missed frames (oclusiones breves) con su contador.
+    """
+
+    def __init__(self, body_threshold=4, arm_threshold=3, confirm_frames=4,
+                 max_distance=80.0, max_missed=5):
+        self.body_threshold = body_threshold
+        self.arm_threshold = arm_threshold
+        self.confirm_frames = confirm_frames
+        self.max_distance = max_distance
+        self.max_missed = max_missed
+        self.reset()
+
+    def reset(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.keypoints = np.empty((0, 17, 2))
+        self.counters = np.empty(0, dtype=np.int64)
+        self.missed = np.empty(0, dtype=np.int64)
+        self._next_id = 1
+
+    def __len__(self):
+        return len(self.ids)
+
+    def cost_matrix(self, detections):
+        """
+        Distancia media (píxeles) entre cada detección y cada track, usando
+        solo los keypoints visibles en ambos; inf si no comparten ninguno
+        """
+        visible_det = (detections != 0).any(axis=-1)
+        visible_trk = (self.keypoints != 0).any(axis=-1)
+        both = visible_det[:, None, :] & visible_trk[None, :, :]
+        distance = np.linalg.norm(detections[:, None] - self.keypoints[None], axis=-1)
+        shared = both.sum(axis=-1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            cost = np.where(both, distance, 0.0).sum(axis=-1) / shared
+        cost[shared == 0] = np.inf
+        return cost
+
+    def _match(self, detections):
+        """Pares (detección, track) asociados con costo menor que max_distance"""
+        if len(detections) == 0 or len(self.ids) == 0:
+            return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.intp)
+        cost = self.cost_matrix(detections)
+        gated = np.where(cost < self.max_distance, cost, 1e9)
+        rows, cols = linear_sum_assignment(gated)
+        keep = gated[rows, cols] < 1e9
+        return rows[keep], cols[keep]
+
+    def update(self, detections):
+        """Asocia las detecciones (personas, 17, 2) del frame y actualiza los tracks"""
+        detections = np.asarray(detections, dtype=np.float64).reshape(-1, 17, 2)
+        n_det = len(detections)
+        rows, cols = self._match(detections)
+
+        body = np.full(n_det, np.nan)
+        arms = np.full(n_det, np.nan)
+        if len(rows):
+            visible = (detections[rows] != 0).any(axis=-1)
+            both = visible & (self.keypoints[cols] != 0).any(axis=-1)
+            delta = np.where(both[..., None], np.abs(detections[rows] - self.keypoints[cols]), 0.0)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                body[rows] = delta.sum(axis=(1, 2)) / (2 * both.sum(axis=1))
+                arms[rows] = (delta[:, ARM_KEYPOINTS].sum(axis=(1, 2)) /
+                              (2 * both[:, ARM_KEYPOINTS].sum(axis=1)))
+            moving = (body[rows] > self.body_threshold) | (arms[rows] > self.arm_threshold)
+            self.counters[cols] = np.where(moving, self.counters[cols] + 1,
+                                           np.maximum(self.counters[cols] - 1, 0))
+            self.keypoints[cols] = np.where(visible[..., None], detections[rows], self.keypoints[cols])
+            self.missed[cols] = 0
+
+        track_index = np.full(n_det, -1, dtype=np.intp)
+        track_index[rows] = cols
+
+        # Tracks sin detección en este frame
+        unmatched = np.ones(len(self.ids), dtype=bool)
+        unmatched[cols] = False
+        self.missed[unmatched] += 1
+
+        # Detecciones nuevas: tracks nuevos con contador en 0
+        new = np.flatnonzero(track_index < 0)
+        if len(new):
+            new_ids = np.arange(self._next_id, self._next_id + len(new))
+            self._next_id += len(new)
+            track_index[new] = np.arange(len(self.ids), len(self.ids) + len(new))
+            self.ids = np.concatenate([self.ids, new_ids])
+            self.keypoints = np.concatenate([self.keypoints, detections[new]])
+            self.counters = np.concatenate([self.counters, np.zeros(len(new), dtype=np.int64)])
+            self.missed = np.concatenate([self.missed, np.zeros(len(new), dtype=np.int64)])
+
+        result = TrackUpdate(
+            track_ids=self.ids[track_index],
+            counters=self.counters[track_index],
+            body_motion=body,
+            arm_motion=arms,
+            suspicious=self.counters[track_index] >= self.confirm_frames
+        )
+
+        # Olvidar tracks perdidos hace demasiado
+        alive = self.missed <= self.max_missed
+        if not alive.all():
+            self.ids = self.ids[alive]
+            self.keypoints = self.keypoints[alive]
+            self.counters = self.counters[alive]
+            self.missed = self.missed[alive]
+        return result
@@ -0,0 +1,102 @@
+"""
+Batching Service - Micro-lotes con plazo de latencia
+Agrupa solicitudes de varios hilos (cámaras, streams) en un solo lote y lo
+procesa con una única llamada al modelo
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+_STOP = object()
+
+
+class MicroBatcher:
+    """
+    Junta elementos enviados desde cualquier hilo y llama a
+    process_batch(items) -> results (misma longitud y orden) en un hilo propio.
+    Si falla, o retorna otra cantidad de resultados, todos los Futures del
+    lote que sigan pendientes terminan con la excepción.
+
+    Un lote se cierra cuando alcanza max_batch_size o cuando el primer
+    elemento lleva max_latency segundos esperando, lo que ocurra primero.
+    """
+
+    def __init__(self, process_batch, max_batch_size=32, max_latency=0.01, name='micro-batcher'):
+        self.process_batch = process_batch
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.name = name
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._closed = False
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, item):
+        """Encola un elemento y retorna un Future con su resultado"""
+        if self._closed:
+            raise RuntimeError(f"{self.name} está cerrado")
+        self._ensure_started()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout=None):
+        """Envía un elemento y espera su resultado"""
+        return self.submit(item).result(timeout=timeout)
+
+    def _collect(self, first):
+        """Completa un lote a partir del primer elemento respetando el plazo"""
+        batch = [first]
+        deadline = time.monotonic() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                entry = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if entry is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(entry)
+        return batch
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            batch = self._collect(entry)
+            futures = [future for _, future in batch]
+            try:
+                # list(): un generador que falla a mitad no deja Futures resueltos a medias
+                results = list(self.process_batch([item for item, _ in batch]))
+                if len(results) != len(futures):
+                    raise ValueError(f"{self.name}: {len(results)} resultados para "
+                                     f"un lote de {len(futures)} elementos")
+                for future, result in zip(futures, results):
+                    if not future.done():
+                        future.set_result(result)
+            except Exception as e:
+                for future in futures:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def close(self):
+        """Procesa lo pendiente y detiene el hilo del batcher"""
+        self._closed = True
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
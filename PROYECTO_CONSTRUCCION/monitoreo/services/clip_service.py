@@ -0,0 +1,334 @@
+"""
+Clip Service - Clips de incidentes con pre y post grabación
+Cada cámara guarda sus últimos segundos (solo la pre-grabación) en un buffer
+circular preasignado que se sobrescribe en su lugar. Al dispararse una alerta
+se reserva uno de los buffers de clip del codificador (también preasignados y
+reutilizados), se copia ahí la pre-grabación y el codificador empieza a
+escribir el clip MP4 en un hilo de fondo; los frames de la post-grabación se
+le envían uno por uno a medida que llegan.
+"""
+
+import datetime
+import os
+import queue
+import re
+import threading
+
+import cv2
+import numpy as np
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+
+from ..models import Alertas
+
+
+_STOP = object()
+
+
+class FrameRingBuffer:
+    """Últimos `capacity` frames en un arreglo preasignado (capacity, alto, ancho, 3)"""
+
+    def __init__(self, capacity, max_width=None):
+        self.capacity = capacity
+        self.max_width = max_width
+        self.count = 0
+        self._frames = None
+        self._next = 0
+
+    def _allocate(self, frame):
+        height, width = frame.shape[:2]
+        if self.max_width and width > self.max_width:
+            height, width = int(round(height * self.max_width / width)), self.max_width
+        self._frames = np.empty((self.capacity, height, width) + frame.shape[2:], dtype=frame.dtype)
+        self._next = 0
+        self.count = 0
+
+    @property
+    def frame_size(self):
+        """(ancho, alto) de los frames guardados"""
+        return None if self._frames is None else (self._frames.shape[2], self._frames.shape[1])
+
+    def push(self, frame):
+        if self._frames is None or self._frames.shape[3:] != frame.shape[2:]:
+            self._allocate(frame)
+        slot = self._frames[self._next]
+        if slot.shape == frame.shape:
+            np.copyto(slot, frame)
+        else:
+            cv2.resize(frame, (slot.shape[1], slot.shape[0]), dst=slot, interpolation=cv2.INTER_LINEAR)
+        self._next = (self._next + 1) % self.capacity
+        self.count += 1
+
+    @property
+    def shape(self):
+        """Forma del arreglo preasignado (capacity, alto, ancho, 3)"""
+        return None if self._frames is None else self._frames.shape
+
+    def latest(self):
+        """Vista del último frame guardado (se sobrescribe al dar la vuelta)"""
+        return self._frames[(self._next - 1) % self.capacity]
+
+    def copy_to(self, out):
+        """
+        Copia los frames guardados, del más antiguo al más reciente, al inicio
+        de out (misma forma que el buffer). El buffer no cambia. Retorna cuántos.
+        """
+        n = min(self.count, self.capacity)
+        order = (self._next - n + np.arange(n)) % self.capacity
+        np.take(self._frames, order, axis=0, out=out[:n])
+        return n
+
+
+class ClipEncoder:
+    """
+    Hilo que escribe clips MP4 a medida que recibe sus frames.
+
+    reserve() toma uno de los max_clips buffers de pre-grabación, open()
+    empieza un clip con los frames copiados ahí, append() le agrega frames y
+    finish() lo cierra. El buffer vuelve al pool en cuanto se escribió la
+    pre-grabación; la cola es acotada y nunca bloquea al stream salvo al
+    cerrar un clip.
+    """
+
+    def __init__(self, max_queue=256, max_clips=4, fourcc='mp4v', name='clip-encoder'):
+        self.fourcc = cv2.VideoWriter_fourcc(*fourcc)
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._buffers = queue.Queue()
+        for _ in range(max_clips):
+            self._buffers.put({'frames': None})
+        self._lock = threading.Lock()
+        self._thread = None
+        self.stats = {'written': 0, 'dropped': 0, 'dropped_frames': 0, 'failed': 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def reserve(self, shape, dtype=np.uint8):
+        """
+        Toma un buffer de pre-grabación libre con espacio para `shape`
+        (frames, alto, ancho, 3); se reasigna solo si cambió la forma.
+        Retorna None si todos están en uso (el clip se descarta).
+        """
+        try:
+            buffer = self._buffers.get_nowait()
+        except queue.Empty:
+            self.stats['dropped'] += 1
+            return None
+        if buffer['frames'] is None or buffer['frames'].shape != shape or buffer['frames'].dtype != dtype:
+            buffer['frames'] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def release(self, buffer):
+        self._buffers.put(buffer)
+
+    def open(self, path, buffer, count, fps, callback=None):
+        """
+        Empieza un clip con los primeros count frames de un buffer de
+        reserve(), que el codificador devuelve al pool al escribirlos.
+        callback(path) se llama desde el hilo del codificador cuando el archivo
+        está completo. Retorna el clip para append()/finish(), o None si la
+        cola está llena (el buffer se libera).
+        """
+        self._ensure_started()
+        clip = {'path': path, 'fps': fps, 'callback': callback, 'dropped_frames': 0}
+        try:
+            self._queue.put_nowait(('open', clip, (buffer, count)))
+        except queue.Full:
+            self.release(buffer)
+            self.stats['dropped'] += 1
+            return None
+        return clip
+
+    def append(self, clip, frame):
+        """Agrega un frame al clip; si la cola está llena el frame se pierde (y se cuenta)"""
+        try:
+            self._queue.put_nowait(('frame', clip, frame))
+        except queue.Full:
+            clip['dropped_frames'] += 1
+            self.stats['dropped_frames'] += 1
+
+    def finish(self, clip):
+        """Cierra el clip (espera lugar en la cola: un clip abierto debe cerrarse)"""
+        self._queue.put(('finish', clip, None))
+
+    def _start(self, clip, data):
+        """Abre el VideoWriter en un temporal y escribe la pre-grabación"""
+        buffer, count = data
+        try:
+            path = clip['path']
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            base, ext = os.path.splitext(path)
+            clip['tmp'] = f"{base}.tmp{ext}"
+            height, width = buffer['frames'].shape[1:3]
+            clip['size'] = (width, height)
+            clip['writer'] = cv2.VideoWriter(clip['tmp'], self.fourcc, clip['fps'], (width, height))
+            if not clip['writer'].isOpened():
+                raise ValueError(f"No se puede crear el video: {path}")
+            for frame in buffer['frames'][:count]:
+                clip['writer'].write(frame)
+        finally:
+            self.release(buffer)
+
+    def _write(self, clip, frame):
+        if frame.shape[1::-1] != clip['size']:
+            frame = cv2.resize(frame, clip['size'], interpolation=cv2.INTER_LINEAR)
+        clip['writer'].write(frame)
+
+    def _fail(self, clip, error):
+        self.stats['failed'] += 1
+        clip['failed'] = True
+        writer = clip.pop('writer', None)
+        if writer is not None:
+            writer.release()
+        if clip.get('tmp') and os.path.exists(clip['tmp']):
+            os.remove(clip['tmp'])
+        print(f"Error escribiendo clip {clip['path']}: {str(error)}")
+
+    def _complete(self, clip):
+        """Renombra el temporal al terminar: nunca queda un MP4 a medias"""
+        clip.pop('writer').release()
+        os.replace(clip['tmp'], clip['path'])
+        self.stats['written'] += 1
+        if clip['dropped_frames']:
+            print(f"Clip {clip['path']}: {clip['dropped_frames']} frames de post-grabación "
+                  f"perdidos (cola del codificador llena)")
+        if clip['callback'] is not None:
+            clip['callback'](clip['path'])
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            action, clip, data = entry
+            if clip.get('failed'):
+                continue
+            try:
+                if action == 'open':
+                    self._start(clip, data)
+                elif action == 'frame':
+                    self._write(clip, data)
+                else:
+                    self._complete(clip)
+            except Exception as e:
+                self._fail(clip, e)
+
+    def close(self):
+        """Escribe lo pendiente y detiene el hilo"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
+
+
+class ClipRecorder:
+    """
+    Grabador de incidentes de una cámara.
+
+    push(frame) en cada frame del stream; trigger() al dispararse una alerta.
+    El clip cubre pre_seconds antes del disparo y post_seconds después; los
+    disparos mientras se completa un clip se ignoran (ya quedan cubiertos).
+    El buffer solo guarda la pre-grabación y nunca se reasigna por un disparo.
+    """
+
+    def __init__(self, directory, camera_id='default', fps=30.0, pre_seconds=5.0, post_seconds=5.0,
+                 max_width=640, encoder=None):
+        self.directory = str(directory)
+        self.camera_id = camera_id
+        self.fps = fps or 30.0
+        self.pre_frames = max(1, int(round(pre_seconds * self.fps)))
+        self.post_frames = int(round(post_seconds * self.fps))
+        self.ring = FrameRingBuffer(self.pre_frames, max_width=max_width)
+        self.encoder = encoder or clip_encoder
+        self._clip = None
+        self._remaining = 0
+
+    @property
+    def recording(self):
+        return self._clip is not None
+
+    def path_for(self):
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        camera = re.sub(r'[^A-Za-z0-9_-]+', '_', str(self.camera_id))
+        return os.path.join(self.directory, f"incidente_{camera}_{stamp}.mp4")
+
+    def push(self, frame):
+        self.ring.push(frame)
+        if self._clip is not None:
+            # El buffer ya tiene el frame reducido; se copia solo ese frame
+            self.encoder.append(self._clip, self.ring.latest().copy())
+            self._remaining -= 1
+            if self._remaining <= 0:
+                self._finish()
+
+    def trigger(self, callback=None):
+        """
+        Marca el frame recién agregado como disparo. callback(path) se llama
+        cuando el clip está escrito. Retorna False si ya había un clip en curso
+        o si el codificador está saturado; en ese caso la pre-grabación sigue
+        intacta en el buffer para el próximo disparo.
+        """
+        if self._clip is not None or self.ring.count == 0:
+            return False
+        buffer = self.encoder.reserve(self.ring.shape)
+        if buffer is None:
+            return False
+        count = self.ring.copy_to(buffer['frames'])
+        clip = self.encoder.open(self.path_for(), buffer, count, self.fps, callback)
+        if clip is None:
+            return False
+        self._clip = clip
+        self._remaining = self.post_frames
+        if self.post_frames == 0:
+            self._finish()
+        return True
+
+    def _finish(self):
+        clip, self._clip = self._clip, None
+        self.encoder.finish(clip)
+
+    def flush(self):
+        """Cierra el clip en curso con la post-grabación que haya (fin del stream)"""
+        if self._clip is not None:
+            self._finish()
+
+
+def link_clip_to_alert(path, camera_id, triggered_at=None, window=60):
+    """
+    Asocia el clip a la alerta sin clip más reciente de la misma cámara
+    registrada a menos de window segundos del disparo. Si no hay ninguna el
+    clip queda en disco sin alerta: no se crean alertas. Se llama desde el
+    hilo del codificador.
+    """
+    close_old_connections()
+    triggered_at = triggered_at or timezone.now()
+    margin = datetime.timedelta(seconds=window)
+    try:
+        alerta = Alertas.objects.filter(
+            Q(clip='') | Q(clip__isnull=True),
+            camara=str(camera_id),
+            hora__gte=triggered_at - margin,
+            hora__lte=triggered_at + margin
+        ).order_by('-hora').first()
+
+        if alerta is None:
+            print(f"Clip sin alerta de la cámara {camera_id}: {path}")
+            return None
+
+        alerta.clip.name = os.path.relpath(path, settings.MEDIA_ROOT).replace(os.sep, '/')
+        alerta.save(update_fields=['clip'])
+        return alerta
+    except Exception as e:
+        print(f"Error asociando clip {path}: {str(e)}")
+        return None
+
+
+# Instancia global
+clip_encoder = ClipEncoder()
@@ -5,9 +5,23 @@ Wrapper alrededor de BehaviorDetector
 
 import os
 import shutil
+import threading
+import time
+import numpy as np
 from django.conf import settings
-from ..behavior_detector import detector
+from django.db import transaction
+from ..analysis_cache import AnalysisCache
+from ..behavior_detector import BehaviorDetector, detector
+from ..classifier_backends import DEFAULT_BACKEND, get_backend
+from ..feature_cache import FeatureCache
+from ..feature_extractor import N_FEATURES
+from ..frame_store import DecodedFrameStore
+from ..model_search import search_models
 from ..models import TrainingVideo, TrainedModel
+from .batching_service import MicroBatcher
+from .inference_server import remote_client, submit_with_fallback
+from .model_registry import active_model_registry
+from .model_store import model_store
 
 
 class DetectionService:
@@ -15,34 +29,89 @@ class DetectionService:
     
     def __init__(self):
         self.detector = detector
+        self.detector.max_streams = getattr(settings, 'DETECTION_MAX_STREAMS', 64)
+        self.detector.stream_idle_seconds = getattr(settings, 'DETECTION_STREAM_IDLE_SECONDS', 300)
+        self.registry = active_model_registry
+        self.store = model_store
+        self._batcher = None
+        self._analysis_cache = None
+        self._load_lock = threading.Lock()
+        # Último artefacto que no se pudo cargar y cuándo reintentarlo
+        self.failed_artifact_id = None
+        self._retry_at = 0.0
+    
+    def ensure_active_model(self):
+        """
+        Carga en el detector el artefacto del modelo activo si todavía no es
+        el que tiene en memoria (arranque del worker o modelo nuevo entrenado
+        en otro proceso). Retorna True si hay un modelo listo para predecir.
+        
+        Si la carga falla, el detector sigue con el modelo que tenía y
+        artifact_id no cambia; el artefacto se marca como fallido y no se
+        reintenta hasta pasados MODEL_LOAD_RETRY_SECONDS (no en cada frame).
+        """
+        info = self.registry.get_info()
+        if info is None:
+            return False
+        
+        if info['id'] != self.detector.artifact_id and info['model_file'] and not self._retry_pending(info['id']):
+            with self._load_lock:
+                if info['id'] != self.detector.artifact_id and not self._retry_pending(info['id']):
+                    try:
+                        self.store.load(self.detector, info['model_file'])
+                        self.detector.artifact_id = info['id']
+                        self.failed_artifact_id = None
+                    except Exception as e:
+                        print(f"Error cargando el modelo {info['name']}: {str(e)}")
+                        self.failed_artifact_id = info['id']
+                        self._retry_at = time.monotonic() + getattr(settings, 'MODEL_LOAD_RETRY_SECONDS', 30)
+        
+        return self.detector.is_trained
+    
+    def _retry_pending(self, artifact_id):
+        """True si artifact_id falló hace poco y todavía no toca reintentar"""
+        return artifact_id == self.failed_artifact_id and time.monotonic() < self._retry_at
     
     def is_model_trained(self):
-        """Verifica si hay un modelo entrenado activo"""
-        return TrainedModel.objects.filter(is_active=True).exists() and self.detector.is_trained
+        """Verifica si hay un modelo entrenado activo (sin consultar la base de datos)"""
+        return self.ensure_active_model()
+    
+    def warm_up(self, n_rows=8):
+        """
+        Carga el modelo activo y ejecuta una inferencia de prueba antes de
+        aceptar tráfico, para que la primera petición no pague la carga ni
+        los fallos de página. Retorna True si quedó un modelo listo.
+        """
+        try:
+            if not self.ensure_active_model():
+                print("Sin modelo activo: se omite el calentamiento")
+                return False
+            
+            compiled = self.detector.compiled
+            if compiled is not None:
+                # Recorrer los arreglos trae sus páginas a memoria (compartidas entre workers)
+                for name in compiled.ARRAY_FIELDS:
+                    np.asarray(getattr(compiled, name)).sum()
+            
+            self.detector.predict_features(np.zeros((n_rows, N_FEATURES)))
+            return True
+        except Exception as e:
+            print(f"Error en el calentamiento del modelo: {str(e)}")
+            return False
     
     def get_active_model_info(self):
-        """Obtiene información del modelo activo"""
-        model = TrainedModel.objects.filter(is_active=True).first()
-        
-        if not model:
-            return None
-        
-        return {
-            'name': model.name,
-            'accuracy': model.accuracy,
-            'precision': model.precision,
-            'recall': model.recall,
-            'f1_score': model.f1_score,
-            'samples': model.training_samples,
-            'created_at': model.created_at
-        }
+        """Obtiene información del modelo activo desde el registro en memoria"""
+        return self.registry.get_info()
     
-    def predict_frame(self, frame):
-        """Predice comportamiento en un frame"""
+    def predict_frame(self, frame, camera_id=None):
+        """
+        Predice comportamiento en un frame de la cámara camera_id. Sin
+        camera_id el frame se clasifica solo, sin ventana compartida.
+        """
         if not self.is_model_trained():
             return None, 0.0
         
-        prediction, confidence = self.detector.predict_frame(frame)
+        prediction, confidence = self.detector.predict_frame(frame, camera_id=camera_id)
         
         if prediction is None:
             return None, 0.0
@@ -50,6 +119,134 @@ class DetectionService:
         behavior = self.detector.reverse_map.get(prediction, 'desconocido')
         return behavior, float(confidence)
     
+    def predict_batch(self, frames=None, camera_ids=None, features=None):
+        """
+        Predice varios frames (de una o varias cámaras) o filas de
+        características con una sola pasada del modelo.
+        Retorna una lista de (behavior, confidence).
+        """
+        count = len(features) if features is not None else len(frames)
+        if not self.is_model_trained() or count == 0:
+            return [(None, 0.0)] * count
+        
+        if features is not None:
+            labels, confidences = self.detector.predict_features(features)
+        else:
+            labels, confidences = self.detector.predict_batch(frames, camera_ids)
+        
+        return [
+            (self.detector.reverse_map.get(label, 'desconocido'), float(confidence))
+            for label, confidence in zip(labels, confidences)
+        ]
+    
+    @property
+    def batcher(self):
+        """Micro-batcher compartido por todos los streams de cámara"""
+        if self._batcher is None:
+            self._batcher = MicroBatcher(
+                self._predict_batch_items,
+                max_batch_size=getattr(settings, 'DETECTION_BATCH_SIZE', 32),
+                max_latency=getattr(settings, 'DETECTION_BATCH_LATENCY_MS', 10) / 1000,
+                name='detection-batcher'
+            )
+        return self._batcher
+    
+    def _predict_batch_items(self, items):
+        frames = [frame for frame, _ in items]
+        camera_ids = [camera_id for _, camera_id in items]
+        return self.predict_batch(frames, camera_ids)
+    
+    def submit_frame(self, frame, camera_id):
+        """
+        Encola un frame para predecirlo junto con los de otras cámaras dentro
+        del plazo de latencia configurado. Retorna un Future con (behavior, confidence).
+        Con INFERENCE_SERVER_ADDRESS el frame se predice en el servidor de
+        inferencia (y en el proceso si el servidor no responde).
+        """
+        client = remote_client()
+        if client is not None:
+            local = lambda frame, camera_id: self.batcher.submit((frame, camera_id))
+            return submit_with_fallback(client.submit_behavior, local)(frame, camera_id)
+        return self.batcher.submit((frame, camera_id))
+    
+    @property
+    def analysis_cache(self):
+        """Resultados de análisis de videos en MEDIA_ROOT/analysis_cache"""
+        if self._analysis_cache is None:
+            self._analysis_cache = AnalysisCache(os.path.join(settings.MEDIA_ROOT, 'analysis_cache'))
+        return self._analysis_cache
+    
+    def _analysis_params(self, bundle, stride=None, confidence=None, confirm_windows=None):
+        if confidence is None:
+            confidence = getattr(settings, 'ANALYSIS_EARLY_STOP_CONFIDENCE', None)
+        if confirm_windows is None:
+            confirm_windows = getattr(settings, 'ANALYSIS_CONFIRM_WINDOWS', 3)
+        return {
+            'window': bundle.window_frames,
+            'stride': stride or max(1, bundle.window_frames // 2),
+            'confidence': confidence,
+            'confirm_windows': confirm_windows
+        }
+    
+    def iter_analysis(self, video_path, stride=None, confidence=None, confirm_windows=None):
+        """
+        Genera las detecciones por ventana de un video. Si el mismo contenido
+        ya se analizó con el mismo modelo y parámetros, las lee de la caché;
+        si no, las calcula en streaming y las guarda al terminar.
+        """
+        if not self.is_model_trained():
+            raise ValueError("Modelo no entrenado aún")
+        
+        # La clave y el análisis usan el mismo modelo aunque se publique otro
+        bundle = self.detector.bundle
+        params = self._analysis_params(bundle, stride, confidence, confirm_windows)
+        key = self.analysis_cache.key_for(video_path, bundle.model_version, **params)
+        cached = self.analysis_cache.get(key)
+        if cached is not None:
+            yield from cached['detections']
+            return
+        
+        detections = []
+        for detection in self.detector.iter_detect(
+                video_path,
+                stride=params['stride'],
+                confidence=params['confidence'],
+                confirm_windows=params['confirm_windows'],
+                bundle=bundle):
+            detections.append(detection)
+            yield detection
+        
+        # Solo se guarda un análisis completo (no si el cliente cortó antes)
+        self.analysis_cache.put(key, {'detections': detections})
+    
+    def summarize_detections(self, detections):
+        """Resumen de las detecciones por ventana de un video"""
+        behavior_counts = {}
+        for detection in detections:
+            behavior = detection['behavior']
+            behavior_counts[behavior] = behavior_counts.get(behavior, 0) + 1
+        
+        avg_confidence = sum(d['confidence'] for d in detections) / len(detections) if detections else 0
+        
+        # Comportamiento predominante (o el veredicto anticipado, si lo hubo)
+        verdict = next((d for d in detections if d.get('verdict')), None)
+        if verdict:
+            predominant_behavior = verdict['behavior']
+        elif behavior_counts:
+            predominant_behavior = max(behavior_counts.items(), key=lambda x: x[1])[0]
+        else:
+            predominant_behavior = "Desconocido"
+        
+        return {
+            'total_frames': detections[-1]['end_frame'] + 1 if detections else 0,
+            'total_windows': len(detections),
+            'behavior_counts': behavior_counts,
+            'predominant_behavior': predominant_behavior,
+            'average_confidence': round(avg_confidence, 3),
+            'early_stop': verdict is not None,
+            'sample_detections': detections[:10]  # Primeras 10 detecciones
+        }
+    
     def get_behavior_labels(self):
         """Obtiene lista de comportamientos detectables"""
         return list(self.detector.label_map.keys())
@@ -60,6 +257,22 @@ class TrainingService:
     
     def __init__(self):
         self.detector = detector
+        self._feature_cache = None
+        self._frame_store = None
+    
+    @property
+    def feature_cache(self):
+        """Caché de características persistente en MEDIA_ROOT/feature_cache"""
+        if self._feature_cache is None:
+            self._feature_cache = FeatureCache(os.path.join(settings.MEDIA_ROOT, 'feature_cache'))
+        return self._feature_cache
+    
+    @property
+    def frame_store(self):
+        """Frames decodificados en MEDIA_ROOT/frame_store (python manage.py build_frame_store)"""
+        if self._frame_store is None:
+            self._frame_store = DecodedFrameStore(os.path.join(settings.MEDIA_ROOT, 'frame_store'))
+        return self._frame_store
     
     def prepare_training_data(self):
         """Prepara estructura de datos para entrenamiento"""
@@ -80,8 +293,14 @@ class TrainingService:
                 src = video.video.path
                 
                 if os.path.exists(src):
-                    dst_dir = os.path.join(base_path, video.behavior_type)
-                    dst = os.path.join(dst_dir, os.path.basename(video.video.name))
+                    dst = self.training_path(video, base_path)
+                    
+                    # Evitar copiar de nuevo un video idéntico ya presente
+                    if os.path.exists(dst):
+                        src_stat, dst_stat = os.stat(src), os.stat(dst)
+                        if (src_stat.st_size == dst_stat.st_size
+                                and int(src_stat.st_mtime) == int(dst_stat.st_mtime)):
+                            continue
                     
                     try:
                         shutil.copy2(src, dst)
@@ -90,6 +309,10 @@ class TrainingService:
         
         return base_path
     
+    def training_path(self, video, base_path):
+        """Ruta de un TrainingVideo dentro de la estructura de entrenamiento"""
+        return os.path.join(base_path, video.behavior_type, os.path.basename(video.video.name))
+    
     def get_training_stats(self):
         """Obtiene estadísticas de videos de entrenamiento"""
         videos = TrainingVideo.objects.all()
@@ -104,31 +327,120 @@ class TrainingService:
             'unprocessed': videos.filter(processed=False).count(),
         }
     
-    def train_model(self, test_size=0.2):
-        """Entrena un nuevo modelo con datos disponibles"""
+    def _load_full_model(self):
+        """
+        Los workers cargan solo el bosque compilado; para actualizar el modelo
+        hace falta el modelo completo del artefacto activo. Si en memoria hay
+        otro artefacto (otro proceso activó uno distinto) se recarga desde
+        model_store para no actualizar un modelo desactualizado.
+        """
+        info = active_model_registry.get_info()
+        if not info or not info['model_file']:
+            return False
+        if self.detector.model is not None and self.detector.artifact_id == info['id']:
+            return True
+        try:
+            self.detector.load_model(model_store.path(info['model_file']))
+            self.detector.artifact_id = info['id']
+        except Exception as e:
+            print(f"Error cargando el modelo completo: {str(e)}")
+            return False
+        return True
+    
+    def _train_incremental(self, base_path, new_paths, backend, progress=None, test_size=0.2):
+        """Retorna las métricas de la actualización incremental o None si no aplica"""
+        if not new_paths or not self._load_full_model():
+            return None
+        if self.detector.backend != backend:
+            print(f"Cambio de clasificador ({self.detector.backend} -> {backend}): reentrenamiento completo")
+            return None
+        if self.detector.incremental_updates >= getattr(settings, 'TRAINING_FULL_REBUILD_EVERY', 10):
+            print("Reconstrucción completa periódica del modelo")
+            return None
+        
+        try:
+            return self.detector.train_incremental(
+                base_path,
+                new_paths,
+                cache=self.feature_cache,
+                n_jobs=getattr(settings, 'TRAINING_EXTRACTION_JOBS', -1),
+                sampling=getattr(settings, 'TRAINING_SAMPLING', 'first'),
+                n_new_trees=getattr(settings, 'TRAINING_INCREMENTAL_TREES', 10),
+                progress=progress,
+                frame_store=self.frame_store,
+                holdout_size=test_size
+            )
+        except ValueError as e:
+            print(f"Actualización incremental no aplicable, se reentrena completo: {str(e)}")
+            return None
+    
+    def train_model(self, test_size=0.2, incremental=False, progress=None, backend=None):
+        """
+        Entrena un nuevo modelo con datos disponibles.
+        Con incremental=True agrega árboles solo para los videos no procesados
+        y cae a un reentrenamiento completo si no es posible o si ya se
+        acumularon TRAINING_FULL_REBUILD_EVERY actualizaciones.
+        progress: función progress(**evento) que recibe la fase actual
+        backend: clasificador a usar (por defecto settings.DETECTION_BACKEND)
+        """
+        report = progress or (lambda **event: None)
+        backend = get_backend(backend or getattr(settings, 'DETECTION_BACKEND', DEFAULT_BACKEND)).name
         
         # Preparar datos
+        report(phase='preparing')
         base_path = self.prepare_training_data()
+        new_paths = [
+            self.training_path(video, base_path)
+            for video in TrainingVideo.objects.filter(processed=False)
+            if video.video
+        ]
+        
+        report(phase='training')
+        metrics = (self._train_incremental(base_path, new_paths, backend, progress, test_size=test_size)
+                   if incremental else None)
+        mode = 'incremental'
         
         # Entrenar
-        metrics = self.detector.train(base_path, test_size=test_size)
-        
-        # Guardar en base de datos
-        model = TrainedModel.objects.create(
-            name=f"Model - {TrainedModel.objects.count() + 1}",
-            accuracy=metrics['accuracy'],
-            precision=metrics['precision'],
-            recall=metrics['recall'],
-            f1_score=metrics['f1'],
-            training_samples=metrics['samples'],
-            is_active=True
-        )
+        if metrics is None:
+            mode = 'full'
+            metrics = self.detector.train(
+                base_path,
+                test_size=test_size,
+                cache=self.feature_cache,
+                n_jobs=getattr(settings, 'TRAINING_EXTRACTION_JOBS', -1),
+                sampling=getattr(settings, 'TRAINING_SAMPLING', 'first'),
+                progress=progress,
+                backend=backend,
+                frame_store=self.frame_store
+            )
         
-        # Marcar videos como procesados
-        TrainingVideo.objects.filter(processed=False).update(processed=True)
+        # Guardar artefacto versionado y registrarlo en base de datos
+        report(phase='saving')
+        model_file = model_store.save(self.detector)
+        in_sample = metrics.get('evaluation') == 'in_sample'
+        # Desactivar los anteriores y crear el nuevo en una sola transacción:
+        # ningún lector ve dos modelos activos (ni ninguno si algo falla)
+        with transaction.atomic():
+            TrainedModel.objects.filter(is_active=True).update(is_active=False)
+            model = TrainedModel.objects.create(
+                name=f"Model - {TrainedModel.objects.count() + 1}",
+                description="Métricas sobre los datos de entrenamiento (sin videos nuevos para evaluar)" if in_sample else "",
+                model_file=model_file,
+                accuracy=metrics['accuracy'],
+                precision=metrics['precision'],
+                recall=metrics['recall'],
+                f1_score=metrics['f1'],
+                training_samples=metrics['samples'],
+                params={'backend': backend},
+                is_active=True
+            )
+            
+            # Marcar videos como procesados
+            TrainingVideo.objects.filter(processed=False).update(processed=True)
+        self.detector.artifact_id = model.id
         
-        # Desactivar modelos anteriores
-        TrainedModel.objects.exclude(id=model.id).update(is_active=False)
+        # update() no emite señales: invalidar el registro explícitamente
+        active_model_registry.invalidate()
         
         return {
             'model_id': model.id,
@@ -136,9 +448,124 @@ class TrainingService:
             'precision': metrics['precision'],
             'recall': metrics['recall'],
             'f1_score': metrics['f1'],
-            'samples': metrics['samples']
+            'samples': metrics['samples'],
+            'test_samples': metrics['test_samples'],
+            'evaluation': metrics.get('evaluation', 'holdout'),
+            'mode': mode,
+            'backend': backend
+        }
+    
+    def search_models(self, method='random', n_iter=20, cv=5, top_k=5, latency_budget_ms=None,
+                      activate=True, progress=None):
+        """
+        Búsqueda de hiperparámetros con k-fold estratificado sobre las
+        características cacheadas (cada video se decodifica a lo sumo una vez).
+        Guarda los top_k candidatos como TrainedModel ordenados por F1 y
+        latencia p99; con activate=True activa el mejor que cumple el
+        presupuesto DETECTION_LATENCY_BUDGET_MS.
+        """
+        report = progress or (lambda **event: None)
+        if latency_budget_ms is None:
+            latency_budget_ms = getattr(settings, 'DETECTION_LATENCY_BUDGET_MS', None)
+        
+        report(phase='preparing')
+        base_path = self.prepare_training_data()
+        max_frames = self.detector.window_frames
+        video_paths, labels = self.detector.collect_videos(base_path)
+        X, y, _ = self.detector.load_dataset(
+            video_paths, labels,
+            progress=progress,
+            cache=self.feature_cache,
+            max_frames=max_frames,
+            n_jobs=getattr(settings, 'TRAINING_EXTRACTION_JOBS', -1),
+            sampling=getattr(settings, 'TRAINING_SAMPLING', 'first'),
+            frame_store=self.frame_store
+        )
+        
+        print(f"\nBúsqueda '{method}' sobre {len(X)} muestras...")
+        report(phase='searching')
+        candidates = search_models(
+            X, y, method=method, n_iter=n_iter, cv=cv, top_k=top_k,
+            n_jobs=getattr(settings, 'MODEL_SEARCH_JOBS', -1),
+            latency_budget_ms=latency_budget_ms
+        )
+        
+        report(phase='saving')
+        results = []
+        for candidate in candidates:
+            candidate_detector = BehaviorDetector()
+            candidate_detector.set_estimator(candidate['model'], candidate['scaler'], max_frames)
+            # Successive halving solo evalúa F1: el resto de métricas queda en 0
+            f1_only = candidate['accuracy'] is None
+            model = TrainedModel.objects.create(
+                name=f"Model - {TrainedModel.objects.count() + 1} (búsqueda #{candidate['rank']})",
+                description="Búsqueda por reducción sucesiva: solo se validó F1" if f1_only else '',
+                model_file=model_store.save(candidate_detector),
+                accuracy=candidate['accuracy'] or 0.0,
+                precision=candidate['precision'] or 0.0,
+                recall=candidate['recall'] or 0.0,
+                f1_score=candidate['f1'],
+                training_samples=len(X),
+                params=candidate['params'],
+                cv_folds=candidate['folds'],
+                cv_f1_std=candidate['f1_std'],
+                latency_p50_ms=candidate['latency_p50_ms'],
+                latency_p99_ms=candidate['latency_p99_ms'],
+                search_rank=candidate['rank'],
+                is_active=False
+            )
+            results.append({
+                'model_id': model.id,
+                'rank': candidate['rank'],
+                'params': candidate['params'],
+                'f1_score': candidate['f1'],
+                'f1_std': candidate['f1_std'],
+                'accuracy': candidate['accuracy'],
+                'latency_p50_ms': candidate['latency_p50_ms'],
+                'latency_p99_ms': candidate['latency_p99_ms'],
+                'within_budget': candidate['within_budget']
+            })
+            print(f"  #{candidate['rank']} F1={candidate['f1']:.4f} "
+                  f"p99={candidate['latency_p99_ms']:.3f} ms {candidate['params']}")
+        
+        TrainingVideo.objects.filter(processed=False).update(processed=True)
+        
+        best = next((result for result in results if result['within_budget']), None)
+        if activate and best is not None:
+            self.activate_model(best['model_id'])
+        
+        return {
+            'latency_budget_ms': latency_budget_ms,
+            'activated': best['model_id'] if activate and best else None,
+            'candidates': results
         }
     
+    def activate_model(self, model_id):
+        """
+        Activa un TrainedModel existente y lo carga en este proceso. El
+        artefacto se carga y se prueba antes de tocar la base de datos: si
+        falla, el modelo activo sigue siendo el anterior en todos los workers.
+        """
+        model = TrainedModel.objects.get(id=model_id)
+        if not model.model_file:
+            raise ValueError(f"El modelo {model.id} no tiene artefacto guardado")
+        
+        candidate = BehaviorDetector()
+        model_store.load(candidate, model.model_file.name)
+        candidate.predict_features(np.zeros((1, N_FEATURES)))
+        
+        with transaction.atomic():
+            TrainedModel.objects.exclude(id=model.id).update(is_active=False)
+            if not model.is_active:
+                model.is_active = True
+                model.save(update_fields=['is_active', 'updated_at'])
+        
+        # update() no emite señales: invalidar el registro explícitamente
+        active_model_registry.invalidate()
+        self.detector.publish(candidate.bundle)
+        self.detector.artifact_id = model.id
+        return model
+    
     def validate_training_data(self):
         """Valida que haya suficientes datos para entrenar"""
         stats = self.get_training_stats()
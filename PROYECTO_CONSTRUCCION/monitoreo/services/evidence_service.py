@@ -0,0 +1,142 @@
+"""
+Evidence Service - Escritura de evidencias en segundo plano
+Decide en el hilo del stream (con operaciones baratas) si un frame sospechoso
+merece guardarse y delega la codificación JPEG y la escritura a disco a un
+hilo propio con una cola acotada: el stream nunca espera al disco.
+"""
+
+import datetime
+import os
+import queue
+import re
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+_STOP = object()
+
+
+def dhash(image, hash_size=8):
+    """Hash perceptual por diferencias (64 bits): frames casi iguales dan hashes cercanos"""
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(image, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA)
+    bits = (small[:, 1:] > small[:, :-1]).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+class EvidenceWriter:
+    """
+    Guarda frames de evidencia sin bloquear al que los envía.
+
+    Un frame se descarta si la cámara guardó otro hace menos de
+    camera_interval segundos, si todos sus tracks sospechosos ya tienen
+    evidencia de hace menos de track_interval segundos, o si su dHash está a
+    menos de min_hash_distance bits del último guardado de esa cámara.
+    Si la cola de escritura está llena, el frame se descarta.
+    """
+
+    def __init__(self, directory, camera_interval=2.0, track_interval=10.0, min_hash_distance=6,
+                 max_queue=32, jpeg_quality=85, name='evidence-writer'):
+        self.directory = str(directory)
+        self.camera_interval = camera_interval
+        self.track_interval = track_interval
+        self.min_hash_distance = min_hash_distance
+        self.jpeg_quality = jpeg_quality
+        self.name = name
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._thread = None
+        self._last_camera = {}
+        self._last_track = {}
+        self._last_hash = {}
+        self.stats = {'written': 0, 'rate_limited': 0, 'duplicate': 0, 'dropped': 0, 'failed': 0}
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                    self._thread.start()
+
+    def submit(self, frame, camera_id='default', track_ids=()):
+        """
+        Envía un frame sospechoso. Retorna la ruta donde se guardará o None
+        si se descartó.
+        """
+        now = time.monotonic()
+        track_ids = [int(track_id) for track_id in track_ids]
+        with self._lock:
+            if now - self._last_camera.get(camera_id, -np.inf) < self.camera_interval:
+                self.stats['rate_limited'] += 1
+                return None
+            fresh = [track_id for track_id in track_ids
+                     if now - self._last_track.get((camera_id, track_id), -np.inf) >= self.track_interval]
+            if track_ids and not fresh:
+                self.stats['rate_limited'] += 1
+                return None
+
+            frame_hash = dhash(frame)
+            previous = self._last_hash.get(camera_id)
+            if previous is not None and hamming(previous, frame_hash) < self.min_hash_distance:
+                self.stats['duplicate'] += 1
+                return None
+
+            path = self.path_for(camera_id)
+            try:
+                self._queue.put_nowait((path, frame.copy()))
+            except queue.Full:
+                self.stats['dropped'] += 1
+                return None
+
+            self._last_camera[camera_id] = now
+            self._last_hash[camera_id] = frame_hash
+            for track_id in fresh:
+                self._last_track[(camera_id, track_id)] = now
+            self._prune(now)
+
+        self._ensure_started()
+        return path
+
+    def path_for(self, camera_id):
+        """Nombre único por cámara con resolución de microsegundos"""
+        stamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        camera = re.sub(r'[^A-Za-z0-9_-]+', '_', str(camera_id))
+        return os.path.join(self.directory, f"alerta_{camera}_{stamp}.jpg")
+
+    def _prune(self, now):
+        """Olvida tracks viejos para que el diccionario no crezca sin límite"""
+        if len(self._last_track) > 1024:
+            self._last_track = {key: seen for key, seen in self._last_track.items()
+                                if now - seen < self.track_interval}
+
+    def _run(self):
+        params = [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality]
+        while True:
+            entry = self._queue.get()
+            if entry is _STOP:
+                break
+            path, frame = entry
+            try:
+                if cv2.imwrite(path, frame, params):
+                    self.stats['written'] += 1
+                else:
+                    self.stats['failed'] += 1
+            except Exception as e:
+                self.stats['failed'] += 1
+                print(f"Error guardando evidencia {path}: {str(e)}")
+
+    def close(self):
+        """Escribe lo pendiente y detiene el hilo"""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join()
+            self._thread = None
@@ -0,0 +1,530 @@
+"""
+Inference Server - Servidor local de inferencia compartido por los workers
+Un solo proceso (python manage.py run_inference_server) carga YOLO pose y el
+detector de comportamiento; los workers web le envían frames y reciben
+keypoints o etiquetas, así la memoria de los modelos no crece con el número
+de workers y los frames de todos los visores se agrupan en los mismos lotes.
+
+Protocolo (multiprocessing.connection con authkey, sin pickle: cada mensaje
+es una cabecera JSON enviada con send_bytes, seguida de bytes crudos cuando
+lleva un arreglo):
+  - cada cliente crea un segmento de memoria compartida con `slots` huecos de
+    `slot_bytes` y lo anuncia con {'op': 'hello', 'shm', 'slots', 'slot_bytes'}
+  - petición: {'op', 'id', 'slot', 'shape', 'dtype', 'camera'}; el frame está
+    en el hueco `slot`, o (slot = None, no cabe en un hueco) en el mensaje siguiente
+  - respuesta: {'id', 'ok', 'value' | 'array' | 'error'}, en el orden en que
+    terminan; con 'array' (shape, dtype) los bytes van en el mensaje siguiente.
+    El hueco se reutiliza al llegar la respuesta
+"""
+
+import hashlib
+import hmac
+import itertools
+import json
+import os
+import queue
+import socket
+import stat
+import tempfile
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Listener
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+from django.conf import settings
+
+
+POSE = 'pose'
+BEHAVIOR = 'behavior'
+
+# Socket Unix por defecto del comando (permisos 0600: solo el mismo usuario)
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), 'monitoreo-inferencia.sock')
+
+# Tipos de arreglo aceptados y tamaños máximos de cabecera y de frame en línea
+ALLOWED_DTYPES = {'|u1', '<f4', '<f8'}
+MAX_HEADER_BYTES = 64 * 1024
+MAX_INLINE_BYTES = 64 * 1024 * 1024
+
+
+def server_address():
+    """Dirección configurada en INFERENCE_SERVER_ADDRESS, o None si no se usa servidor"""
+    address = getattr(settings, 'INFERENCE_SERVER_ADDRESS', None)
+    if isinstance(address, list):
+        address = tuple(address)
+    return address
+
+
+def parse_address(text):
+    """'host:puerto' -> (host, puerto); cualquier otro texto es un socket Unix"""
+    host, sep, port = text.rpartition(':')
+    if sep and port.isdigit():
+        return (host or '127.0.0.1', int(port))
+    return text
+
+
+def is_loopback(address):
+    """True para sockets Unix y direcciones TCP que solo escuchan en la máquina local"""
+    if isinstance(address, str):
+        return True
+    return address[0] in ('127.0.0.1', 'localhost', '::1')
+
+
+def _explicit_authkey():
+    return os.environ.get('INFERENCE_SERVER_AUTHKEY') or getattr(settings, 'INFERENCE_SERVER_AUTHKEY', None)
+
+
+def server_authkey():
+    """
+    Clave del handshake: INFERENCE_SERVER_AUTHKEY (variable de entorno o
+    settings) o, si no está definida, una derivada de SECRET_KEY con HMAC
+    """
+    authkey = _explicit_authkey()
+    if authkey:
+        return authkey.encode() if isinstance(authkey, str) else authkey
+    return hmac.new(settings.SECRET_KEY.encode(), b'monitoreo-inferencia', hashlib.sha256).digest()
+
+
+def insecure_authkey():
+    """
+    True si la clave es pública: una INFERENCE_SERVER_AUTHKEY corta o la
+    derivada de la SECRET_KEY de desarrollo publicada en el repositorio
+    """
+    authkey = _explicit_authkey()
+    if authkey:
+        return len(authkey) < 16
+    return settings.SECRET_KEY.startswith('django-insecure-')
+
+
+def _shutdown(conn):
+    """
+    Corta la conexión aunque otro hilo esté bloqueado en recv (close solo no
+    envía el fin de conexión mientras el descriptor sigue en uso)
+    """
+    try:
+        with socket.fromfd(conn.fileno(), socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+    conn.close()
+
+
+def _attach(name):
+    """Abre el segmento de un cliente sin que este proceso lo borre al salir"""
+    shm = SharedMemory(name=name)
+    # El dueño del segmento es el cliente (Python < 3.13 no tiene track=False)
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _send(conn, header, payload=None):
+    """Cabecera JSON y, si hay, los bytes crudos del arreglo (el llamador sostiene el lock)"""
+    conn.send_bytes(json.dumps(header, default=lambda value: value.item()).encode())
+    if payload is not None:
+        conn.send_bytes(payload)
+
+
+def _raw(array):
+    """Bytes del arreglo sin copiarlo (vista plana, como la espera send_bytes)"""
+    return memoryview(np.ascontiguousarray(array)).cast('B')
+
+
+def _recv(conn):
+    return json.loads(conn.recv_bytes(MAX_HEADER_BYTES))
+
+
+def _array_spec(shape, dtype):
+    """Valida shape y dtype recibidos; retorna (shape, dtype, nbytes)"""
+    if dtype not in ALLOWED_DTYPES:
+        raise ValueError(f"Tipo de arreglo no soportado: {dtype}")
+    shape = tuple(int(n) for n in shape)
+    if len(shape) > 4 or any(n < 0 for n in shape):
+        raise ValueError(f"Forma de arreglo inválida: {shape}")
+    dtype = np.dtype(dtype)
+    return shape, dtype, int(np.prod(shape, dtype=np.int64)) * dtype.itemsize
+
+
+def _array_from_bytes(payload, shape, dtype):
+    shape, dtype, nbytes = _array_spec(shape, dtype)
+    if len(payload) != nbytes:
+        raise ValueError(f"Se esperaban {nbytes} bytes y llegaron {len(payload)}")
+    return np.frombuffer(payload, dtype=dtype).reshape(shape)
+
+
+class InferenceClient:
+    """
+    Conexión de un worker web con el servidor de inferencia, compartida por
+    todos sus hilos. submit_pose y submit_behavior retornan Futures, igual
+    que los MicroBatcher locales. Si la conexión se cae, las peticiones en
+    curso fallan con ConnectionError y la siguiente reconecta. Si ningún
+    hueco se libera en slot_timeout segundos el servidor se da por trabado:
+    se corta la conexión (fallan las pendientes) y se lanza TimeoutError.
+    """
+
+    def __init__(self, address, authkey, slots=8, slot_bytes=1920 * 1080 * 3, retry_interval=5.0,
+                 slot_timeout=2.0):
+        self.address = address
+        self.authkey = authkey
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self.retry_interval = retry_interval
+        self.slot_timeout = slot_timeout
+        self._failed_at = None
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._conn = None
+        self._shm = None
+        self._free = None
+        self._pending = {}
+        self._ids = itertools.count()
+
+    def connect(self):
+        """Conecta (si hace falta) y retorna la conexión"""
+        with self._lock:
+            if self._conn is not None:
+                return self._conn
+            conn = Client(self.address, authkey=self.authkey)
+            if self._shm is None:
+                self._shm = SharedMemory(create=True, size=self.slots * self.slot_bytes)
+                self._free = queue.Queue()
+                for slot in range(self.slots):
+                    self._free.put(slot)
+            _send(conn, {'op': 'hello', 'shm': self._shm.name, 'slots': self.slots,
+                         'slot_bytes': self.slot_bytes})
+            self._conn = conn
+            threading.Thread(target=self._read, args=(conn,), name='inference-client', daemon=True).start()
+            return conn
+
+    def available(self):
+        """
+        True si hay conexión con el servidor. Tras un intento fallido no se
+        vuelve a intentar hasta pasados retry_interval segundos.
+        """
+        if self._conn is not None:
+            return True
+        if self._failed_at is not None and time.monotonic() - self._failed_at < self.retry_interval:
+            return False
+        try:
+            self.connect()
+            self._failed_at = None
+            return True
+        except OSError as e:
+            self._failed_at = time.monotonic()
+            print(f"Servidor de inferencia no disponible en {self.address}: {str(e)}")
+            return False
+
+    def _frame_slot(self, conn, frame):
+        """Copia el frame a un hueco libre y retorna su índice; None si no cabe en un hueco"""
+        if frame.nbytes > self.slot_bytes:
+            return None
+        # Espera un hueco libre: como mucho `slots` frames en vuelo por proceso
+        try:
+            slot = self._free.get(timeout=self.slot_timeout)
+        except queue.Empty:
+            self._failed_at = time.monotonic()
+            self._disconnect(conn, f"sin respuesta en {self.slot_timeout} s")
+            raise TimeoutError(f"Servidor de inferencia sin respuesta en {self.slot_timeout} s")
+        start = slot * self.slot_bytes
+        view = np.ndarray(frame.shape, dtype=frame.dtype, buffer=self._shm.buf, offset=start)
+        np.copyto(view, frame)
+        return slot
+
+    def _submit(self, operation, frame, camera_id=None):
+        if not self.available():
+            raise ConnectionError(f"Servidor de inferencia no disponible en {self.address}")
+        conn = self.connect()
+        frame = np.ascontiguousarray(frame)
+        slot = self._frame_slot(conn, frame)
+        future = Future()
+        request_id = next(self._ids)
+        self._pending[request_id] = (future, slot)
+        header = {'op': operation, 'id': request_id, 'slot': slot, 'shape': frame.shape,
+                  'dtype': frame.dtype.str, 'camera': camera_id}
+        try:
+            with self._send_lock:
+                _send(conn, header, _raw(frame) if slot is None else None)
+        except OSError as e:
+            self._disconnect(conn, e)
+            if self._pending.pop(request_id, None) is not None:
+                if slot is not None:
+                    self._free.put(slot)
+                future.set_exception(ConnectionError(f"Servidor de inferencia desconectado: {e}"))
+        return future
+
+    def submit_pose(self, frame):
+        """Future con los keypoints (personas, 17, 2) del frame o None"""
+        return self._submit(POSE, frame)
+
+    def submit_behavior(self, frame, camera_id):
+        """Future con (behavior, confidence) del frame en la ventana de camera_id"""
+        return self._submit(BEHAVIOR, frame, camera_id)
+
+    def _read(self, conn):
+        try:
+            while True:
+                header = _recv(conn)
+                if 'array' in header:
+                    spec = header['array']
+                    result = _array_from_bytes(conn.recv_bytes(MAX_INLINE_BYTES), spec['shape'], spec['dtype'])
+                else:
+                    result = header.get('value')
+                    # JSON convierte las tuplas (behavior, confidence) en listas
+                    result = tuple(result) if isinstance(result, list) else result
+
+                entry = self._pending.pop(header['id'], None)
+                if entry is None:
+                    continue
+                future, slot = entry
+                if slot is not None:
+                    self._free.put(slot)
+                if header['ok']:
+                    future.set_result(result)
+                else:
+                    future.set_exception(RuntimeError(header['error']))
+        except (EOFError, OSError, ValueError) as e:
+            self._disconnect(conn, e)
+
+    def _disconnect(self, conn, error):
+        with self._lock:
+            if self._conn is not conn:
+                return
+            self._conn = None
+            pending, self._pending = self._pending, {}
+        _shutdown(conn)
+        for future, slot in pending.values():
+            # Los huecos vuelven a estar libres: el servidor ya no los lee
+            if slot is not None:
+                self._free.put(slot)
+            if not future.done():
+                future.set_exception(ConnectionError(f"Servidor de inferencia desconectado: {error}"))
+
+    def close(self):
+        with self._lock:
+            conn = self._conn
+        if conn is not None:
+            self._disconnect(conn, 'cliente cerrado')
+        if self._shm is not None:
+            self._shm.close()
+            self._shm.unlink()
+            self._shm = None
+
+
+class InferenceServer:
+    """
+    Atiende a los workers web. Cada conexión tiene un hilo que lee peticiones
+    y las envía a los micro-batchers del proceso (pose y comportamiento), que
+    juntan frames de todos los clientes en una sola llamada al modelo, y otro
+    que escribe las respuestas: el hilo de un batcher solo las encola, así un
+    cliente lento (o con el socket lleno) no frena la inferencia de los demás.
+    Las ventanas de comportamiento son por conexión; al cerrarse una conexión
+    se llama behavior_release(camera_keys) para descartarlas.
+    """
+
+    def __init__(self, address, authkey, pose_submit=None, behavior_submit=None, behavior_release=None):
+        self.address = address
+        self.authkey = authkey
+        self.pose_submit = pose_submit
+        self.behavior_submit = behavior_submit
+        self.behavior_release = behavior_release
+        self._listener = None
+        self._closing = False
+        self._clients = itertools.count(1)
+        self.stats = {'connections': 0, 'active': 0, POSE: 0, BEHAVIOR: 0, 'errors': 0}
+
+    def _listen(self):
+        """Listener; un socket Unix se crea con permisos 0600 (solo el mismo usuario)"""
+        if not isinstance(self.address, str):
+            return Listener(self.address, authkey=self.authkey)
+        if os.path.exists(self.address) and stat.S_ISSOCK(os.stat(self.address).st_mode):
+            # Socket de un servidor anterior que terminó sin borrarlo
+            try:
+                with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+                    probe.connect(self.address)
+                raise OSError(f"Ya hay un servidor de inferencia escuchando en {self.address}")
+            except ConnectionRefusedError:
+                os.unlink(self.address)
+        previous = os.umask(0o177)
+        try:
+            listener = Listener(self.address, authkey=self.authkey)
+        finally:
+            os.umask(previous)
+        os.chmod(self.address, 0o600)
+        return listener
+
+    def serve_forever(self):
+        self._listener = self._listen()
+        try:
+            while not self._closing:
+                try:
+                    conn = self._listener.accept()
+                except (OSError, EOFError, AuthenticationError):
+                    # Handshake fallido (authkey) o la conexión de close()
+                    continue
+                if self._closing:
+                    conn.close()
+                    break
+                client_id = next(self._clients)
+                self.stats['connections'] += 1
+                threading.Thread(target=self._handle, args=(conn, client_id),
+                                 name=f'inference-client-{client_id}', daemon=True).start()
+        finally:
+            listener, self._listener = self._listener, None
+            listener.close()
+
+    def close(self):
+        """Detiene serve_forever desde otro hilo despertando el accept pendiente"""
+        self._closing = True
+        if self._listener is None:
+            return
+        family = socket.AF_UNIX if isinstance(self.address, str) else socket.AF_INET
+        try:
+            with socket.socket(family, socket.SOCK_STREAM) as wake:
+                wake.connect(self.address)
+        except OSError:
+            pass
+
+    def _handle(self, conn, client_id):
+        outbox = queue.Queue()
+        shm = None
+        camera_keys = set()
+        self.stats['active'] += 1
+
+        def reply(request_id, future):
+            payload = None
+            try:
+                result = future.result()
+                if isinstance(result, np.ndarray):
+                    result = np.ascontiguousarray(result)
+                    header = {'id': request_id, 'ok': True,
+                              'array': {'shape': result.shape, 'dtype': result.dtype.str}}
+                    payload = _raw(result)
+                else:
+                    header = {'id': request_id, 'ok': True, 'value': result}
+            except Exception as e:
+                self.stats['errors'] += 1
+                header = {'id': request_id, 'ok': False, 'error': str(e)}
+            outbox.put((header, payload))
+
+        def write_replies():
+            connected = True
+            while True:
+                message = outbox.get()
+                if message is None:
+                    break
+                if not connected:
+                    continue
+                try:
+                    _send(conn, *message)
+                except OSError:
+                    # Cliente caído: se siguen sacando respuestas sin enviarlas
+                    connected = False
+
+        writer = threading.Thread(target=write_replies, name=f'inference-writer-{client_id}', daemon=True)
+        writer.start()
+
+        def read_frame(request):
+            if request['slot'] is None:
+                return _array_from_bytes(conn.recv_bytes(MAX_INLINE_BYTES), request['shape'], request['dtype'])
+            slot = int(request['slot'])
+            shape, dtype, nbytes = _array_spec(request['shape'], request['dtype'])
+            if not 0 <= slot < slots or nbytes > slot_bytes:
+                raise ValueError(f"Hueco fuera del segmento: {slot}")
+            # Copia propia: el hueco se reutiliza en cuanto llega la respuesta
+            return np.ndarray(shape, dtype=dtype, buffer=shm.buf, offset=slot * slot_bytes).copy()
+
+        try:
+            hello = _recv(conn)
+            slots, slot_bytes = int(hello['slots']), int(hello['slot_bytes'])
+            shm = _attach(str(hello['shm']))
+            if shm.size < slots * slot_bytes:
+                raise ValueError("Segmento de memoria compartida más chico que lo anunciado")
+            while True:
+                request = _recv(conn)
+                operation = request['op']
+                frame = read_frame(request)
+
+                if operation == POSE:
+                    future = self.pose_submit(frame)
+                elif operation == BEHAVIOR:
+                    # Ventanas por cliente: dos workers con la misma cámara no se mezclan
+                    camera_key = f"{client_id}:{request['camera']}"
+                    camera_keys.add(camera_key)
+                    future = self.behavior_submit(frame, camera_key)
+                else:
+                    future = Future()
+                    future.set_exception(ValueError(f"Operación no soportada: {operation}"))
+                self.stats[operation] = self.stats.get(operation, 0) + 1
+                future.add_done_callback(lambda f, request_id=request['id']: reply(request_id, f))
+        except (EOFError, OSError, ValueError, KeyError, TypeError) as e:
+            if not isinstance(e, EOFError):
+                print(f"Cliente de inferencia {client_id} desconectado: {str(e)}")
+        finally:
+            self.stats['active'] -= 1
+            outbox.put(None)
+            writer.join(timeout=1.0)
+            conn.close()
+            if shm is not None:
+                shm.close()
+            # Cada reconexión usa un client_id nuevo: sin esto las ventanas se acumulan
+            if camera_keys and self.behavior_release is not None:
+                self.behavior_release(camera_keys)
+
+
+def _chain(source, target):
+    """Copia el resultado (o la excepción) de un Future a otro"""
+    try:
+        target.set_result(source.result())
+    except Exception as e:
+        target.set_exception(e)
+
+
+def submit_with_fallback(remote, local):
+    """
+    submit(*args) -> Future que usa remote (el servidor) y, si no hay hueco
+    a tiempo o la conexión se cae con la petición en curso, la reenvía a local
+    (el MicroBatcher del proceso); un stream en vivo no se corta por eso
+    """
+    def submit(*args):
+        try:
+            remote_future = remote(*args)
+        except OSError:
+            return local(*args)
+
+        future = Future()
+
+        def done(remote_done):
+            try:
+                future.set_result(remote_done.result())
+            except OSError:
+                local(*args).add_done_callback(lambda local_done: _chain(local_done, future))
+            except Exception as e:
+                future.set_exception(e)
+
+        remote_future.add_done_callback(done)
+        return future
+
+    return submit
+
+
+def build_client():
+    """Cliente del proceso según la configuración (ver resource_registry)"""
+    return InferenceClient(
+        server_address(),
+        server_authkey(),
+        slots=getattr(settings, 'INFERENCE_SHM_SLOTS', 8),
+        slot_bytes=getattr(settings, 'INFERENCE_SHM_SLOT_BYTES', 1920 * 1080 * 3)
+    )
+
+
+def remote_client():
+    """
+    Cliente conectado si INFERENCE_SERVER_ADDRESS está configurado y el
+    servidor responde; None para inferir dentro del proceso
+    """
+    if server_address() is None:
+        return None
+    from .resource_registry import resources
+    client = resources.get('inference_client')
+    return client if client.available() else None
@@ -0,0 +1,401 @@
+"""
+Job Service - Cola local de trabajos en segundo plano
+Los trabajos pesados (entrenamiento, búsqueda, análisis de videos) se guardan
+en la tabla BackgroundJob y los ejecuta un pool de hilos fuera de la petición
+HTTP, normalmente en otro proceso (python manage.py run_jobs). No necesita
+broker externo: la base de datos es la cola, un UPDATE condicional reparte
+cada trabajo a un solo worker y una restricción única parcial admite un solo
+trabajo pendiente o en ejecución por grupo exclusivo, aunque los encolen o
+tomen procesos distintos.
+"""
+
+import os
+import socket
+import threading
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from ..models import BackgroundJob, TrainingVideo
+
+
+class JobCancelled(Exception):
+    """El trabajo se canceló mientras se ejecutaba"""
+
+
+# kind -> (handler, grupo exclusivo o None)
+JOB_HANDLERS = {}
+
+
+def job_handler(kind, group=None):
+    """
+    Registra la función que ejecuta un tipo de trabajo:
+    handler(params, context) -> dict serializable con el resultado.
+    Los trabajos del mismo grupo no se ejecutan en paralelo.
+    """
+    def register(fn):
+        JOB_HANDLERS[kind] = (fn, group)
+        return fn
+    return register
+
+
+class JobContext:
+    """Lo que un handler ve de su trabajo: progreso y cancelación"""
+
+    def __init__(self, job_id, report_interval=0.5, owner=None):
+        self.job_id = job_id
+        self.report_interval = report_interval
+        # Filtro que identifica la toma actual del trabajo (ver JobService.owner)
+        self.owner = owner or {}
+        self.progress = {}
+        self._reported_at = 0.0
+        self._cancelled = False
+
+    def is_cancelled(self):
+        return self._cancelled
+
+    def check_cancelled(self):
+        if self._cancelled:
+            raise JobCancelled()
+
+    def report(self, force=False, **progress):
+        """
+        Actualiza el progreso del trabajo. Se escribe en la base a lo sumo
+        cada report_interval segundos, salvo con force=True o al cambiar de
+        fase; en cada escritura se revisa si se pidió cancelar. Si el trabajo
+        ya no es de esta toma (se reencoló y lo tomó otro worker) el handler
+        se detiene igual que al cancelarlo.
+        """
+        force = force or progress.get('phase', self.progress.get('phase')) != self.progress.get('phase')
+        self.progress.update(progress)
+        now = time.monotonic()
+        if force or now - self._reported_at >= self.report_interval:
+            self._reported_at = now
+            owned = BackgroundJob.objects.filter(id=self.job_id, **self.owner).update(progress=self.progress)
+            self._cancelled = not owned or BackgroundJob.objects.filter(
+                id=self.job_id, cancel_requested=True
+            ).exists()
+        self.check_cancelled()
+
+
+class JobService:
+    """Alta, consulta, cancelación y ejecución de trabajos"""
+
+    def __init__(self):
+        self.worker_name = f"{socket.gethostname()}:{os.getpid()}"
+        self._wakeup = threading.Event()
+        self._embedded_pool = None
+
+    # ------------------------------------------------------------------
+    # API para las vistas
+    # ------------------------------------------------------------------
+
+    def find_active(self, group):
+        """Trabajo pendiente o en ejecución del grupo exclusivo, o None"""
+        return BackgroundJob.objects.filter(
+            exclusive_group=group, status__in=('pending', 'running')
+        ).order_by('created_at').first()
+
+    def submit(self, kind, params=None, priority=0, user=None):
+        """
+        Encola un trabajo y retorna el BackgroundJob. Si ya hay uno pendiente
+        o en ejecución del mismo grupo exclusivo (entrenamiento, búsqueda),
+        con cualquier tipo y parámetros, retorna ese con job.duplicate = True
+        en vez de encolar otro. La restricción one_active_job_per_group hace
+        que dos peticiones simultáneas no puedan encolar ambas.
+        """
+        if kind not in JOB_HANDLERS:
+            raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+        group = JOB_HANDLERS[kind][1] or ''
+
+        for _ in range(3):
+            if group:
+                existing = self.find_active(group)
+                if existing is not None:
+                    existing.duplicate = True
+                    return existing
+            try:
+                with transaction.atomic():
+                    job = BackgroundJob.objects.create(
+                        kind=kind,
+                        exclusive_group=group,
+                        params=params or {},
+                        priority=priority,
+                        created_by=user if user is not None and user.is_authenticated else None
+                    )
+                break
+            except IntegrityError:
+                # Otra petición encoló uno del mismo grupo entre la consulta y el INSERT
+                continue
+        else:
+            raise RuntimeError(f"No se pudo encolar el trabajo {kind}: el grupo {group} cambia continuamente")
+
+        job.duplicate = False
+        self._ensure_embedded_workers()
+        self._wakeup.set()
+        return job
+
+    def cancel(self, job_id):
+        """
+        Cancela un trabajo. Si está pendiente no llega a ejecutarse; si está
+        corriendo, se detiene en su próximo reporte de progreso.
+        Retorna False si ya había terminado.
+        """
+        if BackgroundJob.objects.filter(id=job_id, status='pending').update(
+                status='cancelled', cancel_requested=True, finished_at=timezone.now()):
+            return True
+        return bool(BackgroundJob.objects.filter(id=job_id, status='running').update(
+            cancel_requested=True))
+
+    def iter_events(self, job_id, poll_interval=0.5, keepalive=15.0, max_duration=None):
+        """
+        Genera ('progress', dict) cada vez que cambia el estado o el progreso
+        de un trabajo y ('end', dict) cuando termina. Entre cambios genera
+        ('keepalive', None) cada keepalive segundos. Con max_duration termina
+        sin evento 'end' pasados esos segundos (el cliente vuelve a conectarse).
+        """
+        last = None
+        started = last_sent = time.monotonic()
+        while max_duration is None or time.monotonic() - started < max_duration:
+            close_old_connections()
+            job = BackgroundJob.objects.filter(id=job_id).first()
+            if job is None:
+                yield 'end', {'id': job_id, 'status': 'missing'}
+                return
+
+            data = self.to_dict(job)
+            if data != last:
+                last = data
+                last_sent = time.monotonic()
+                if job.status in ('done', 'failed', 'cancelled'):
+                    yield 'end', self.to_dict(job, include_result=True)
+                    return
+                yield 'progress', data
+            elif time.monotonic() - last_sent >= keepalive:
+                last_sent = time.monotonic()
+                yield 'keepalive', None
+
+            time.sleep(poll_interval)
+
+    def to_dict(self, job, include_result=False):
+        data = {
+            'id': job.id,
+            'kind': job.kind,
+            'status': job.status,
+            'priority': job.priority,
+            'params': job.params,
+            'progress': job.progress,
+            'error': job.error,
+            'cancel_requested': job.cancel_requested,
+            'created_at': job.created_at.isoformat() if job.created_at else None,
+            'started_at': job.started_at.isoformat() if job.started_at else None,
+            'finished_at': job.finished_at.isoformat() if job.finished_at else None,
+        }
+        if include_result:
+            data['result'] = job.result
+        return data
+
+    # ------------------------------------------------------------------
+    # Ejecución
+    # ------------------------------------------------------------------
+
+    def claim(self, worker_name=None):
+        """
+        Toma el siguiente trabajo pendiente (mayor prioridad, más antiguo).
+        Retorna el trabajo o None. Los grupos exclusivos no necesitan revisarse
+        aquí: la restricción one_active_job_per_group ya impide que haya un
+        trabajo pendiente de un grupo mientras otro del mismo grupo corre.
+        """
+        worker_name = worker_name or self.worker_name
+        pending = BackgroundJob.objects.filter(status='pending').order_by('-priority', 'created_at')
+        for job in pending[:50]:
+            if job.kind not in JOB_HANDLERS:
+                continue
+            now = timezone.now()
+            # Solo un worker gana el UPDATE condicional
+            if BackgroundJob.objects.filter(id=job.id, status='pending').update(
+                    status='running', worker=worker_name, started_at=now, heartbeat_at=now):
+                job.refresh_from_db()
+                return job
+        return None
+
+    def owner(self, job):
+        """
+        Filtro de la toma actual de un trabajo: claim fija worker y started_at,
+        y requeue_stale los borra, así que una toma anterior ya no coincide
+        """
+        return {'status': 'running', 'worker': job.worker, 'started_at': job.started_at}
+
+    def run(self, job):
+        """
+        Ejecuta un trabajo ya tomado y guarda su resultado o error. Si mientras
+        corría se reencoló (latido atrasado) y lo tomó otro worker, el
+        resultado de esta toma se descarta en vez de pisar el del otro.
+        """
+        handler, _ = JOB_HANDLERS[job.kind]
+        owner = self.owner(job)
+        context = JobContext(job.id, owner=owner)
+        fields = {}
+        try:
+            context.check_cancelled()
+            result = handler(job.params, context)
+            fields.update(status='done', result=result)
+        except JobCancelled:
+            fields.update(status='cancelled')
+        except Exception as e:
+            traceback.print_exc()
+            fields.update(status='failed', error=str(e))
+        fields['finished_at'] = timezone.now()
+        fields['progress'] = context.progress
+        if not BackgroundJob.objects.filter(id=job.id, **owner).update(**fields):
+            print(f"El trabajo {job.id} ya no pertenece a {job.worker}: se descarta su resultado")
+
+    def heartbeat(self, worker_name=None):
+        """Marca como vivos los trabajos que corre este worker"""
+        BackgroundJob.objects.filter(
+            status='running', worker=worker_name or self.worker_name
+        ).update(heartbeat_at=timezone.now())
+
+    def requeue_stale(self, max_age=None):
+        """
+        Devuelve a la cola los trabajos 'running' sin latido reciente (su
+        worker murió). Retorna cuántos se reencolaron.
+        """
+        if max_age is None:
+            max_age = getattr(settings, 'JOBS_STALE_SECONDS', 120)
+        limit = timezone.now() - timedelta(seconds=max_age)
+        return BackgroundJob.objects.filter(status='running', heartbeat_at__lt=limit).update(
+            status='pending', worker='', started_at=None
+        )
+
+    def start_workers(self, n_workers=1, poll_interval=None):
+        """Inicia un pool de hilos que ejecuta trabajos; retorna el pool"""
+        if poll_interval is None:
+            poll_interval = getattr(settings, 'JOBS_POLL_INTERVAL', 1.0)
+        return JobWorkerPool(self, n_workers, poll_interval).start()
+
+    def _ensure_embedded_workers(self):
+        """Con JOBS_EMBEDDED_WORKERS > 0 el propio proceso web ejecuta trabajos (desarrollo)"""
+        n_workers = getattr(settings, 'JOBS_EMBEDDED_WORKERS', 0)
+        if n_workers and self._embedded_pool is None:
+            self._embedded_pool = self.start_workers(n_workers)
+
+
+class JobWorkerPool:
+    """Hilos que toman y ejecutan trabajos, más un hilo de latidos"""
+
+    def __init__(self, service, n_workers=1, poll_interval=1.0, heartbeat_interval=15.0):
+        self.service = service
+        self.n_workers = n_workers
+        self.poll_interval = poll_interval
+        self.heartbeat_interval = heartbeat_interval
+        self.stale_check_interval = getattr(settings, 'JOBS_STALE_CHECK_INTERVAL', 30.0)
+        self._stop = threading.Event()
+        self._threads = []
+
+    def start(self):
+        for i in range(self.n_workers):
+            thread = threading.Thread(target=self._work, name=f'job-worker-{i}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._beat, name='job-heartbeat', daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        return self
+
+    def _work(self):
+        while not self._stop.is_set():
+            close_old_connections()
+            try:
+                job = self.service.claim()
+            except Exception as e:
+                print(f"Error tomando trabajos: {str(e)}")
+                job = None
+
+            if job is None:
+                self.service._wakeup.wait(self.poll_interval)
+                self.service._wakeup.clear()
+                continue
+
+            self.service.run(job)
+        close_old_connections()
+
+    def _beat(self):
+        """
+        Latidos de los trabajos propios y, cada stale_check_interval segundos,
+        reencolado de los trabajos cuyo worker murió (de este o de otro proceso)
+        """
+        interval = min(self.heartbeat_interval, self.stale_check_interval)
+        last_beat = last_check = float('-inf')
+        while True:
+            now = time.monotonic()
+            try:
+                close_old_connections()
+                if now - last_beat >= self.heartbeat_interval:
+                    last_beat = now
+                    self.service.heartbeat()
+                if now - last_check >= self.stale_check_interval:
+                    last_check = now
+                    requeued = self.service.requeue_stale()
+                    if requeued:
+                        print(f"{requeued} trabajo(s) sin latido devueltos a la cola")
+                        self.service._wakeup.set()
+            except Exception as e:
+                print(f"Error actualizando latido de trabajos: {str(e)}")
+            if self._stop.wait(interval):
+                break
+
+    def stop(self, timeout=None):
+        """Deja de tomar trabajos y espera a que terminen los que están corriendo"""
+        self._stop.set()
+        self.service._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+
+# ----------------------------------------------------------------------
+# Tipos de trabajo
+# ----------------------------------------------------------------------
+
+@job_handler('train', group='training')
+def run_training(params, context):
+    from .detection_service import training_service
+
+    return training_service.train_model(
+        test_size=float(params.get('test_size', 0.2)),
+        incremental=bool(params.get('incremental', False)),
+        progress=context.report,
+        backend=params.get('backend')
+    )
+
+
+@job_handler('search', group='training')
+def run_search(params, context):
+    from .detection_service import training_service
+
+    allowed = ('method', 'n_iter', 'cv', 'top_k', 'latency_budget_ms', 'activate')
+    return training_service.search_models(
+        progress=context.report,
+        **{name: params[name] for name in allowed if name in params}
+    )
+
+
+@job_handler('analyze')
+def run_analysis(params, context):
+    from .detection_service import detection_service
+
+    video = TrainingVideo.objects.get(id=params['video_id'])
+    detections = []
+    for detection in detection_service.iter_analysis(video.video.path):
+        detections.append(detection)
+        context.report(windows=len(detections), time=detection['time'])
+    return detection_service.summarize_detections(detections)
+
+
+# Instancia global
+job_service = JobService()
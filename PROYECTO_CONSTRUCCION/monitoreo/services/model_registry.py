@@ -0,0 +1,111 @@
+"""
+Model Registry - Caché en memoria del modelo activo
+Evita consultar la base de datos en cada frame: la información del
+TrainedModel activo se guarda en el proceso y se invalida con señales de
+Django (mismo proceso) o con un sello de versión en disco (otros procesos)
+"""
+
+import os
+import threading
+import time
+import uuid
+
+from django.conf import settings
+
+
+_MISSING = object()
+
+
+class ActiveModelRegistry:
+    """Información del TrainedModel activo cacheada en el proceso"""
+
+    def __init__(self, stamp_path=None, check_interval=1.0):
+        self._stamp_path = stamp_path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._info = _MISSING
+        self._stamp = None
+        self._checked_at = 0.0
+
+    @property
+    def stamp_path(self):
+        """Archivo cuyo contenido cambia cada vez que cambia el modelo activo"""
+        if self._stamp_path is None:
+            self._stamp_path = getattr(
+                settings, 'MODEL_REGISTRY_STAMP',
+                os.path.join(settings.MEDIA_ROOT, 'trained_models', '.active_model')
+            )
+        return self._stamp_path
+
+    def _read_stamp(self):
+        try:
+            with open(self.stamp_path, 'r', encoding='utf-8') as f:
+                return f.read().strip()
+        except OSError:
+            return None
+
+    def _check_stamp(self):
+        """
+        Revisa el sello como mucho una vez por check_interval segundos; si otro
+        proceso lo cambió, descarta la información local
+        """
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        stamp = self._read_stamp()
+        if stamp != self._stamp:
+            self._stamp = stamp
+            self._info = _MISSING
+
+    def _load(self):
+        from ..models import TrainedModel
+
+        model = TrainedModel.objects.filter(is_active=True).first()
+        if not model:
+            return None
+
+        return {
+            'id': model.id,
+            'name': model.name,
+            'model_file': model.model_file.name,
+            'accuracy': model.accuracy,
+            'precision': model.precision,
+            'recall': model.recall,
+            'f1_score': model.f1_score,
+            'samples': model.training_samples,
+            'created_at': model.created_at,
+            'updated_at': model.updated_at,
+        }
+
+    def get_info(self):
+        """Dict con la información del modelo activo (None si no hay)"""
+        with self._lock:
+            self._check_stamp()
+            if self._info is _MISSING:
+                self._info = self._load()
+            return self._info
+
+    def invalidate(self, broadcast=True):
+        """
+        Descarta la información cacheada. Con broadcast=True escribe un sello
+        nuevo para que los demás procesos también la recarguen.
+        """
+        with self._lock:
+            self._info = _MISSING
+            if not broadcast:
+                return
+            stamp = uuid.uuid4().hex
+            try:
+                os.makedirs(os.path.dirname(self.stamp_path), exist_ok=True)
+                tmp = f"{self.stamp_path}.{os.getpid()}.tmp"
+                with open(tmp, 'w', encoding='utf-8') as f:
+                    f.write(stamp)
+                os.replace(tmp, self.stamp_path)
+                self._stamp = stamp
+            except OSError as e:
+                print(f"No se pudo actualizar el sello del modelo activo: {str(e)}")
+
+
+# Instancia global
+active_model_registry = ActiveModelRegistry()
@@ -0,0 +1,81 @@
+"""
+Model Store - Artefactos versionados de modelos entrenados
+Cada entrenamiento se guarda en MEDIA_ROOT/trained_models como:
+  model_<versión>.joblib         modelo completo (scikit-learn + scaler)
+  model_<versión>.forest.joblib  bosque compilado, cargado con memmap en los workers
+                                 (solo para backends que compilan, como Random Forest)
+"""
+
+import os
+import time
+import uuid
+
+from django.conf import settings
+
+from ..behavior_detector import artifact_version
+
+
+UPLOAD_DIR = 'trained_models'
+FOREST_SUFFIX = '.forest.joblib'
+
+
+class ModelArtifactStore:
+    """Guarda y carga los artefactos de BehaviorDetector bajo MEDIA_ROOT"""
+
+    def __init__(self, root=None):
+        self._root = root
+
+    @property
+    def root(self):
+        if self._root is None:
+            self._root = os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR)
+        return self._root
+
+    def new_version(self):
+        return f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+
+    def path(self, name):
+        """Ruta absoluta de un nombre relativo a MEDIA_ROOT (como TrainedModel.model_file.name)"""
+        return os.path.join(settings.MEDIA_ROOT, name)
+
+    def forest_path(self, name):
+        base, _ = os.path.splitext(self.path(name))
+        return base + FOREST_SUFFIX
+
+    def _write(self, save_fn, filepath):
+        """Escribe en un temporal y lo renombra: nunca queda un artefacto a medias"""
+        tmp = f"{filepath}.{os.getpid()}.tmp"
+        try:
+            save_fn(tmp)
+            os.replace(tmp, filepath)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def save(self, detector):
+        """
+        Guarda el modelo completo y, si existe, su bosque compilado.
+        Retorna el nombre relativo para TrainedModel.model_file.
+        """
+        os.makedirs(self.root, exist_ok=True)
+        name = f"{UPLOAD_DIR}/model_{self.new_version()}.joblib"
+        self._write(detector.save_model, self.path(name))
+        if detector.compiled is not None:
+            self._write(detector.save_compiled, self.forest_path(name))
+        detector.model_version = artifact_version(name)
+        return name
+
+    def load(self, detector, name, mmap_mode='r'):
+        """
+        Carga un artefacto en el detector: el bosque compilado con memmap si
+        existe, si no el modelo completo
+        """
+        forest_path = self.forest_path(name)
+        if os.path.exists(forest_path):
+            detector.load_compiled(forest_path, mmap_mode=mmap_mode)
+        else:
+            detector.load_model(self.path(name))
+
+
+# Instancia global
+model_store = ModelArtifactStore()
@@ -0,0 +1,102 @@
+"""
+Resource Registry - Carga diferida de modelos y servicios pesados
+YOLO, scikit-learn y OpenCV no se importan al arrancar Django: cada recurso
+se registra con un cargador y se construye la primera vez que se usa, o en
+una fase de calentamiento explícita (wsgi.py). Así migraciones, comandos de
+manage.py y el arranque de los workers no pagan la carga de los modelos.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject
+from django.utils.module_loading import import_string
+
+
+class ResourceRegistry:
+    """
+    Recursos construidos una sola vez por proceso.
+
+    loader es una función sin argumentos que construye el recurso, o una
+    ruta 'paquete.modulo.nombre' cuyo objeto se usa tal cual.
+    """
+
+    def __init__(self):
+        self._loaders = {}
+        self._resources = {}
+        self._lock = threading.RLock()
+        self.load_times = {}
+
+    def register(self, name, loader):
+        with self._lock:
+            self._loaders[name] = loader
+            self._resources.pop(name, None)
+
+    def get(self, name):
+        """Retorna el recurso, construyéndolo si es la primera vez"""
+        try:
+            return self._resources[name]
+        except KeyError:
+            pass
+        with self._lock:
+            if name not in self._resources:
+                loader = self._loaders.get(name)
+                if loader is None:
+                    raise KeyError(f"Recurso no registrado: {name}. Disponibles: {', '.join(sorted(self._loaders))}")
+                start = time.perf_counter()
+                self._resources[name] = import_string(loader) if isinstance(loader, str) else loader()
+                self.load_times[name] = time.perf_counter() - start
+            return self._resources[name]
+
+    def proxy(self, name):
+        """Objeto que se comporta como el recurso y lo construye en el primer acceso"""
+        return SimpleLazyObject(lambda: self.get(name))
+
+    def is_loaded(self, name):
+        return name in self._resources
+
+    def warm_up(self, names=None):
+        """
+        Construye los recursos indicados (todos si names es None) antes de
+        recibir tráfico. Retorna {nombre: segundos}; los que fallan se informan
+        y quedan para el primer uso.
+        """
+        names = list(self._loaders) if names is None else list(names)
+        timings = {}
+        for name in names:
+            try:
+                self.get(name)
+                timings[name] = self.load_times.get(name, 0.0)
+            except Exception as e:
+                print(f"Error cargando el recurso {name}: {str(e)}")
+        return timings
+
+
+# Recursos que, con INFERENCE_SERVER_ADDRESS, se cargan en el servidor de inferencia
+SERVER_RESOURCES = ('detection_service', 'pose_model')
+
+
+def startup_resources():
+    """
+    Recursos que wsgi.py/asgi.py cargan al arrancar: WARMUP_RESOURCES sin los
+    modelos que ya sirve el servidor de inferencia, si hay uno configurado
+    (los workers web no cargan scikit-learn ni YOLO; solo el cliente)
+    """
+    names = list(getattr(settings, 'WARMUP_RESOURCES', ['detection_service']))
+    if getattr(settings, 'INFERENCE_SERVER_ADDRESS', None) is None:
+        return names
+    return [name for name in names if name not in SERVER_RESOURCES] + ['inference_client']
+
+
+# Instancia global
+resources = ResourceRegistry()
+
+resources.register('detection_service', 'monitoreo.services.detection_service.detection_service')
+resources.register('training_service', 'monitoreo.services.detection_service.training_service')
+resources.register('pose_model', lambda: import_string('monitoreo.entrenamiento.cargar_modelo_pose')())
+resources.register('camera_manager', lambda: import_string('monitoreo.services.video_service.CameraManager')())
+resources.register('video_generator', lambda: import_string('monitoreo.services.video_service.VideoStreamGenerator')(
+    resources.get('camera_manager')
+))
+resources.register('inference_client', lambda: import_string('monitoreo.services.inference_server.build_client')())
@@ -0,0 +1,16 @@
+"""
+Señales - Invalidación de cachés cuando cambian los modelos entrenados
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import TrainedModel
+from .services.model_registry import active_model_registry
+
+
+@receiver(post_save, sender=TrainedModel)
+@receiver(post_delete, sender=TrainedModel)
+def invalidate_active_model(sender, **kwargs):
+    """Cualquier alta, cambio o baja de un TrainedModel invalida el registro"""
+    active_model_registry.invalidate()
@@ -0,0 +1,161 @@
+"""
+Estado incremental de características por cámara
+Mantiene una ventana deslizante de los últimos N frames con sumas y máximos
+acumulados, actualizados en O(1) por frame, y produce el mismo vector de 80
+características que extract_features calcula para esa misma ventana
+"""
+
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+from .feature_extractor import (
+    FRAME_HEIGHT, FRAME_WIDTH, HIST_BINS, build_feature_vector, frame_stats, to_gray
+)
+
+
+class SlidingMax:
+    """Máximo de una ventana deslizante con una deque monótona (O(1) amortizado)"""
+
+    def __init__(self):
+        self._items = deque()
+
+    def push(self, index, value):
+        while self._items and self._items[-1][1] <= value:
+            self._items.pop()
+        self._items.append((index, value))
+
+    def expire(self, first_index):
+        """Descarta los valores con índice < first_index"""
+        while self._items and self._items[0][0] < first_index:
+            self._items.popleft()
+
+    def value(self, default=0):
+        return self._items[0][1] if self._items else default
+
+    def clear(self):
+        self._items.clear()
+
+
+class StreamingFeatureState:
+    """
+    Ventana deslizante de estadísticas por frame de una cámara.
+
+    update(frame) incorpora un frame y retorna el vector de la ventana con
+    los últimos `window` frames; coincide con extract_features(max_frames=window)
+    aplicado a esos mismos frames (salvo redondeo de punto flotante).
+    """
+
+    def __init__(self, window=30):
+        self.window = window
+        self.pixels = float(FRAME_WIDTH * FRAME_HEIGHT)
+        self.lock = threading.Lock()
+        # time.monotonic() del último uso (para descartar ventanas inactivas)
+        self.last_used = time.monotonic()
+
+        self._hist = np.zeros((window, HIST_BINS))
+        self._edges = np.zeros(window)
+        self._means = np.zeros(window)
+        self._stds = np.zeros(window)
+        self._moved = np.zeros(window, dtype=np.int64)
+
+        # Dos buffers que se alternan: evita copiar el frame previo
+        self._gray = np.empty((2, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)
+        self._edges_max = SlidingMax()
+        self._motion_max = SlidingMax()
+        self.reset()
+
+    def reset(self):
+        self.count = 0
+        self._hist_sum = np.zeros(HIST_BINS)
+        self._edge_sum = 0.0
+        self._mean_sum = 0.0
+        self._std_sum = 0.0
+        self._moved_sum = 0
+        self._edges_max.clear()
+        self._motion_max.clear()
+
+    @property
+    def n_frames(self):
+        """Frames dentro de la ventana actual"""
+        return min(self.count, self.window)
+
+    def update(self, frame):
+        """Agrega un frame (BGR o gris, cualquier tamaño) y retorna el vector actual"""
+        with self.lock:
+            k = self.count
+            w = self.window
+            slot = k % w
+
+            gray = to_gray(frame, out=self._gray[k % 2])
+            prev_gray = self._gray[(k - 1) % 2] if k > 0 else None
+            hist, moved, edge, mean, std = frame_stats(gray, prev_gray)
+
+            # Sale de la ventana el frame k - w y la diferencia del frame k - w + 1
+            if k >= w:
+                self._hist_sum -= self._hist[slot]
+                self._edge_sum -= self._edges[slot]
+                self._mean_sum -= self._means[slot]
+                self._std_sum -= self._stds[slot]
+                self._moved_sum -= self._moved[(k + 1) % w]
+
+            self._hist[slot] = hist
+            self._edges[slot] = edge
+            self._means[slot] = mean
+            self._stds[slot] = std
+            self._moved[slot] = moved or 0
+
+            self._hist_sum += hist
+            self._edge_sum += edge
+            self._mean_sum += mean
+            self._std_sum += std
+            self._moved_sum += self._moved[slot]
+
+            self.count = k + 1
+            n = self.n_frames
+            first = k - n + 1
+
+            self._edges_max.push(k, edge)
+            self._edges_max.expire(first)
+            if moved is not None:
+                self._motion_max.push(k, moved)
+            self._motion_max.expire(first + 1)
+
+            # Resincronizar las sumas una vez por ventana acota el error acumulado
+            if slot == w - 1:
+                self._resync()
+
+            return self._vector()
+
+    def features(self):
+        """Vector de la ventana actual sin agregar frames (None si está vacía)"""
+        with self.lock:
+            if self.count == 0:
+                return None
+            return self._vector()
+
+    def _resync(self):
+        self._hist_sum = self._hist.sum(axis=0)
+        self._edge_sum = float(self._edges.sum())
+        self._mean_sum = float(self._means.sum())
+        self._std_sum = float(self._stds.sum())
+        # Con la ventana llena, la diferencia del primer frame no cuenta
+        first_slot = self.count % self.window
+        self._moved_sum = int(self._moved.sum() - self._moved[first_slot])
+
+    def _vector(self):
+        n = self.n_frames
+        diffs = n - 1
+        return build_feature_vector(
+            self._hist_sum / n,
+            self._moved_sum / self.pixels / diffs if diffs else 0,
+            self._motion_max.value() / self.pixels if diffs else 0,
+            self._edge_sum / n,
+            self._edges_max.value(),
+            self._mean_sum / n,
+            self._std_sum / n,
+            n,
+            self.window
+        )
@@ -1,2 +1,819 @@
-from django.test import TestCase
-# Create your tests here.
+import os
+import tempfile
+
+import cv2
+import numpy as np
+from datetime import timedelta
+from unittest import mock
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from django.utils import timezone
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import StandardScaler
+
+from .behavior_detector import BehaviorDetector
+from .feature_cache import FeatureCache
+from .feature_extractor import FRAME_HEIGHT, FRAME_WIDTH, extract_sampled, extract_window, to_gray
+from .forest_compiler import CompiledForest, verify_compiled
+from .model_search import search_models
+from .models import BackgroundJob, TrainedModel, TrainingVideo
+from .frame_sampling import StrideSampling, pair_frames
+from .frame_source import PrefetchFrameSource
+from .frame_store import DecodedFrameStore
+from .pose_gating import HELD, INTERPOLATED, POSE, MotionGate, iter_gated_poses
+from .pose_tracking import PoseTracker
+from .services.batching_service import MicroBatcher
+from .services.evidence_service import EvidenceWriter
+from .services.job_service import JOB_HANDLERS, JobCancelled, JobContext, JobService
+from .services.model_registry import ActiveModelRegistry, active_model_registry
+from .streaming_features import StreamingFeatureState
+
+
+def frames_sinteticos(n, seed=0):
+    """Frames BGR 320x240 con un fondo fijo y un bloque que se desplaza (hay movimiento y bordes)"""
+    rng = np.random.default_rng(seed)
+    fondo = cv2.GaussianBlur(rng.integers(0, 256, (FRAME_HEIGHT, FRAME_WIDTH, 3), dtype=np.uint8), (9, 9), 0)
+    frames = []
+    for i in range(n):
+        frame = fondo.copy()
+        x = (7 * i) % (FRAME_WIDTH - 60)
+        frame[80:140, x:x + 60] = rng.integers(0, 256, 3, dtype=np.uint8)
+        frame[rng.random((FRAME_HEIGHT, FRAME_WIDTH)) < 0.01] = 255
+        frames.append(frame)
+    return frames
+
+
+def extraer_por_frame(frames, max_frames=30):
+    """Extracción original, frame por frame (referencia para la versión vectorizada)"""
+    motion_scores, edge_scores, hists, means, stds = [], [], [], [], []
+    prev_gray = None
+    for frame in frames[:max_frames]:
+        gray = cv2.cvtColor(cv2.resize(frame, (320, 240)), cv2.COLOR_BGR2GRAY)
+
+        hist = cv2.calcHist([gray], [0], None, [16], [0, 256])
+        hists.append(cv2.normalize(hist, hist).flatten())
+
+        if prev_gray is not None:
+            diff = cv2.absdiff(prev_gray, gray)
+            _, thresh = cv2.threshold(diff, 30, 255, cv2.THRESH_BINARY)
+            motion_scores.append(np.sum(thresh) / (320 * 240 * 255))
+
+        sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=5)
+        sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=5)
+        edge_scores.append(np.mean(np.sqrt(sobelx ** 2 + sobely ** 2)) / 255)
+
+        means.append(np.mean(gray) / 255)
+        stds.append(np.std(gray) / 255)
+        prev_gray = gray.copy()
+
+    features = np.concatenate([
+        np.mean(hists, axis=0),
+        [np.mean(motion_scores) if motion_scores else 0, np.max(motion_scores) if motion_scores else 0,
+         np.mean(edge_scores), np.max(edge_scores), np.mean(means), np.mean(stds), len(hists) / max_frames]
+    ])
+    return np.pad(features, (0, 80 - len(features)))
+
+
+def pila_gris(frames):
+    return np.stack([to_gray(frame) for frame in frames])
+
+
+class ExtractWindowTests(SimpleTestCase):
+    """La extracción vectorizada reproduce la extracción original frame por frame"""
+
+    def test_ventana_completa(self):
+        frames = frames_sinteticos(30)
+        np.testing.assert_allclose(extract_window(pila_gris(frames), 30), extraer_por_frame(frames, 30),
+                                   rtol=1e-5, atol=1e-7)
+
+    def test_ventana_incompleta(self):
+        frames = frames_sinteticos(12, seed=1)
+        np.testing.assert_allclose(extract_window(pila_gris(frames), 30), extraer_por_frame(frames, 30),
+                                   rtol=1e-5, atol=1e-7)
+
+    def test_un_solo_frame(self):
+        frames = frames_sinteticos(1, seed=2)
+        np.testing.assert_allclose(extract_window(pila_gris(frames), 30), extraer_por_frame(frames, 30),
+                                   rtol=1e-5, atol=1e-7)
+
+    def test_frames_a_otra_resolucion(self):
+        frames = [cv2.resize(frame, (640, 480)) for frame in frames_sinteticos(10, seed=3)]
+        np.testing.assert_allclose(extract_window(pila_gris(frames), 30), extraer_por_frame(frames, 30),
+                                   rtol=1e-5, atol=1e-7)
+
+    def test_ventana_vacia(self):
+        self.assertIsNone(extract_window(np.empty((0, FRAME_HEIGHT, FRAME_WIDTH), dtype=np.uint8)))
+
+
+class StreamingFeatureStateTests(SimpleTestCase):
+    """La ventana deslizante incremental coincide con recalcular la ventana completa"""
+
+    def test_coincide_con_recalculo(self):
+        window = 8
+        frames = frames_sinteticos(3 * window + 5, seed=4)
+        gray = pila_gris(frames)
+        state = StreamingFeatureState(window=window)
+        for k, frame in enumerate(frames):
+            actual = state.update(frame)
+            expected = extract_window(gray[max(0, k - window + 1):k + 1], window)
+            np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12, err_msg=f"frame {k}")
+
+    def test_features_y_reset(self):
+        state = StreamingFeatureState(window=4)
+        self.assertIsNone(state.features())
+        frames = frames_sinteticos(6, seed=5)
+        for frame in frames:
+            last = state.update(frame)
+        np.testing.assert_array_equal(state.features(), last)
+        self.assertEqual(state.n_frames, 4)
+
+        state.reset()
+        self.assertIsNone(state.features())
+        np.testing.assert_allclose(state.update(frames[0]), extract_window(pila_gris(frames[:1]), 4),
+                                   rtol=1e-9, atol=1e-12)
+
+
+class PairedSamplingTests(SimpleTestCase):
+    """Con muestras no consecutivas el movimiento se mide entre frames consecutivos, como en vivo"""
+
+    def test_pares_con_el_frame_siguiente(self):
+        indices, pairs = pair_frames([0, 5, 9], 10)
+        self.assertEqual(indices, [0, 1, 5, 6, 8, 9])
+        self.assertEqual(pairs, [(0, 1), (5, 6), (9, 8)])
+        self.assertEqual(pair_frames([0], 1), ([0], [(0, None)]))
+
+    def test_movimiento_de_pares_consecutivos(self):
+        gray = pila_gris(frames_sinteticos(40, seed=6))
+        samples = StrideSampling().select(None, len(gray), 8)
+        indices, pairs = pair_frames(samples, len(gray))
+        actual = extract_sampled(gray[indices], indices, pairs, 8)
+
+        # Histograma, bordes e intensidad: solo las muestras
+        expected = extract_window(gray[samples], 8)
+        # Movimiento: el de cada muestra con su frame consecutivo
+        motion = [extract_window(gray[[s, n]], 2)[16] for s, n in pairs]
+        expected[16:18] = np.mean(motion), np.max(motion)
+        np.testing.assert_allclose(actual, expected, rtol=1e-9, atol=1e-12)
+        self.assertLess(actual[16], extract_window(gray[samples], 8)[16])
+
+    def test_video_mas_corto_que_lo_reportado(self):
+        gray = pila_gris(frames_sinteticos(12, seed=7))
+        indices, pairs = pair_frames([0, 10, 20], 30)
+        leidos = [i for i in indices if i < len(gray)]
+        actual = extract_sampled(gray[leidos], indices, pairs, 3)
+        expected = extract_sampled(gray[[0, 1, 10, 11]], [0, 1, 10, 11], [(0, 1), (10, 11)], 3)
+        np.testing.assert_array_equal(actual, expected)
+
+
+def bosque_entrenado(n_samples=300, n_features=80, n_classes=4, seed=0, **params):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(n_samples, n_features))
+    y = (X[:, 0] + 0.5 * X[:, 1] > 0).astype(int) + 2 * (X[:, 2] > 0.5)
+    y = y % n_classes
+    scaler = StandardScaler().fit(X)
+    params = {'n_estimators': 25, 'max_depth': 8, 'random_state': seed, **params}
+    model = RandomForestClassifier(**params).fit(scaler.transform(X), y)
+    return model, scaler, X
+
+
+class CapturaFalsa:
+    """Reemplazo de cv2.VideoCapture que entrega una lista fija de frames"""
+
+    def __init__(self, frames):
+        self.frames = list(frames)
+
+    def read(self, image=None):
+        if not self.frames:
+            return False, None
+        return True, self.frames.pop(0)
+
+    def release(self):
+        self.frames = []
+
+
+class PrefetchFrameSourceTests(SimpleTestCase):
+    def test_cambio_de_resolucion(self):
+        frames = [np.full((4, 6, 3), i, dtype=np.uint8) for i in range(3)]
+        frames += [np.full((8, 10, 3), i, dtype=np.uint8) for i in range(3, 6)]
+        with mock.patch('monitoreo.frame_source.cv2.VideoCapture', CapturaFalsa), \
+                PrefetchFrameSource(frames, queue_size=2) as source:
+            leidos = [(index, frame.shape, int(frame[0, 0, 0])) for index, frame in source]
+        self.assertEqual(leidos, [(i, frame.shape, i) for i, frame in enumerate(frames)])
+
+
+class FeatureCacheTests(SimpleTestCase):
+    """Caché de características: aciertos, invalidación por contenido y varios procesos"""
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.root = os.path.join(tmp.name, 'cache')
+        self.video = self.archivo(tmp.name, 'video.mp4', b'clip original')
+
+    def archivo(self, directorio, nombre, contenido):
+        path = os.path.join(directorio, nombre)
+        with open(path, 'wb') as f:
+            f.write(contenido)
+        return path
+
+    def test_acierto_tras_flush_en_otra_instancia(self):
+        cache = FeatureCache(self.root)
+        self.assertIsNone(cache.get(self.video, max_frames=30))
+        cache.put(self.video, np.arange(80.0), max_frames=30)
+        np.testing.assert_array_equal(cache.get(self.video, max_frames=30), np.arange(80.0))
+        cache.flush()
+
+        otra = FeatureCache(self.root)
+        np.testing.assert_array_equal(otra.get(self.video, max_frames=30), np.arange(80.0))
+        self.assertIsNone(otra.get(self.video, max_frames=60))
+
+    def test_cambio_de_contenido_invalida(self):
+        cache = FeatureCache(self.root)
+        cache.put(self.video, np.ones(80), max_frames=30)
+        cache.flush()
+
+        with open(self.video, 'wb') as f:
+            f.write(b'clip editado, otro contenido')
+        self.assertIsNone(FeatureCache(self.root).get(self.video, max_frames=30))
+
+    def test_flush_de_dos_procesos_no_pierde_filas(self):
+        otro_video = self.archivo(os.path.dirname(self.video), 'otro.mp4', b'otro clip')
+        a, b = FeatureCache(self.root), FeatureCache(self.root)
+        a.put(self.video, np.ones(80), max_frames=30)
+        b.put(otro_video, np.full(80, 2.0), max_frames=30)
+        a.flush()
+        b.flush()
+
+        cache = FeatureCache(self.root)
+        self.assertEqual(len(cache), 2)
+        np.testing.assert_array_equal(cache.get(self.video, max_frames=30), np.ones(80))
+        np.testing.assert_array_equal(cache.get(otro_video, max_frames=30), np.full(80, 2.0))
+
+
+class CompiledForestTests(SimpleTestCase):
+    """El bosque compilado da las mismas probabilidades que scikit-learn"""
+
+    def test_predict_proba_igual_a_sklearn(self):
+        model, scaler, X = bosque_entrenado()
+        compiled = CompiledForest.from_sklearn(model, scaler)
+        X_test = np.random.default_rng(1).normal(size=(200, X.shape[1]))
+        np.testing.assert_allclose(compiled.predict_proba(X_test),
+                                   model.predict_proba(scaler.transform(X_test)), rtol=0, atol=1e-12)
+
+    def test_to_dict_ida_y_vuelta(self):
+        model, scaler, X = bosque_entrenado(seed=2)
+        compiled = CompiledForest.from_sklearn(model, scaler)
+        copia = CompiledForest.from_dict(compiled.to_dict())
+        np.testing.assert_array_equal(copia.predict_proba(X), compiled.predict_proba(X))
+
+    def test_etiquetas_y_confianzas(self):
+        model, scaler, X = bosque_entrenado(seed=3, max_depth=None, min_samples_leaf=3)
+        compiled = CompiledForest.from_sklearn(model, scaler)
+        X_test = np.random.default_rng(4).normal(size=(500, X.shape[1]))
+        expected = model.predict_proba(scaler.transform(X_test))
+        labels, confidences = compiled.predict(X_test)
+        np.testing.assert_array_equal(labels, model.predict(scaler.transform(X_test)))
+        np.testing.assert_allclose(confidences, expected.max(axis=1), rtol=0, atol=1e-12)
+
+        max_diff, labels_match = verify_compiled(compiled, model, scaler, X_test)
+        self.assertLess(max_diff, 1e-12)
+        self.assertTrue(labels_match)
+
+    def test_una_sola_fila(self):
+        model, scaler, X = bosque_entrenado(seed=5)
+        compiled = CompiledForest.from_sklearn(model, scaler)
+        for row in (X[0], X[:1], X[7].tolist()):
+            actual = compiled.predict_proba(row)
+            self.assertEqual(actual.shape, (1, len(model.classes_)))
+            np.testing.assert_allclose(actual, model.predict_proba(scaler.transform(np.atleast_2d(row))),
+                                       rtol=0, atol=1e-12)
+        labels, confidences = compiled.predict(X[3])
+        self.assertEqual(labels.shape, (1,))
+        self.assertEqual(labels[0], model.predict(scaler.transform(X[3:4]))[0])
+
+    def test_valores_en_el_limite_float32(self):
+        """
+        Entradas cuyo valor escalado cae justo en un umbral o a un ulp float32
+        de él: scikit-learn compara en float32, así que la rama elegida depende
+        de ese redondeo y el bosque compilado debe tomar la misma.
+        """
+        model, scaler, X = bosque_entrenado(seed=6)
+        compiled = CompiledForest.from_sklearn(model, scaler)
+        internal = np.flatnonzero(np.isfinite(compiled.threshold))
+        nodes = np.random.default_rng(7).choice(internal, size=min(200, len(internal)), replace=False)
+
+        base = scaler.transform(X[:1])[0]
+        rows = []
+        for node in nodes:
+            feature = compiled.feature[node]
+            threshold = np.float32(compiled.threshold[node])
+            for value in (threshold, np.nextafter(threshold, np.float32(-np.inf)),
+                          np.nextafter(threshold, np.float32(np.inf)), compiled.threshold[node]):
+                row = base.copy()
+                row[feature] = value
+                rows.append(row)
+        X_limite = scaler.inverse_transform(np.array(rows))
+
+        expected = model.predict_proba(scaler.transform(X_limite))
+        np.testing.assert_allclose(compiled.predict_proba(X_limite), expected, rtol=0, atol=1e-12)
+        np.testing.assert_array_equal(compiled.predict(X_limite)[0], model.classes_[expected.argmax(axis=1)])
+
+    def test_sin_scaler(self):
+        model, _, X = bosque_entrenado(seed=8)
+        compiled = CompiledForest.from_sklearn(model)
+        np.testing.assert_allclose(compiled.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+
+class FuturoFalso:
+    """Future que se declara listo recién después de `polls` consultas a done()"""
+
+    def __init__(self, value, polls=0):
+        self.value = value
+        self.polls = polls
+
+    def done(self):
+        if self.polls > 0:
+            self.polls -= 1
+            return False
+        return True
+
+    def result(self):
+        return self.value
+
+
+class CompuertaFalsa:
+    """Compuerta de movimiento con una secuencia fija de frames activos"""
+
+    def __init__(self, activos):
+        self.activos = list(activos)
+
+    def is_active(self, frame):
+        return self.activos[frame]
+
+
+class IterGatedPosesTests(SimpleTestCase):
+    """
+    Los frames son su índice y los keypoints de un frame valen su índice, así
+    que una interpolación lineal correcta reproduce el valor exacto
+    """
+
+    def setUp(self):
+        self.enviados = []
+
+    def submit(self, polls=0):
+        def submit(frame):
+            self.enviados.append(frame)
+            return FuturoFalso(np.full((1, 17, 2), float(frame)), polls=polls)
+        return submit
+
+    def correr(self, n, activos=None, polls=0, **kwargs):
+        gate = None if activos is None else CompuertaFalsa(activos)
+        return list(iter_gated_poses(range(n), self.submit(polls), gate=gate, **kwargs))
+
+    def test_sin_compuerta_infiere_todos_en_orden(self):
+        salida = self.correr(10, polls=2, depth=3)
+        self.assertEqual([frame for frame, _, _ in salida], list(range(10)))
+        self.assertEqual([origen for _, _, origen in salida], [POSE] * 10)
+        self.assertEqual(self.enviados, list(range(10)))
+        for frame, keypoints, _ in salida:
+            self.assertTrue((keypoints == frame).all())
+
+    def test_orden_con_resultados_demorados(self):
+        salida = self.correr(40, activos=[i % 13 < 8 for i in range(40)], polls=3, stride=3, depth=2)
+        self.assertEqual([frame for frame, _, _ in salida], list(range(40)))
+
+    def test_interpolacion_con_stride(self):
+        salida = self.correr(10, activos=[True] * 10, stride=3)
+        origenes = [origen for _, _, origen in salida]
+        self.assertEqual(origenes, [POSE, INTERPOLATED, INTERPOLATED, POSE, INTERPOLATED, INTERPOLATED,
+                                    POSE, INTERPOLATED, INTERPOLATED, POSE])
+        for frame, keypoints, _ in salida:
+            np.testing.assert_allclose(keypoints, frame)
+
+    def test_fin_de_rafaga_promueve_el_ultimo_intermedio(self):
+        activos = [True] * 5 + [False] * 3
+        salida = self.correr(8, activos=activos, stride=3, idle_refresh=30)
+        origenes = [origen for _, _, origen in salida]
+        # El frame 4 iba a interpolarse, pero la ráfaga termina en el 5: se infiere
+        self.assertEqual(origenes, [POSE, INTERPOLATED, INTERPOLATED, POSE, POSE, HELD, HELD, HELD])
+        self.assertEqual(self.enviados, [0, 3, 4])
+        for frame, keypoints, origen in salida:
+            np.testing.assert_allclose(keypoints, frame if origen != HELD else 4)
+
+    def test_rafaga_inconclusa_al_final_del_video(self):
+        salida = self.correr(5, activos=[True] * 5, stride=3)
+        self.assertEqual([origen for _, _, origen in salida], [POSE, INTERPOLATED, INTERPOLATED, POSE, POSE])
+        for frame, keypoints, _ in salida:
+            np.testing.assert_allclose(keypoints, frame)
+
+    def test_primer_frame_con_movimiento_tras_quietud(self):
+        activos = [False, False, True, True, False, True]
+        salida = self.correr(6, activos=activos, stride=5, idle_refresh=30)
+        self.assertEqual([origen for _, _, origen in salida], [POSE, HELD, POSE, POSE, HELD, POSE])
+
+    def test_escena_quieta_refresca_cada_idle_refresh(self):
+        salida = self.correr(10, activos=[False] * 10, idle_refresh=4)
+        self.assertEqual(self.enviados, [0, 4, 8])
+        esperado = [0, 0, 0, 0, 4, 4, 4, 4, 8, 8]
+        for (frame, keypoints, origen), valor in zip(salida, esperado):
+            self.assertEqual(origen, POSE if frame in (0, 4, 8) else HELD)
+            np.testing.assert_allclose(keypoints, valor)
+
+    def test_cambio_de_personas_no_interpola(self):
+        def submit(frame):
+            self.enviados.append(frame)
+            return FuturoFalso(np.full((1 if frame < 3 else 2, 17, 2), float(frame)))
+        salida = list(iter_gated_poses(range(4), submit, gate=CompuertaFalsa([True] * 4), stride=3))
+        # Entre 1 y 2 personas no hay interpolación posible: se mantiene la inferencia anterior
+        for frame, keypoints, origen in salida[1:3]:
+            self.assertEqual(origen, INTERPOLATED)
+            np.testing.assert_allclose(keypoints, 0)
+
+
+class MotionGateTests(SimpleTestCase):
+    def test_umbral_por_metodo(self):
+        rng = np.random.default_rng(1)
+        fijo = frames_sinteticos(1)[0]
+        for method in ('diff', 'flow'):
+            with self.subTest(method=method):
+                # Escena quieta con ruido de sensor: no debe activar la pose
+                gate = MotionGate(method=method)
+                gate.is_active(fijo)
+                for _ in range(3):
+                    ruido = np.clip(fijo + rng.normal(0, 3, fijo.shape), 0, 255).astype(np.uint8)
+                    self.assertFalse(gate.is_active(ruido))
+
+                gate = MotionGate(method=method)
+                activos = [gate.is_active(frame) for frame in frames_sinteticos(5)]
+                self.assertTrue(all(activos[1:]))
+
+
+def persona(x, y, brazos=0.0):
+    """Keypoints (17, 2) de una persona en (x, y); brazos desplaza hombros, codos y muñecas"""
+    keypoints = np.column_stack([x + np.arange(17) * 2.0, y + np.arange(17) * 3.0])
+    keypoints[5:11] += brazos
+    return keypoints
+
+
+class PoseTrackerTests(SimpleTestCase):
+
+    def test_ids_estables_con_detecciones_reordenadas(self):
+        tracker = PoseTracker(max_distance=80)
+        a, b, c = persona(50, 50), persona(300, 60), persona(500, 300)
+        primero = tracker.update([a, b, c])
+        self.assertEqual(primero.track_ids.tolist(), [1, 2, 3])
+        self.assertTrue(np.isnan(primero.body_motion).all())
+
+        segundo = tracker.update([c + 2, a + 1, b - 1])
+        self.assertEqual(segundo.track_ids.tolist(), [3, 1, 2])
+        np.testing.assert_allclose(segundo.body_motion, [2, 1, 1])
+
+    def test_keypoints_no_visibles_no_cuentan(self):
+        tracker = PoseTracker(max_distance=80)
+        tracker.update([persona(50, 50), persona(300, 50)])
+        oculta = persona(301, 52)
+        oculta[:12] = 0
+        self.assertEqual(tracker.update([oculta]).track_ids.tolist(), [2])
+
+    def test_sobrevive_max_missed_frames(self):
+        tracker = PoseTracker(max_missed=3)
+        otra = persona(400, 400)
+        tracker.update([persona(50, 50), otra])
+        for _ in range(3):
+            tracker.update([otra])
+        self.assertEqual(tracker.update([persona(52, 50), otra]).track_ids.tolist(), [1, 2])
+
+        for _ in range(4):
+            tracker.update([otra])
+        self.assertEqual(len(tracker), 1)
+        self.assertEqual(tracker.update([persona(52, 50), otra]).track_ids.tolist(), [3, 2])
+
+    def test_detecciones_lejanas_crean_tracks_nuevos(self):
+        tracker = PoseTracker(max_distance=80)
+        tracker.update([persona(50, 50)])
+        resultado = tracker.update([persona(200, 50)])
+        self.assertEqual(resultado.track_ids.tolist(), [2])
+        self.assertEqual(len(tracker), 2)
+
+    def test_contadores_por_track(self):
+        tracker = PoseTracker(body_threshold=4, arm_threshold=3, confirm_frames=3)
+        quieta, forcejeo = persona(50, 50), persona(300, 50)
+        tracker.update([quieta, forcejeo])
+        for i in range(1, 5):
+            # Solo se mueven los brazos de la segunda persona; el orden se alterna
+            detecciones = [quieta, persona(300, 50, brazos=10.0 * (i % 2))]
+            resultado = tracker.update(detecciones if i % 2 else detecciones[::-1])
+        contadores = dict(zip(resultado.track_ids.tolist(), resultado.counters.tolist()))
+        sospechosos = dict(zip(resultado.track_ids.tolist(), resultado.suspicious.tolist()))
+        self.assertEqual(contadores, {1: 0, 2: 4})
+        self.assertEqual(sospechosos, {1: False, 2: True})
+
+        # Sin movimiento el contador baja de a uno hasta 0
+        for _ in range(6):
+            resultado = tracker.update([quieta, persona(300, 50)])
+        self.assertEqual(resultado.counters.tolist(), [0, 0])
+
+    def test_frame_sin_personas(self):
+        tracker = PoseTracker()
+        tracker.update([persona(50, 50)])
+        vacio = tracker.update(np.empty((0, 17, 2)))
+        self.assertEqual(len(vacio), 0)
+        self.assertEqual(tracker.update([persona(51, 50)]).track_ids.tolist(), [1])
+
+    def test_keypoint_que_parpadea_no_es_movimiento(self):
+        tracker = PoseTracker(body_threshold=4, arm_threshold=3, confirm_frames=1)
+        tracker.update([persona(200, 100)])
+        # La muñeca (9) cae bajo la confianza mínima y YOLO la deja en (0, 0)
+        parpadeo = persona(200, 100)
+        parpadeo[9] = 0
+        for detecciones in ([parpadeo], [persona(200, 100)]):
+            resultado = tracker.update(detecciones)
+            np.testing.assert_allclose(resultado.body_motion, [0])
+            np.testing.assert_allclose(resultado.arm_motion, [0])
+            self.assertEqual(resultado.counters.tolist(), [0])
+        np.testing.assert_allclose(tracker.keypoints[0], persona(200, 100))
+
+
+class StreamStateTests(SimpleTestCase):
+    """Ventanas por cámara acotadas en número y en tiempo de inactividad"""
+
+    def test_sin_camara_no_se_comparte(self):
+        detector = BehaviorDetector()
+        self.assertIsNot(detector.stream_state(None, 4), detector.stream_state(None, 4))
+        self.assertEqual(detector._stream_states, {})
+
+    def test_descarta_las_menos_usadas(self):
+        detector = BehaviorDetector(max_streams=3)
+        for camera_id in ('a', 'b', 'c'):
+            detector.stream_state(camera_id, 4)
+        detector.stream_state('a', 4)
+        detector.stream_state('d', 4)
+        self.assertEqual(sorted(detector._stream_states), ['a', 'c', 'd'])
+
+    def test_descarta_las_inactivas(self):
+        detector = BehaviorDetector(stream_idle_seconds=60)
+        with mock.patch('monitoreo.behavior_detector.time.monotonic', return_value=1000.0):
+            detector.stream_state('a', 4)
+            detector.stream_state('b', 4)
+        with mock.patch('monitoreo.behavior_detector.time.monotonic', return_value=1050.0):
+            activa = detector.stream_state('b', 4)
+        with mock.patch('monitoreo.behavior_detector.time.monotonic', return_value=1070.0):
+            self.assertIs(detector.stream_state('b', 4), activa)
+        self.assertEqual(list(detector._stream_states), ['b'])
+
+
+class MicroBatcherTests(SimpleTestCase):
+    def lote(self, process_batch):
+        """Envía 3 elementos que caen en un mismo lote y retorna sus Futures"""
+        batcher = MicroBatcher(process_batch, max_batch_size=3, max_latency=1.0)
+        self.addCleanup(batcher.close)
+        return [batcher.submit(item) for item in range(3)]
+
+    def test_resultados_en_orden(self):
+        futures = self.lote(lambda items: [item * 10 for item in items])
+        self.assertEqual([future.result(timeout=2) for future in futures], [0, 10, 20])
+
+    def test_menos_resultados_que_elementos(self):
+        for future in self.lote(lambda items: [0] * (len(items) - 1)):
+            with self.assertRaises(ValueError):
+                future.result(timeout=2)
+
+    def test_falla_tras_resultados_parciales(self):
+        def process_batch(items):
+            yield items[0]
+            raise RuntimeError("modelo caído")
+
+        for future in self.lote(process_batch):
+            with self.assertRaisesMessage(RuntimeError, "modelo caído"):
+                future.result(timeout=2)
+
+
+class ModelSearchTests(SimpleTestCase):
+    """El presupuesto de latencia se aplica a todos los candidatos evaluados, no solo a los de mejor F1"""
+
+    def test_activa_un_candidato_rapido_aunque_no_este_en_el_top_k_por_f1(self):
+        rng = np.random.default_rng(0)
+        X = rng.normal(size=(60, 80))
+        y = np.array(['normal', 'robo'] * 30)
+        X[y == 'robo', 0] += 3
+
+        def latencia(model, scaler, n_features):
+            # Solo los bosques de 25 árboles entran en el presupuesto
+            ms = 0.5 if model.n_estimators == 25 else 5.0
+            return ms, ms
+
+        with mock.patch('monitoreo.model_search.measure_latency', side_effect=latencia):
+            candidatos = search_models(X, y, n_iter=12, cv=3, top_k=1, n_jobs=1, latency_budget_ms=1.0)
+
+        self.assertEqual(len(candidatos), 1)
+        self.assertTrue(candidatos[0]['within_budget'])
+        self.assertEqual(candidatos[0]['params']['n_estimators'], 25)
+
+
+class JobQueueTests(TestCase):
+    """Cola de trabajos en la base: reparto, exclusividad por grupo, reencolado y cancelación"""
+
+    def setUp(self):
+        self.service = JobService()
+
+        def handler(params, context):
+            context.report(force=True, phase='trabajando')
+            return {'valor': params.get('valor')}
+
+        patcher = mock.patch.dict(JOB_HANDLERS, {'prueba': (handler, None)})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_claim_por_prioridad_y_una_sola_vez(self):
+        normal = self.service.submit('prueba')
+        urgente = self.service.submit('prueba', priority=5)
+        self.assertEqual(self.service.claim('w1').id, urgente.id)
+        self.assertEqual(self.service.claim('w2').id, normal.id)
+        self.assertIsNone(self.service.claim('w3'))
+        self.assertEqual(BackgroundJob.objects.get(id=urgente.id).worker, 'w1')
+
+    def test_un_solo_trabajo_activo_por_grupo(self):
+        entrenamiento = self.service.submit('train')
+        busqueda = self.service.submit('search', {'n_iter': 5})
+        self.assertFalse(entrenamiento.duplicate)
+        self.assertTrue(busqueda.duplicate)
+        self.assertEqual(busqueda.id, entrenamiento.id)
+
+        # La restricción también frena un INSERT que se salte submit
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            BackgroundJob.objects.create(kind='search', exclusive_group='training')
+
+        # Terminado el primero, el grupo admite otro
+        BackgroundJob.objects.filter(id=entrenamiento.id).update(status='done')
+        self.assertFalse(self.service.submit('search').duplicate)
+
+    def test_reencola_trabajos_sin_latido(self):
+        job = self.service.submit('prueba')
+        self.service.claim('w1')
+        self.assertEqual(self.service.requeue_stale(max_age=60), 0)
+
+        BackgroundJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+        self.assertEqual(self.service.requeue_stale(max_age=60), 1)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.started_at), ('pending', '', None))
+
+    def test_resultado_de_una_toma_reencolada_se_descarta(self):
+        job = self.service.submit('prueba', {'valor': 1})
+        lento = self.service.claim('w1')
+        BackgroundJob.objects.filter(id=job.id).update(heartbeat_at=timezone.now() - timedelta(seconds=120))
+        self.service.requeue_stale(max_age=60)
+        actual = self.service.claim('w2')
+
+        self.service.run(lento)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.worker, job.result), ('running', 'w2', None))
+
+        self.service.run(actual)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result), ('done', {'valor': 1}))
+
+    def test_cancelar_pendiente_y_en_ejecucion(self):
+        pendiente = self.service.submit('prueba')
+        self.assertTrue(self.service.cancel(pendiente.id))
+        self.assertIsNone(self.service.claim('w1'))
+        self.assertEqual(BackgroundJob.objects.get(id=pendiente.id).status, 'cancelled')
+
+        job = self.service.submit('prueba')
+        tomado = self.service.claim('w1')
+        self.assertTrue(self.service.cancel(job.id))
+        with self.assertRaises(JobCancelled):
+            JobContext(job.id, owner=self.service.owner(tomado)).report(force=True, phase='x')
+
+        self.service.run(tomado)
+        self.assertEqual(BackgroundJob.objects.get(id=job.id).status, 'cancelled')
+        self.assertFalse(self.service.cancel(job.id))
+
+
+class AnalyzeVideoViewTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('analista', password='clave')
+        self.client.force_login(self.user)
+        self.video = TrainingVideo.objects.create(
+            title='clip', video='training_videos/clip.mp4', behavior_type='normal', uploaded_by=self.user)
+
+    @mock.patch('monitoreo.api_views.detection_service')
+    def test_encola_el_analisis(self, detection_service):
+        detection_service.is_model_trained.return_value = True
+        response = self.client.post(reverse('monitoreo:api_analyze_video', args=[self.video.id]))
+
+        data = response.json()
+        self.assertTrue(data['success'])
+        job = BackgroundJob.objects.get(id=data['job_id'])
+        self.assertEqual((job.kind, job.status, job.params), ('analyze', 'pending', {'video_id': self.video.id}))
+        detection_service.iter_analysis.assert_not_called()
+
+
+class ActiveModelRegistryTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.stamp = os.path.join(directory.name, '.active_model')
+        # La instancia global (la que invalidan las señales) escribe su sello aparte
+        patcher = mock.patch.object(active_model_registry, '_stamp_path',
+                                    os.path.join(directory.name, '.global'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        active_model_registry.invalidate(broadcast=False)
+
+    def test_senal_recarga_en_el_mismo_proceso(self):
+        self.assertIsNone(active_model_registry.get_info())
+        model = TrainedModel.objects.create(name='m1', model_file='trained_models/m1.pkl', is_active=True)
+        self.assertEqual(active_model_registry.get_info()['id'], model.id)
+
+        model.delete()
+        self.assertIsNone(active_model_registry.get_info())
+
+    def test_sello_recarga_en_otro_proceso(self):
+        publicador = ActiveModelRegistry(stamp_path=self.stamp, check_interval=0)
+        lector = ActiveModelRegistry(stamp_path=self.stamp, check_interval=0)
+        model = TrainedModel.objects.create(name='m1', model_file='trained_models/m1.pkl')
+        self.assertIsNone(lector.get_info())
+
+        # update() no dispara señales: el lector sigue con lo cacheado hasta que cambie el sello
+        TrainedModel.objects.filter(id=model.id).update(is_active=True)
+        self.assertIsNone(lector.get_info())
+
+        publicador.invalidate()
+        self.assertEqual(lector.get_info()['id'], model.id)
+
+
+class DecodedFrameStoreTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+
+    def video(self, name, n, seed):
+        path = os.path.join(self.dir, name)
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), 10, (FRAME_WIDTH, FRAME_HEIGHT))
+        for frame in frames_sinteticos(n, seed):
+            writer.write(frame)
+        writer.release()
+        return path
+
+    def decodificados(self, path):
+        cap = cv2.VideoCapture(path)
+        frames = []
+        ret, frame = cap.read()
+        while ret:
+            frames.append(to_gray(frame))
+            ret, frame = cap.read()
+        cap.release()
+        return np.stack(frames)
+
+    def test_frames_iguales_a_decodificar_y_visibles_en_otra_instancia(self):
+        primero, segundo = self.video('a.mp4', 12, 0), self.video('b.mp4', 5, 1)
+        escritor = DecodedFrameStore(os.path.join(self.dir, 'store'))
+        lector = DecodedFrameStore(os.path.join(self.dir, 'store'))
+
+        self.assertEqual(escritor.add(primero), 12)
+        np.testing.assert_array_equal(lector.frames(primero), self.decodificados(primero))
+        self.assertTrue(lector.clip(primero)['complete'])
+
+        # El lector ya cargó el índice: lo vuelve a leer cuando otro lo reescribe
+        escritor.add(segundo)
+        self.assertEqual(len(lector), 2)
+        np.testing.assert_array_equal(lector.frames(segundo), self.decodificados(segundo))
+        np.testing.assert_array_equal(lector.frames(primero), self.decodificados(primero))
+
+
+class EvidenceWriterTests(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.dir = directory.name
+
+    def test_escribe_y_filtra_repetidos(self):
+        writer = EvidenceWriter(self.dir, camera_interval=60, track_interval=60)
+        frames = frames_sinteticos(40)
+        guardado = writer.submit(frames[0], camera_id='cam 1', track_ids=[1])
+        # Misma cámara dentro de camera_interval: se descarta
+        self.assertIsNone(writer.submit(frames[20], camera_id='cam 1', track_ids=[2]))
+        otra = writer.submit(frames[0], camera_id='cam2')
+        writer.close()
+
+        self.assertEqual(writer.stats['written'], 2)
+        self.assertEqual(writer.stats['rate_limited'], 1)
+        self.assertEqual(os.path.dirname(guardado), self.dir)
+        self.assertIn('alerta_cam_1_', os.path.basename(guardado))
+        for path in (guardado, otra):
+            self.assertEqual(cv2.imread(path).shape, frames[0].shape)
+
+    def test_tracks_y_frames_casi_iguales(self):
+        writer = EvidenceWriter(self.dir, camera_interval=0, track_interval=60)
+        self.addCleanup(writer.close)
+        frames = frames_sinteticos(40)
+        self.assertIsNotNone(writer.submit(frames[0], track_ids=[1]))
+        # Todos sus tracks ya tienen evidencia reciente
+        self.assertIsNone(writer.submit(frames[20], track_ids=[1]))
+        # Un track nuevo sí, salvo que el frame sea casi igual al último guardado
+        self.assertIsNone(writer.submit(frames[0], track_ids=[1, 2]))
+        self.assertIsNotNone(writer.submit(frames[20], track_ids=[1, 2]))
+        self.assertEqual((writer.stats['rate_limited'], writer.stats['duplicate']), (1, 1))
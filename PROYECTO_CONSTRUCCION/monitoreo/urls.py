@@ -45,5 +45,15 @@ urlpatterns = [
 
     # API endpoints para análisis
     path('api/analyze/<int:video_id>/', api_views.analyze_video, name='api_analyze_video'),
+    path('api/analyze/<int:video_id>/stream/', api_views.analyze_video_stream, name='api_analyze_video_stream'),
     path('api/training-stats/', api_views.get_training_stats, name='api_training_stats'),
+    path('api/models/', api_views.list_models, name='api_models'),
+    path('api/models/<int:model_id>/activate/', api_views.activate_model, name='api_activate_model'),
+
+    # Trabajos en segundo plano (entrenamiento, búsqueda, análisis)
+    path('api/jobs/', api_views.jobs, name='api_jobs'),
+    path('api/jobs/<int:job_id>/', api_views.job_status, name='api_job_status'),
+    path('api/jobs/<int:job_id>/events/', api_views.job_events, name='api_job_events'),
+    path('api/jobs/<int:job_id>/result/', api_views.job_result, name='api_job_result'),
+    path('api/jobs/<int:job_id>/cancel/', api_views.cancel_job, name='api_cancel_job'),
 ]
@@ -7,7 +7,6 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import authenticate, login, logout
 from django.http import HttpResponse, StreamingHttpResponse, JsonResponse
 from django.views.decorators import gzip
-from sympy import Q
 from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse, HttpResponse
 from django.core.paginator import Paginator
@@ -16,14 +15,10 @@ import csv
 from datetime import datetime, timedelta
 from .models import TrainingVideo, TrainedModel, DetectionLog, Ubicacion, Alertas
 from .forms import LoginForm, TrainingVideoForm, TrainingBatchForm
-from .services.video_service import CameraManager, VideoStreamGenerator
-from .services.detection_service import detection_service, training_service
-from .entrenamiento import camara_seguridad_stream
-import requests
+from .services.resource_registry import resources
 from django.shortcuts import render
 from django.utils import timezone
 from django.http import StreamingHttpResponse
-from .services.video_service import VideoStreamGenerator
 
 # MAPA
 def mapa(request):
@@ -38,6 +33,7 @@ def mapa(request):
 
 # RECIBIR UBICACION
 def recibir_ubicacion(request):
+    import requests
 
     if request.method != "POST":
         return JsonResponse({"error": "Método no permitido"}, status=405)
@@ -47,6 +43,7 @@ def recibir_ubicacion(request):
         data = json.loads(request.body.decode("utf-8"))
         lat = float(data["lat"])
         lon = float(data["lon"])
+        camara = str(data.get("camara", ""))[:100]
     except json.JSONDecodeError:
         return JsonResponse({"error": "JSON inválido"}, status=400)
     except (KeyError, ValueError):
@@ -100,6 +97,7 @@ def recibir_ubicacion(request):
         severidad="Alta",
         hora=timezone.now(),
         descripcion="Movimiento detectado",
+        camara=camara,
         estado="Activo"
     )
 
@@ -112,12 +110,15 @@ def recibir_ubicacion(request):
 # SERVICIOS GLOBALES
 # ============================================================================
 
-camera_manager = CameraManager()
-video_generator = VideoStreamGenerator(camera_manager)
+# Se construyen en su primer uso (YOLO, OpenCV y scikit-learn no se cargan al arrancar)
+camera_manager = resources.proxy('camera_manager')
+video_generator = resources.proxy('video_generator')
+detection_service = resources.proxy('detection_service')
 
 
 @gzip.gzip_page
 def video_feed(request):
+    from .entrenamiento import camara_seguridad_stream
 
     return StreamingHttpResponse(
         camara_seguridad_stream(),
@@ -230,11 +231,15 @@ def dashboard(request):
     RF-02: Detección de comportamientos
     RF-03: Generación de alertas automáticas
     """
+    from .entrenamiento import VIDEO_PATH, camara_de
+
     context = {
         'page_title': 'Dashboard de Monitoreo',
         'user': request.user,
         'model_active': detection_service.is_model_trained(),
         'model_info': detection_service.get_active_model_info(),
+        # Las alertas enviadas desde el dashboard quedan asociadas a la cámara del video
+        'camara_id': camara_de(VIDEO_PATH),
     }
     return render(request, 'monitoreo/dashboard.html', context)
 
@@ -339,6 +344,7 @@ def alertas_api(request):
             'hora': alerta.hora.strftime('%Y-%m-%d %H:%M:%S'),
             'descripcion': alerta.descripcion,
             'estado': alerta.estado,
+            'clip': alerta.clip.url if alerta.clip else None,
         })
 
     return JsonResponse({
@@ -123,3 +123,75 @@ STATIC_URL = 'static/'
 # Media files (Videos, uploads)
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+
+# Procesos para extraer características al entrenar (-1 = todos los núcleos)
+TRAINING_EXTRACTION_JOBS = -1
+
+# Muestreo temporal de cada video al entrenar:
+# 'first' (primeros frames), 'uniform', 'stride' o 'motion' (ventana de más movimiento)
+# Con 'uniform' y 'stride' también se lee el frame siguiente a cada muestra para
+# medir el movimiento entre frames consecutivos, igual que la detección en vivo
+TRAINING_SAMPLING = 'first'
+
+# Clasificador del detector: 'random_forest' (se sirve compilado),
+# 'hist_gradient_boosting' o 'logistic' (ver benchmark_backends.py)
+DETECTION_BACKEND = 'random_forest'
+
+# Micro-lotes de inferencia: tamaño máximo y espera máxima del primer frame
+DETECTION_BATCH_SIZE = 32
+DETECTION_BATCH_LATENCY_MS = 10
+
+# Ventanas deslizantes por cámara: máximo guardado y segundos sin frames
+# tras los que se descarta la de una cámara
+DETECTION_MAX_STREAMS = 64
+DETECTION_STREAM_IDLE_SECONDS = 300
+
+# Segundos antes de reintentar cargar un artefacto de modelo que falló
+MODEL_LOAD_RETRY_SECONDS = 30
+
+# Entrenamiento incremental: árboles agregados por actualización y cada
+# cuántas actualizaciones se reentrena el modelo completo
+TRAINING_INCREMENTAL_TREES = 10
+TRAINING_FULL_REBUILD_EVERY = 10
+
+# Búsqueda de hiperparámetros: procesos del pool y presupuesto de latencia
+# del clasificador por frame (p99, ms) para elegir el modelo a activar
+MODEL_SEARCH_JOBS = -1
+DETECTION_LATENCY_BUDGET_MS = 1.0
+
+# Análisis de videos por ventanas: se detiene cuando ANALYSIS_CONFIRM_WINDOWS
+# ventanas seguidas coinciden con confianza >= ANALYSIS_EARLY_STOP_CONFIDENCE
+# (None = analizar el video completo)
+ANALYSIS_EARLY_STOP_CONFIDENCE = 0.9
+ANALYSIS_CONFIRM_WINDOWS = 3
+
+# Trabajos en segundo plano (python manage.py run_jobs):
+# hilos por proceso, espera entre consultas a la cola y segundos sin latido
+# tras los que un trabajo 'running' se reencola (revisado cada
+# JOBS_STALE_CHECK_INTERVAL segundos). JOBS_EMBEDDED_WORKERS > 0
+# ejecuta trabajos dentro del proceso web (solo para desarrollo).
+JOBS_WORKERS = 1
+JOBS_POLL_INTERVAL = 1.0
+JOBS_STALE_SECONDS = 120
+JOBS_STALE_CHECK_INTERVAL = 30
+JOBS_EMBEDDED_WORKERS = 0
+# Duración máxima de cada conexión SSE de progreso (el navegador se reconecta)
+JOBS_EVENTS_MAX_SECONDS = 60
+
+# Recursos pesados que wsgi.py carga antes de recibir peticiones; el resto se
+# construye en su primer uso (ver monitoreo/services/resource_registry.py).
+# Agregar 'pose_model' carga YOLO antes del primer stream de cámara. Con
+# INFERENCE_SERVER_ADDRESS configurado se omiten 'detection_service' y
+# 'pose_model' (los carga el servidor) y solo se crea el cliente.
+WARMUP_RESOURCES = ['detection_service']
+
+# Servidor local de inferencia (python manage.py run_inference_server): con
+# una ruta de socket Unix (recomendado, se crea con permisos 0600) o una
+# dirección ('127.0.0.1', 6010), los workers web le envían los frames por
+# memoria compartida en lugar de cargar YOLO y el detector en cada proceso.
+# None = inferir dentro de cada worker. La clave del handshake se toma de la
+# variable de entorno INFERENCE_SERVER_AUTHKEY o se deriva de SECRET_KEY.
+INFERENCE_SERVER_ADDRESS = None
+# Huecos de memoria compartida por worker (frames en vuelo) y bytes por hueco
+INFERENCE_SHM_SLOTS = 8
+INFERENCE_SHM_SLOT_BYTES = 1920 * 1080 * 3
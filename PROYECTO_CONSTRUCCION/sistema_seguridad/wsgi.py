@@ -14,3 +14,10 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sistema_seguridad.settings')
 
 application = get_wsgi_application()
+
+# Cargar los recursos pesados y el modelo activo antes de recibir peticiones
+from monitoreo.services.resource_registry import resources, startup_resources  # noqa: E402
+
+resources.warm_up(startup_resources())
+if resources.is_loaded('detection_service'):
+    resources.get('detection_service').warm_up()